@@ -6,7 +6,7 @@ from flask_cors import CORS
 db = SQLAlchemy()
 
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
 
     # 基本配置
@@ -14,6 +14,10 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = 'your-secret-key-123'
 
+    # 覆盖配置（基准测试、脚本等使用本地SQLite时）
+    if config_overrides:
+        app.config.update(config_overrides)
+
     # 初始化
     db.init_app(app)
 
@@ -44,6 +48,11 @@ def create_app():
 
         print("✅ 蓝图注册成功")
 
+        # 未安装 pypinyin 时姓名拼音检索（如 zs、zhangs）不可用
+        from app.utils.pinyin import pinyin_available
+        if not pinyin_available():
+            print("⚠️ 警告: 未安装 pypinyin，患者姓名拼音检索不可用（pip install pypinyin）")
+
     except ImportError as e:
         print(f"⚠️ 警告: 无法导入路由模块: {e}")
 
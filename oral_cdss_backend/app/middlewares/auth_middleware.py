@@ -4,26 +4,33 @@ from app.utils.response import unauthorized_response, forbidden_response
 from app.utils.security import verify_token
 
 
+def authenticate(token):
+    """校验令牌并将用户信息添加到请求上下文，失败时返回错误响应，成功返回 None"""
+    if not token:
+        return unauthorized_response('缺少认证令牌')
+
+    if token.startswith('Bearer '):
+        token = token[7:]
+
+    payload = verify_token(token)
+    if not payload:
+        return unauthorized_response('无效或过期的令牌')
+
+    # 将用户信息添加到请求上下文
+    request.user_id = payload.get('user_id')
+    request.user_role = payload.get('role')
+    request.username = payload.get('username')
+    return None
+
+
 def auth_required(f):
     """认证中间件"""
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return unauthorized_response('缺少认证令牌')
-
-        if token.startswith('Bearer '):
-            token = token[7:]
-
-        payload = verify_token(token)
-        if not payload:
-            return unauthorized_response('无效或过期的令牌')
-
-        # 将用户信息添加到请求上下文
-        request.user_id = payload.get('user_id')
-        request.user_role = payload.get('role')
-        request.username = payload.get('username')
+        auth_result = authenticate(request.headers.get('Authorization'))
+        if auth_result:
+            return auth_result
 
         return f(*args, **kwargs)
 
@@ -3,14 +3,12 @@
 # 只导入确认存在的基础类
 from .user import User
 from .patient import Patient
-from .medical_record import MedicalRecord
-from .rule import Rule
-from .assessment_result import AssessmentResult
-
-# 注释掉可能不存在的类
-# from .medical_record import ClinicalFeature  # 如果这个类不存在，注释掉
-# from .rule import RuleCategory              # 如果这个类不存在，注释掉
-# from .assessment_result import TreatmentPlan # 如果这个类不存在，注释掉
+from .medical_record import MedicalRecord, ClinicalFeature
+from .rule import Rule, RuleCategory
+from .assessment_result import AssessmentResult, AssessmentCategoryScore, AssessmentRuleEvaluation, TreatmentPlan
+from .assessment_stat import AssessmentDailyStat, AssessmentPeriodStat
+from .doctor_stat import DoctorStat
+from .record_id_sequence import RecordIdSequence
 
 __all__ = [
     'User',
@@ -18,7 +16,13 @@ __all__ = [
     'MedicalRecord',
     'Rule',
     'AssessmentResult',
-    # 'ClinicalFeature',    # 暂时注释掉
-    # 'RuleCategory',      # 暂时注释掉
-    # 'TreatmentPlan'      # 暂时注释掉
+    'ClinicalFeature',
+    'RuleCategory',
+    'TreatmentPlan',
+    'AssessmentCategoryScore',
+    'AssessmentRuleEvaluation',
+    'AssessmentDailyStat',
+    'AssessmentPeriodStat',
+    'DoctorStat',
+    'RecordIdSequence'
 ]
\ No newline at end of file
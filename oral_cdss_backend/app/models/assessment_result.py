@@ -35,6 +35,10 @@ class AssessmentResult(db.Model):
 
     # 关系
     treatment_plans = db.relationship('TreatmentPlan', backref='assessment', lazy=True, cascade='all, delete-orphan')
+    category_score_items = db.relationship('AssessmentCategoryScore', backref='assessment', lazy=True,
+                                           cascade='all, delete-orphan')
+    rule_evaluation_items = db.relationship('AssessmentRuleEvaluation', backref='assessment', lazy=True,
+                                            cascade='all, delete-orphan')
 
     def to_dict(self):
         """转换为字典"""
@@ -58,6 +62,62 @@ class AssessmentResult(db.Model):
         }
 
 
+class AssessmentCategoryScore(db.Model):
+    """评估结果的类别得分（评估 × 类别）"""
+    __tablename__ = 'assessment_category_scores'
+    __table_args__ = (
+        db.Index('ix_assessment_category_scores_category', 'category_name', 'assessment_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment_results.id'), nullable=False, index=True)
+    category_name = db.Column(db.String(100), nullable=False)
+
+    # 得分
+    raw_score = db.Column(db.Float, default=0)
+    weighted_score = db.Column(db.Float, default=0)
+    weight = db.Column(db.Float, default=1.0)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'category': self.category_name,
+            'raw_score': self.raw_score,
+            'weighted_score': self.weighted_score,
+            'weight': self.weight
+        }
+
+
+class AssessmentRuleEvaluation(db.Model):
+    """评估结果中命中的规则（评估 × 规则）"""
+    __tablename__ = 'assessment_rule_evaluations'
+    __table_args__ = (
+        db.Index('ix_assessment_rule_evaluations_rule', 'rule_id', 'assessment_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment_results.id'), nullable=False, index=True)
+    rule_id = db.Column(db.Integer, db.ForeignKey('rules.id'), nullable=False)
+    category_name = db.Column(db.String(100))
+
+    # 评估详情
+    score = db.Column(db.Integer, default=0)
+    is_mandatory = db.Column(db.Boolean, default=False)
+    risk_level = db.Column(db.String(20))
+    treatment_suggestion = db.Column(db.String(100))
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'rule_id': self.rule_id,
+            'category': self.category_name,
+            'score': self.score,
+            'is_mandatory': self.is_mandatory,
+            'risk_level': self.risk_level,
+            'treatment_suggestion': self.treatment_suggestion
+        }
+
+
 class TreatmentPlan(db.Model):
     """治疗方案模型"""
     __tablename__ = 'treatment_plans'
@@ -0,0 +1,77 @@
+from datetime import datetime
+from app import db
+from app.models.types import PreciseDateTime
+
+
+class AssessmentDailyStat(db.Model):
+    """评估结果日汇总模型（只统计 is_latest 的评估，写评估时增量维护）"""
+    __tablename__ = 'assessment_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'risk_level', 'recommended_treatment',
+                            name='uq_assessment_daily_stats_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    stat_date = db.Column(db.Date, nullable=False, index=True)
+    risk_level = db.Column(db.Enum('low', 'medium', 'high'))
+    recommended_treatment = db.Column(
+        db.Enum('full_crown', 'implant', 'bridge', 'filling', 'root_canal', 'extraction', 'observation'))
+
+    # 汇总值
+    assessment_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    success_sum = db.Column(db.Float, nullable=False, default=0)
+
+    # 系统字段
+    updated_at = db.Column(PreciseDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'stat_date': self.stat_date.isoformat() if self.stat_date else None,
+            'risk_level': self.risk_level,
+            'recommended_treatment': self.recommended_treatment,
+            'assessment_count': self.assessment_count,
+            'score_sum': self.score_sum,
+            'success_sum': self.success_sum
+        }
+
+
+class AssessmentPeriodStat(db.Model):
+    """评估结果周/月汇总模型（时间 × 风险等级 × 治疗方案的小型数据立方体）
+
+    与日汇总同步增量维护，period_start 为周一（week）或月初（month）。
+    """
+    __tablename__ = 'assessment_period_stats'
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'period_start', 'risk_level', 'recommended_treatment',
+                            name='uq_assessment_period_stats_key'),
+        db.Index('ix_assessment_period_stats_period', 'granularity', 'period_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.Enum('week', 'month'), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    risk_level = db.Column(db.Enum('low', 'medium', 'high'))
+    recommended_treatment = db.Column(
+        db.Enum('full_crown', 'implant', 'bridge', 'filling', 'root_canal', 'extraction', 'observation'))
+
+    # 汇总值
+    assessment_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    success_sum = db.Column(db.Float, nullable=False, default=0)
+
+    # 系统字段
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'granularity': self.granularity,
+            'period_start': self.period_start.isoformat() if self.period_start else None,
+            'risk_level': self.risk_level,
+            'recommended_treatment': self.recommended_treatment,
+            'assessment_count': self.assessment_count,
+            'score_sum': self.score_sum,
+            'success_sum': self.success_sum
+        }
\ No newline at end of file
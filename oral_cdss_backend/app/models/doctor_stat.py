@@ -0,0 +1,34 @@
+from datetime import datetime
+from app import db
+from app.utils.hyperloglog import HyperLogLog
+
+
+class DoctorStat(db.Model):
+    """医生工作统计模型（创建病历和写评估时增量维护）"""
+    __tablename__ = 'doctor_stats'
+
+    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+
+    # 计数
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    success_sum = db.Column(db.Float, nullable=False, default=0)  # 名下病历最新评估成功率之和
+    success_count = db.Column(db.Integer, nullable=False, default=0)  # 有最新评估的病历数
+
+    # 不同患者数的 HyperLogLog 草图
+    patient_sketch = db.Column(db.LargeBinary)
+
+    # 系统字段
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def patient_count(self):
+        """估计名下不同患者数"""
+        return HyperLogLog.from_bytes(self.patient_sketch).count()
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'doctor_id': self.doctor_id,
+            'record_count': self.record_count,
+            'average_success_rate': self.success_sum / self.success_count if self.success_count else 0.0,
+            'patient_count': self.patient_count()
+        }
\ No newline at end of file
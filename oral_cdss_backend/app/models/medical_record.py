@@ -1,10 +1,23 @@
+import math
 from datetime import datetime
+from sqlalchemy import event, func
+from sqlalchemy.orm import load_only, object_session, selectinload, validates
 from app import db
+from app.models.types import PreciseDateTime
+from app.utils.fieldsets import serialize_value
 
 
 class MedicalRecord(db.Model):
     """病历模型"""
     __tablename__ = 'medical_records'
+    __table_args__ = (
+        # 按最新推荐方案检索，(就诊日期, ID) 用于游标分页
+        db.Index('ix_medical_records_latest_treatment', 'latest_treatment', 'visit_date', 'id'),
+        # 病历列表的游标分页（全部 / 按患者 / 按创建者）
+        db.Index('ix_medical_records_visit', 'visit_date', 'id'),
+        db.Index('ix_medical_records_patient_visit', 'patient_id', 'visit_date', 'id'),
+        db.Index('ix_medical_records_creator_visit', 'creator_id', 'visit_date', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     record_id = db.Column(db.String(50), unique=True, nullable=False)  # 病历编号
@@ -34,64 +47,178 @@ class MedicalRecord(db.Model):
     ct_path = db.Column(db.String(255))
     photo_path = db.Column(db.String(255))
 
+    # 最新评估推荐的治疗方案（冗余字段，评估时维护，用于按治疗方案检索病例）
+    latest_treatment = db.Column(
+        db.Enum('full_crown', 'implant', 'bridge', 'filling', 'root_canal', 'extraction', 'observation'))
+
     # 系统字段
     is_finalized = db.Column(db.Boolean, default=False)
+    version = db.Column(db.Integer, default=1)  # 修改次数，每次有实际修改的更新递增（病历版本/ETag）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(PreciseDateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     # 关系
     clinical_features = db.relationship('ClinicalFeature', backref='medical_record', lazy=True,
                                         cascade='all, delete-orphan')
     assessment_results = db.relationship('AssessmentResult', backref='medical_record', lazy=True,
                                          cascade='all, delete-orphan')
+    # 最新评估（只读，列表摘要使用）
+    latest_assessment = db.relationship(
+        'AssessmentResult', uselist=False, viewonly=True,
+        primaryjoin='and_(MedicalRecord.id == AssessmentResult.medical_record_id, '
+                    'AssessmentResult.is_latest == True)'
+    )
 
-    def to_dict(self):
-        """转换为字典"""
+    # 可通过 ?fields= 选择的字段（均为本表的列）
+    FIELDS = ('id', 'record_id', 'patient_id', 'creator_id', 'visit_date', 'chief_complaint', 'diagnosis',
+              'treatment_plan', 'tooth_number', 'periodontal_status', 'bone_loss_percentage', 'mobility_degree',
+              'caries_degree', 'pulp_condition', 'occlusion_type', 'oral_hygiene', 'smoking_status',
+              'diabetic_status', 'xray_path', 'ct_path', 'photo_path', 'latest_treatment', 'is_finalized',
+              'created_at')
+    # 可通过 ?embed= 嵌入的关联，未指定 embed 时默认嵌入前两项
+    EMBEDS = ('clinical_features', 'assessment_results', 'latest_assessment')
+    DEFAULT_EMBEDS = ('clinical_features', 'assessment_results')
+
+    # 摘要视图使用的列
+    SUMMARY_COLUMNS = ('id', 'record_id', 'patient_id', 'creator_id', 'visit_date', 'diagnosis',
+                       'tooth_number', 'latest_treatment', 'is_finalized', 'created_at')
+    LATEST_ASSESSMENT_COLUMNS = ('id', 'medical_record_id', 'total_score', 'success_probability',
+                                 'risk_level', 'recommended_treatment', 'assessed_at')
+
+    @classmethod
+    def load_options(cls, fields=None, embed=None, extra_columns=()):
+        """to_dict(fields, embed) 对应的加载选项
+
+        指定 fields 时只查询这些列（加上 extra_columns，如分页排序列）；
+        嵌入的关联按整页批量 selectinload，未嵌入的关联不加载。
+        """
+        from app.models.assessment_result import AssessmentResult
+
+        options = []
+        if fields is not None:
+            columns = dict.fromkeys(('id',) + tuple(fields) + tuple(extra_columns))
+            options.append(load_only(*[getattr(cls, name) for name in columns]))
+
+        embed = cls.DEFAULT_EMBEDS if embed is None else embed
+        if 'clinical_features' in embed:
+            options.append(selectinload(cls.clinical_features))
+        if 'assessment_results' in embed:
+            options.append(selectinload(cls.assessment_results).selectinload(AssessmentResult.treatment_plans))
+        if 'latest_assessment' in embed:
+            options.append(selectinload(cls.latest_assessment).selectinload(AssessmentResult.treatment_plans))
+        return options
+
+    @classmethod
+    def summary_options(cls):
+        """to_summary_dict() 用到的列和最新评估"""
+        from app.models.assessment_result import AssessmentResult
+        return [
+            load_only(*[getattr(cls, name) for name in cls.SUMMARY_COLUMNS]),
+            selectinload(cls.latest_assessment).load_only(
+                *[getattr(AssessmentResult, name) for name in cls.LATEST_ASSESSMENT_COLUMNS]
+            )
+        ]
+
+    def to_dict(self, fields=None, embed=None):
+        """转换为字典
+
+        fields 为要返回的列（默认全部），embed 为要嵌入的关联（默认临床特征和全部评估）。
+        """
+        fields = self.FIELDS if fields is None else fields
+        data = {name: serialize_value(getattr(self, name)) for name in fields}
+
+        embed = self.DEFAULT_EMBEDS if embed is None else embed
+        if 'clinical_features' in embed:
+            data['clinical_features'] = [cf.to_dict() for cf in self.clinical_features]
+        if 'assessment_results' in embed:
+            data['assessment_results'] = [ar.to_dict() for ar in self.assessment_results]
+        if 'latest_assessment' in embed:
+            latest = self.latest_assessment
+            data['latest_assessment'] = latest.to_dict() if latest else None
+        return data
+
+    def to_summary_dict(self):
+        """列表摘要：病历主要字段和最新评估结论，不含临床特征和评估明细"""
+        latest = self.latest_assessment
         return {
             'id': self.id,
             'record_id': self.record_id,
             'patient_id': self.patient_id,
             'creator_id': self.creator_id,
             'visit_date': self.visit_date.isoformat() if self.visit_date else None,
-            'chief_complaint': self.chief_complaint,
             'diagnosis': self.diagnosis,
-            'treatment_plan': self.treatment_plan,
             'tooth_number': self.tooth_number,
-            'periodontal_status': self.periodontal_status,
-            'bone_loss_percentage': self.bone_loss_percentage,
-            'mobility_degree': self.mobility_degree,
-            'caries_degree': self.caries_degree,
-            'pulp_condition': self.pulp_condition,
-            'occlusion_type': self.occlusion_type,
-            'oral_hygiene': self.oral_hygiene,
-            'smoking_status': self.smoking_status,
-            'diabetic_status': self.diabetic_status,
-            'xray_path': self.xray_path,
-            'ct_path': self.ct_path,
-            'photo_path': self.photo_path,
+            'latest_treatment': self.latest_treatment,
             'is_finalized': self.is_finalized,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'clinical_features': [cf.to_dict() for cf in self.clinical_features],
-            'assessment_results': [ar.to_dict() for ar in self.assessment_results]
+            'latest_assessment': {
+                'id': latest.id,
+                'total_score': latest.total_score,
+                'success_probability': latest.success_probability,
+                'risk_level': latest.risk_level,
+                'recommended_treatment': latest.recommended_treatment,
+                'assessed_at': latest.assessed_at.isoformat() if latest.assessed_at else None
+            } if latest else None
         }
 
 
+@event.listens_for(MedicalRecord, 'before_update')
+def _bump_record_version(mapper, connection, target):
+    """病历有实际修改时递增版本号（在数据库中计算，并发更新的递增不会丢失）"""
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = func.coalesce(MedicalRecord.version, 0) + 1
+
+
 class ClinicalFeature(db.Model):
     """临床特征模型（用于扩展特征存储）"""
     __tablename__ = 'clinical_features'
+    __table_args__ = (
+        # 按特征条件检索病历：数值型按 (名称, 数值) 范围查询，其他按 (名称, 值) 等值查询
+        db.Index('ix_clinical_features_name_numeric', 'feature_name', 'numeric_value'),
+        db.Index('ix_clinical_features_name_value', 'feature_name', 'feature_value'),
+        # 读取和对比单个病历的特征
+        db.Index('ix_clinical_features_record_name', 'medical_record_id', 'feature_name'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     medical_record_id = db.Column(db.Integer, db.ForeignKey('medical_records.id'), nullable=False)
     feature_name = db.Column(db.String(100), nullable=False)
     feature_value = db.Column(db.String(255))
     feature_type = db.Column(db.Enum('numeric', 'categorical', 'text'))
+    numeric_value = db.Column(db.Float)  # 数值型特征的数值（由 feature_value 派生，用于范围查询）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @staticmethod
+    def parse_numeric(value, feature_type):
+        """数值型特征的数值；其他类型或无法转换为有限数值时返回 None"""
+        if feature_type != 'numeric' or value is None:
+            return None
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        return number if math.isfinite(number) else None
+
+    @validates('feature_value', 'feature_type')
+    def _update_numeric_value(self, key, value):
+        """值或类型变化时同步数值列"""
+        feature_value = value if key == 'feature_value' else self.feature_value
+        feature_type = value if key == 'feature_type' else self.feature_type
+        self.numeric_value = self.parse_numeric(feature_value, feature_type)
+        return value
+
+    def typed_value(self):
+        """按类型取值：数值型为 float，其他为字符串"""
+        if self.feature_type == 'numeric':
+            return self.numeric_value
+        return self.feature_value
+
     def to_dict(self):
         """转换为字典"""
         return {
             'id': self.id,
             'feature_name': self.feature_name,
             'feature_value': self.feature_value,
-            'feature_type': self.feature_type
+            'feature_type': self.feature_type,
+            'numeric_value': self.numeric_value
         }
\ No newline at end of file
@@ -1,14 +1,26 @@
 from datetime import datetime, date
+from sqlalchemy.orm import load_only, selectinload, validates
 from app import db
+from app.models.types import PreciseDateTime
+from app.utils.fieldsets import serialize_value
+from app.utils.pinyin import name_keys
 
 
 class Patient(db.Model):
     """患者模型"""
     __tablename__ = 'patients'
+    __table_args__ = (
+        # 患者列表按 (创建时间, ID) 游标分页
+        db.Index('ix_patients_created', 'created_at', 'id'),
+        db.Index('ix_patients_active_created', 'is_active', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.String(50), unique=True, nullable=False)  # 病历号
     full_name = db.Column(db.String(100), nullable=False)
+    # 姓名拼音检索键（写入姓名时自动生成）
+    name_pinyin = db.Column(db.String(255), index=True)  # 全拼，如 zhangsan
+    name_initials = db.Column(db.String(50), index=True)  # 首字母，如 zs
     gender = db.Column(db.Enum('male', 'female', 'other'))
     date_of_birth = db.Column(db.Date)
     age = db.Column(db.Integer)
@@ -28,11 +40,41 @@ class Patient(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(PreciseDateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     # 关系
     medical_records = db.relationship('MedicalRecord', backref='patient', lazy=True, cascade='all, delete-orphan')
 
+    # 可通过 ?fields= 选择的字段，以及每个字段需要查询的列
+    FIELDS = ('id', 'patient_id', 'full_name', 'gender', 'date_of_birth', 'age', 'phone', 'email', 'address',
+              'emergency_contact', 'emergency_phone', 'blood_type', 'allergies', 'medical_history',
+              'dental_history', 'is_active', 'created_at', 'updated_at')
+    FIELD_COLUMNS = {'age': ('age', 'date_of_birth')}
+    # 可通过 ?embed= 嵌入的关联（默认不嵌入）
+    EMBEDS = ('medical_records',)
+
+    @classmethod
+    def load_options(cls, fields=None, embed=None, extra_columns=()):
+        """to_dict(fields, embed) 对应的加载选项：只查询需要的列，嵌入的病历按整页批量加载摘要"""
+        from app.models.medical_record import MedicalRecord
+
+        options = []
+        if fields is not None:
+            columns = dict.fromkeys(('id',) + tuple(extra_columns))
+            for name in fields:
+                columns.update(dict.fromkeys(cls.FIELD_COLUMNS.get(name, (name,))))
+            options.append(load_only(*[getattr(cls, name) for name in columns]))
+
+        if embed and 'medical_records' in embed:
+            options.append(selectinload(cls.medical_records).options(*MedicalRecord.summary_options()))
+        return options
+
+    @validates('full_name')
+    def _update_name_keys(self, key, value):
+        """姓名变化时同步拼音检索键"""
+        self.name_pinyin, self.name_initials = name_keys(value)
+        return value
+
     def calculate_age(self):
         """计算年龄"""
         if self.date_of_birth:
@@ -44,25 +86,19 @@ class Patient(db.Model):
             return age
         return None
 
-    def to_dict(self):
-        """转换为字典"""
-        return {
-            'id': self.id,
-            'patient_id': self.patient_id,
-            'full_name': self.full_name,
-            'gender': self.gender,
-            'date_of_birth': self.date_of_birth.isoformat() if self.date_of_birth else None,
-            'age': self.age or self.calculate_age(),
-            'phone': self.phone,
-            'email': self.email,
-            'address': self.address,
-            'emergency_contact': self.emergency_contact,
-            'emergency_phone': self.emergency_phone,
-            'blood_type': self.blood_type,
-            'allergies': self.allergies,
-            'medical_history': self.medical_history,
-            'dental_history': self.dental_history,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+    def to_dict(self, fields=None, embed=None):
+        """转换为字典
+
+        fields 为要返回的字段（默认全部），embed 可包含 medical_records（嵌入病历摘要）。
+        """
+        fields = self.FIELDS if fields is None else fields
+        data = {}
+        for name in fields:
+            if name == 'age':
+                data['age'] = self.age or self.calculate_age()
+            else:
+                data[name] = serialize_value(getattr(self, name))
+
+        if embed and 'medical_records' in embed:
+            data['medical_records'] = [record.to_summary_dict() for record in self.medical_records]
+        return data
\ No newline at end of file
@@ -0,0 +1,13 @@
+from datetime import datetime
+from app import db
+
+
+class RecordIdSequence(db.Model):
+    """病历号序列（每天一行，各进程按块预留序号）"""
+    __tablename__ = 'record_id_sequences'
+
+    day = db.Column(db.String(8), primary_key=True)  # YYYYMMDD
+    next_value = db.Column(db.BigInteger, nullable=False, default=1)  # 下一个未分配的序号
+
+    # 系统字段
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from datetime import datetime
 from app import db
+from app.models.types import PreciseDateTime
 
 
 class RuleCategory(db.Model):
@@ -59,7 +60,7 @@ class Rule(db.Model):
     version = db.Column(db.Integer, default=1)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(PreciseDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def to_dict(self):
         """转换为字典"""
@@ -0,0 +1,8 @@
+# app/models/types.py
+from sqlalchemy.dialects import mysql
+
+from app import db
+
+# 数据版本（ETag、缓存键）取 updated_at 的最大值：MySQL 的 DATETIME 默认只精确到秒，
+# 同一秒内的两次修改无法区分，改用微秒精度（其他数据库不变）
+PreciseDateTime = db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
\ No newline at end of file
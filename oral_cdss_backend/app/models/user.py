@@ -1,5 +1,6 @@
 # app/models/user.py
 from app.utils.database import db
+from app.models.types import PreciseDateTime
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -19,7 +20,7 @@ class User(db.Model):
     specialty = db.Column(db.String(255))
     is_active = db.Column(db.Boolean, default=True)  # tinyint(1) 对应 Boolean
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(PreciseDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<User {self.username} ({self.role})>'
@@ -3,6 +3,7 @@ from app import db
 from app.models import User
 from app.utils.validation import validate_user_data
 from app.utils.response import success_response, error_response, validation_error_response
+from app.utils.pagination import keyset_page, count_total
 from app.utils.security import generate_token
 from app.middlewares.auth_middleware import auth_required
 
@@ -132,7 +133,6 @@ def get_users():
     # 查询参数
     role = request.args.get('role')
     search = request.args.get('search')
-    page = int(request.args.get('page', 1))
     per_page = min(int(request.args.get('per_page', 20)), 100)
 
     # 构建查询
@@ -148,15 +148,34 @@ def get_users():
             (User.email.like(f'%{search}%'))
         )
 
-    # 分页
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # 未传 cursor 参数时保持原有的 OFFSET 分页和响应格式（游标分页首页传空的 cursor）
+    if 'cursor' not in request.args:
+        page = int(request.args.get('page', 1))
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
 
-    users = [user.to_dict() for user in pagination.items]
+        return success_response({
+            'users': [user.to_dict() for user in pagination.items],
+            'total': pagination.total,
+            'pages': pagination.pages,
+            'page': page,
+            'per_page': per_page
+        })
+
+    # 按ID倒序游标分页，with_total=true 时才统计总数
+    total = None
+    if request.args.get('with_total', 'false').lower() == 'true':
+        total = count_total(query)
+
+    try:
+        users, next_cursor = keyset_page(
+            query, [User.id], cursor=request.args.get('cursor'), limit=per_page
+        )
+    except ValueError as e:
+        return error_response(str(e), 400)
 
     return success_response({
-        'users': users,
-        'total': pagination.total,
-        'pages': pagination.pages,
-        'page': page,
+        'users': [user.to_dict() for user in users],
+        'total': total,
+        'next_cursor': next_cursor,
         'per_page': per_page
     })
\ No newline at end of file
@@ -1,12 +1,23 @@
 from flask import Blueprint, request
+from datetime import datetime
+import json
+from sqlalchemy.orm import selectinload
 from app import db
 from app.models import MedicalRecord, AssessmentResult, TreatmentPlan, Rule, RuleCategory
 from app.services.decision_algorithm import DecisionAlgorithm
+from app.services.assessment_rollup import replace_latest_assessment
+from app.services.assessment_details import save_assessment_details
+from app.services.dashboard_events import publish_assessment
+from app.services.doctor_stats import assessment_written
+from app.services.similarity_search import SimpleSimilaritySearch, parse_weights, parse_min_score
 from app.utils.response import success_response, error_response
+from app.utils.event_bus import event_bus
+from app.utils.pagination import parse_limit
 from app.middlewares.auth_middleware import auth_required
 
 decision_support_bp = Blueprint('decision_support', __name__)
 decision_algorithm = DecisionAlgorithm()
+similarity_search = SimpleSimilaritySearch()
 
 
 @decision_support_bp.route('/assess/<int:record_id>', methods=['POST'])
@@ -26,25 +37,30 @@ def assess_medical_record(record_id):
             success_probability=recommendation['evaluation']['success_probability'],
             risk_level=recommendation['evaluation']['risk_level'],
             passed_mandatory=recommendation['evaluation']['passed_mandatory'],
-            mandatory_failures=str(recommendation['evaluation']['mandatory_failures']),
+            mandatory_failures=json.dumps(recommendation['evaluation']['mandatory_failures'], ensure_ascii=False),
             recommended_treatment=recommendation['recommended_treatment'],
             confidence_level=recommendation['confidence_level'],
-            alternative_treatments=str(recommendation['alternative_treatments']),
-            category_scores=str(recommendation['evaluation']['category_scores']),
-            rule_evaluations=str(recommendation['evaluation']['rule_evaluations']),
+            alternative_treatments=json.dumps(recommendation['alternative_treatments'], ensure_ascii=False),
+            category_scores=json.dumps(recommendation['evaluation']['category_scores'], ensure_ascii=False),
+            rule_evaluations=json.dumps(recommendation['evaluation']['rule_evaluations'], ensure_ascii=False),
             assessed_by=request.user_id,
+            assessed_at=datetime.utcnow(),
             is_latest=True
         )
 
-        # 将旧的评估结果标记为非最新
-        AssessmentResult.query.filter_by(
-            medical_record_id=record.id,
-            is_latest=True
-        ).update({'is_latest': False})
+        # 同步病历上的最新推荐方案（用于按治疗方案检索）
+        record.latest_treatment = recommendation['recommended_treatment']
 
         db.session.add(assessment)
         db.session.flush()  # 获取ID
 
+        # 将旧的评估结果标记为非最新，同一事务内调整日汇总
+        replaced = replace_latest_assessment(record.id, assessment)
+        assessment_written(record, assessment, replaced)
+
+        # 类别得分和规则命中写入明细表，供雷达图和统计分析查询
+        save_assessment_details(assessment.id, recommendation['evaluation'])
+
         # 保存治疗方案
         for plan_data in recommendation['treatment_plans']:
             plan = TreatmentPlan(
@@ -61,7 +77,9 @@ def assess_medical_record(record_id):
             )
             db.session.add(plan)
 
-        db.session.commit()
+        with event_bus.committing():
+            db.session.commit()
+            publish_assessment(assessment, replaced)
 
         return success_response({
             'assessment': assessment.to_dict(),
@@ -79,7 +97,9 @@ def get_assessments(record_id):
     """获取病历的评估历史"""
     record = MedicalRecord.query.get_or_404(record_id)
 
-    assessments = AssessmentResult.query.filter_by(
+    assessments = AssessmentResult.query.options(
+        selectinload(AssessmentResult.treatment_plans)
+    ).filter_by(
         medical_record_id=record.id
     ).order_by(
         AssessmentResult.assessed_at.desc()
@@ -91,6 +111,51 @@ def get_assessments(record_id):
     )
 
 
+@decision_support_bp.route('/similar-cases/<int:record_id>', methods=['GET'])
+@auth_required
+def get_similar_cases(record_id):
+    """获取相似历史病例"""
+    record = MedicalRecord.query.get_or_404(record_id)
+
+    mode = request.args.get('mode', 'basic')
+    if mode not in ('basic', 'weighted'):
+        return error_response('mode必须是basic或weighted', 400)
+
+    try:
+        limit = parse_limit(request.args.get('limit'), 5, 50)
+        weights = parse_weights(request.args.get('weights')) if mode == 'weighted' else None
+        min_score = parse_min_score(request.args.get('min_score'))
+    except ValueError as e:
+        return error_response(f'参数错误: {str(e)}', 400)
+
+    cases = similarity_search.find_similar_cases(
+        record, limit=limit, mode=mode, weights=weights, min_score=min_score
+    )
+
+    return success_response(data=cases, message='查询成功')
+
+
+@decision_support_bp.route('/cases-by-treatment/<treatment_type>', methods=['GET'])
+@auth_required
+def get_cases_by_treatment(treatment_type):
+    """按最新推荐方案查找已最终化病例（游标分页）"""
+    if treatment_type not in decision_algorithm.treatment_options:
+        return error_response('未知的治疗方案', 400)
+
+    try:
+        limit = parse_limit(request.args.get('limit'), 20, 100)
+        cases, next_cursor = similarity_search.find_cases_by_treatment_page(
+            treatment_type, limit=limit, cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    return success_response({
+        'cases': cases,
+        'next_cursor': next_cursor
+    }, '查询成功')
+
+
 @decision_support_bp.route('/rules', methods=['GET'])
 @auth_required
 def get_rules():
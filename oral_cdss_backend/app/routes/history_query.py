@@ -29,11 +29,18 @@ class SimpleSimilaritySearch:
 
     @staticmethod
     def find_cases_by_treatment(treatment_type, limit=10):
-        """按治疗类型查找"""
+        """按治疗类型查找（最新推荐方案走索引）"""
+        cases, _ = SimpleSimilaritySearch.find_cases_by_treatment_page(treatment_type, limit)
+        return cases
+
+    @staticmethod
+    def find_cases_by_treatment_page(treatment_type, limit=10, cursor=None):
+        """按治疗类型分页查找（游标分页），返回 (病历列表, 下一页游标)"""
         from app.models import MedicalRecord
+        from app.utils.pagination import keyset_page
 
-        cases = MedicalRecord.query.filter(
-            MedicalRecord.treatment_plan.like(f'%{treatment_type}%')
-        ).limit(limit).all()
+        query = MedicalRecord.query.filter(
+            MedicalRecord.latest_treatment == treatment_type
+        )
 
-        return cases
\ No newline at end of file
+        return keyset_page(query, [MedicalRecord.visit_date, MedicalRecord.id], cursor=cursor, limit=limit)
\ No newline at end of file
@@ -3,18 +3,94 @@ from datetime import datetime
 from app import db
 from app.models import MedicalRecord, ClinicalFeature, Patient
 from app.utils.validation import validate_medical_record_data
-from app.utils.response import success_response, error_response, paginated_response
+from app.utils.response import success_response, error_response, paginated_response, cursor_response
+from app.utils.pagination import keyset_page, count_total
+from app.utils.fieldsets import parse_fieldset
 from app.middlewares.auth_middleware import auth_required
-import random
+from app.utils.etag import conditional_get
+from app.utils.event_bus import event_bus
+from app.services.data_version import record_version
+from app.services.dashboard_events import publish_record_created
+from app.services.doctor_stats import record_created
+from app.services.record_import import DEFAULT_BATCH_SIZE, ROW_READERS, RecordImporter
+from app.services.record_ids import next_record_id
+from app.services.clinical_features import sync_clinical_features, parse_feature_predicate, feature_condition
+import csv
 
 medical_record_bp = Blueprint('medical_record', __name__)
 
 
-def generate_record_id():
-    """生成病历号 - 独立函数版本"""
-    date_str = datetime.now().strftime('%Y%m%d')
-    random_str = str(random.randint(1000, 9999))
-    return f'MR{date_str}{random_str}'
+def parse_record_fieldset():
+    """解析 ?fields= 和 ?embed=，返回 (fields, embed)
+
+    都未传时返回 (None, None)，即完整字段和默认嵌入；只传 fields 时不嵌入任何关联。
+    """
+    fields = parse_fieldset(request.args.get('fields'), MedicalRecord.FIELDS, 'fields')
+    embed = parse_fieldset(request.args.get('embed'), MedicalRecord.EMBEDS, 'embed')
+    if fields is not None and embed is None:
+        embed = ()
+    return fields, embed
+
+
+def record_list_response(query, per_page):
+    """病历列表分页响应
+
+    默认按 page / per_page 做 OFFSET 分页；传 cursor 参数时按 (就诊日期, ID) 倒序做游标分页，
+    cursor 为上一页返回的 next_cursor（首页传空值），with_total=true 时才额外统计总数。
+    view=summary 返回精简摘要；默认 full 返回完整病历，可用 fields / embed 只取需要的列和关联。
+    """
+    try:
+        fields, embed = parse_record_fieldset()
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    view = request.args.get('view', 'full')
+    if view == 'summary':
+        if fields is not None or embed is not None:
+            return error_response('view=summary时不能指定fields或embed', 400)
+        query = query.options(*MedicalRecord.summary_options())
+        serialize = MedicalRecord.to_summary_dict
+    elif view == 'full':
+        # 排序列需要加载，用于生成下一页游标
+        query = query.options(*MedicalRecord.load_options(fields, embed, extra_columns=('visit_date',)))
+
+        def serialize(record):
+            return record.to_dict(fields, embed)
+    else:
+        return error_response('view必须是full或summary', 400)
+
+    if 'cursor' not in request.args:
+        page = int(request.args.get('page', 1))
+        pagination = query.order_by(MedicalRecord.visit_date.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return paginated_response(
+            data=[serialize(record) for record in pagination.items],
+            total=pagination.total,
+            page=page,
+            per_page=per_page,
+            message='查询成功'
+        )
+
+    total = None
+    if request.args.get('with_total', 'false').lower() == 'true':
+        total = count_total(query)
+
+    try:
+        records, next_cursor = keyset_page(
+            query, [MedicalRecord.visit_date, MedicalRecord.id],
+            cursor=request.args.get('cursor'), limit=per_page
+        )
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    return cursor_response(
+        data=[serialize(record) for record in records],
+        next_cursor=next_cursor,
+        per_page=per_page,
+        total=total,
+        message='查询成功'
+    )
 
 
 @medical_record_bp.route('', methods=['POST'])
@@ -33,8 +109,8 @@ def create_medical_record():
     if not patient:
         return error_response('患者不存在')
 
-    # 生成病历号 - 使用独立函数
-    record_id = generate_record_id()
+    # 生成病历号（按天递增的序号，各进程按块预留）
+    record_id = next_record_id()
 
     try:
         # 创建病历
@@ -71,18 +147,20 @@ def create_medical_record():
         db.session.add(record)
         db.session.flush()  # 获取ID
 
-        # 添加临床特征
+        # 添加临床特征（批量插入，数值型特征同时写入数值列）
         if 'clinical_features' in data:
-            for feature_data in data['clinical_features']:
-                feature = ClinicalFeature(
-                    medical_record_id=record.id,
-                    feature_name=feature_data['name'],
-                    feature_value=feature_data['value'],
-                    feature_type=feature_data.get('type', 'text')
-                )
-                db.session.add(feature)
+            try:
+                sync_clinical_features(record.id, data['clinical_features'])
+            except ValueError as e:
+                db.session.rollback()
+                return error_response(str(e), 400)
 
-        db.session.commit()
+        # 同一事务内更新医生统计
+        record_created(record)
+
+        with event_bus.committing():
+            db.session.commit()
+            publish_record_created(record)
 
         return success_response(
             data=record.to_dict(),
@@ -94,17 +172,57 @@ def create_medical_record():
         return error_response(f'创建失败: {str(e)}')
 
 
+@medical_record_bp.route('/import', methods=['POST'])
+@auth_required
+def import_medical_records():
+    """批量导入病历（CSV 或 NDJSON，流式读取，按批次提交）
+
+    请求体直接为文件内容，或以 multipart 表单的 file 字段上传；
+    格式由 format 参数（csv / ndjson）指定，未指定时按 Content-Type 或文件扩展名判断。
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+
+    file_format = request.args.get('format')
+    if not file_format:
+        name = upload.filename.lower() if upload and upload.filename else ''
+        content_type = request.mimetype if not upload else (upload.mimetype or '')
+        if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+            file_format = 'ndjson'
+        else:
+            file_format = 'csv'
+    if file_format not in ROW_READERS:
+        return error_response('format必须是csv或ndjson', 400)
+
+    try:
+        batch_size = min(max(int(request.args.get('batch_size', DEFAULT_BATCH_SIZE)), 1), 10000)
+    except ValueError:
+        return error_response('batch_size格式错误', 400)
+
+    importer = RecordImporter(request.user_id, batch_size=batch_size)
+    try:
+        summary = importer.run(ROW_READERS[file_format](stream))
+    except (UnicodeDecodeError, csv.Error) as e:
+        # 文件本身无法继续读取；已提交的批次保留
+        summary = importer.summary()
+        summary['aborted'] = f'文件读取失败: {str(e)}'
+
+    return success_response(data=summary, message=f"导入完成：成功 {summary['imported']} 条，失败 {summary['failed']} 条")
+
+
 @medical_record_bp.route('', methods=['GET'])
 @auth_required
 def get_medical_records():
-    """获取病历列表"""
+    """获取病历列表
+
+    可用 ?feature= 按临床特征筛选（可重复，条件之间为“且”），如 ?feature=probing_depth>5&feature=bop=yes
+    """
     # 查询参数
     patient_id = request.args.get('patient_id')
     creator_id = request.args.get('creator_id')
     finalized = request.args.get('finalized')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    page = int(request.args.get('page', 1))
     per_page = min(int(request.args.get('per_page', 20)), 100)
 
     # 构建查询
@@ -141,31 +259,29 @@ def get_medical_records():
         except ValueError:
             return error_response('结束日期格式错误', 400)
 
-    # 排序
-    query = query.order_by(MedicalRecord.visit_date.desc())
-
-    # 分页
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    for predicate in request.args.getlist('feature'):
+        try:
+            query = query.filter(feature_condition(*parse_feature_predicate(predicate)))
+        except ValueError as e:
+            return error_response(str(e), 400)
 
-    records = [record.to_dict() for record in pagination.items]
-
-    return paginated_response(
-        data=records,
-        total=pagination.total,
-        page=page,
-        per_page=per_page,
-        message='查询成功'
-    )
+    return record_list_response(query, per_page)
 
 
 @medical_record_bp.route('/<int:record_id>', methods=['GET'])
 @auth_required
+@conditional_get(record_version)
 def get_medical_record(record_id):
-    """获取单个病历"""
-    record = MedicalRecord.query.get(record_id)
+    """获取单个病历（支持 ?fields= 和 ?embed=）"""
+    try:
+        fields, embed = parse_record_fieldset()
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    record = MedicalRecord.query.options(*MedicalRecord.load_options(fields, embed)).get(record_id)
     if not record:
         return error_response('病历不存在', 404)
-    return success_response(data=record.to_dict())
+    return success_response(data=record.to_dict(fields, embed))
 
 
 @medical_record_bp.route('/<int:record_id>', methods=['PUT'])
@@ -211,20 +327,16 @@ def update_medical_record(record_id):
             except ValueError as e:
                 return error_response(f'就诊日期格式错误: {str(e)}', 400)
 
-        # 更新临床特征
+        # 更新临床特征：按特征名对比，只写入新增、变化和删除的特征
         if 'clinical_features' in data:
-            # 删除原有特征
-            ClinicalFeature.query.filter_by(medical_record_id=record.id).delete()
-
-            # 添加新特征
-            for feature_data in data['clinical_features']:
-                feature = ClinicalFeature(
-                    medical_record_id=record.id,
-                    feature_name=feature_data['name'],
-                    feature_value=feature_data['value'],
-                    feature_type=feature_data.get('type', 'text')
-                )
-                db.session.add(feature)
+            try:
+                feature_changes = sync_clinical_features(record.id, data['clinical_features'])
+            except ValueError as e:
+                db.session.rollback()
+                return error_response(str(e), 400)
+            if any(feature_changes.values()):
+                # 原地更新特征值不会改变特征的最大ID和数量，刷新病历的 updated_at 使病历版本（ETag）随之变化
+                record.updated_at = datetime.utcnow()
 
         db.session.commit()
         return success_response(data=record.to_dict(), message='更新成功')
@@ -279,12 +391,16 @@ def add_clinical_feature(record_id):
     if not data.get('feature_name') or not data.get('feature_value'):
         return error_response('特征名称和值是必填项', 400)
 
+    feature_type = data.get('feature_type', 'text')
+    if feature_type == 'numeric' and ClinicalFeature.parse_numeric(data['feature_value'], feature_type) is None:
+        return error_response('数值型临床特征的值必须是数字', 400)
+
     try:
         feature = ClinicalFeature(
             medical_record_id=record.id,
             feature_name=data['feature_name'],
             feature_value=data['feature_value'],
-            feature_type=data.get('feature_type', 'text')
+            feature_type=feature_type
         )
 
         db.session.add(feature)
@@ -338,20 +454,9 @@ def get_patient_medical_records(patient_id):
     if not patient:
         return error_response('患者不存在', 404)
 
-    page = int(request.args.get('page', 1))
     per_page = min(int(request.args.get('per_page', 20)), 100)
 
     # 查询该患者的所有病历
     query = MedicalRecord.query.filter_by(patient_id=patient_id)
-    query = query.order_by(MedicalRecord.visit_date.desc())
-
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    records = [record.to_dict() for record in pagination.items]
 
-    return paginated_response(
-        data=records,
-        total=pagination.total,
-        page=page,
-        per_page=per_page,
-        message='查询成功'
-    )
\ No newline at end of file
+    return record_list_response(query, per_page)
\ No newline at end of file
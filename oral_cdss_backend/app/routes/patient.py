@@ -2,11 +2,30 @@ from flask import Blueprint, request
 from app import db
 from app.models import Patient
 from app.utils.validation import validate_patient_data
-from app.utils.response import success_response, error_response, paginated_response
+from app.utils.response import success_response, error_response, paginated_response, cursor_response
+from app.utils.pagination import keyset_page, count_total, parse_limit, decode_cursor, encode_cursor
+from app.utils.fieldsets import parse_fieldset
 from app.middlewares.auth_middleware import auth_required
+from app.services.dashboard_events import publish_patient_created, publish_patient_active_changed
+from app.services.patient_upsert import PatientUpserter
+from app.services.patient_search import patient_search_index
+from app.utils.event_bus import event_bus
 
 patient_bp = Blueprint('patient', __name__)
 
+# 批量新增/更新一次请求的患者数上限
+MAX_BULK_PATIENTS = 100000
+# 输入联想默认返回条数和返回的字段
+SUGGEST_LIMIT = 10
+SUGGEST_FIELDS = ('id', 'patient_id', 'full_name', 'gender', 'age', 'phone')
+
+
+def parse_patient_fieldset():
+    """解析 ?fields= 和 ?embed=，返回 (fields, embed)，未传的一项为 None"""
+    fields = parse_fieldset(request.args.get('fields'), Patient.FIELDS, 'fields')
+    embed = parse_fieldset(request.args.get('embed'), Patient.EMBEDS, 'embed')
+    return fields, embed
+
 
 @patient_bp.route('', methods=['POST'])
 @auth_required
@@ -33,7 +52,10 @@ def create_patient():
             patient.age = patient.calculate_age()
 
         db.session.add(patient)
-        db.session.commit()
+        with event_bus.committing():
+            db.session.commit()
+            publish_patient_created(patient)
+        patient_search_index.mark_dirty()
 
         return success_response(
             data=patient.to_dict(),
@@ -45,22 +67,87 @@ def create_patient():
         return error_response(f'创建失败: {str(e)}')
 
 
+@patient_bp.route('/bulk', methods=['POST'])
+@auth_required
+def bulk_upsert_patients():
+    """批量新增/更新患者（按病历号匹配）
+
+    请求体为患者数组，或 {"patients": [...], "update_existing": true}；
+    返回各状态的数量和每一行的结果（created / updated / unchanged / skipped / failed）。
+    """
+    data = request.get_json(silent=True)
+    update_existing = True
+    if isinstance(data, dict):
+        update_existing = data.get('update_existing', True)
+        # 兼容以字符串传递的布尔值，其他值报错（bool("false") 为 True）
+        if isinstance(update_existing, str) and update_existing.strip().lower() in ('true', 'false'):
+            update_existing = update_existing.strip().lower() == 'true'
+        if not isinstance(update_existing, bool):
+            return error_response('update_existing必须是true或false', 400)
+        data = data.get('patients')
+    if not isinstance(data, list):
+        return error_response('请求体必须是患者数组', 400)
+    if len(data) > MAX_BULK_PATIENTS:
+        return error_response(f'单次最多提交{MAX_BULK_PATIENTS}个患者', 400)
+
+    upserter = PatientUpserter(request.user_id, update_existing=update_existing)
+    summary = upserter.run(data)
+    if summary['created'] or summary['updated']:
+        patient_search_index.mark_dirty()
+
+    return success_response(
+        data=summary,
+        message=f"处理完成：新增 {summary['created']}，更新 {summary['updated']}，失败 {summary['failed']}"
+    )
+
+
 @patient_bp.route('', methods=['GET'])
 @auth_required
 def get_patients():
-    """获取患者列表"""
+    """获取患者列表（支持 ?fields= 和 ?embed=medical_records）
+
+    默认按 page / per_page 分页；传 cursor 参数（首页传空值）时改为游标分页，
+    返回 next_cursor，with_total=true 时才统计总数。
+    """
     # 查询参数
     search = request.args.get('search')
-    page = int(request.args.get('page', 1))
     per_page = min(int(request.args.get('per_page', 20)), 100)
     active_only = request.args.get('active_only', 'true').lower() == 'true'
 
-    # 构建查询
-    query = Patient.query
+    try:
+        fields, embed = parse_patient_fieldset()
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    # 构建查询（排序列需要加载，用于生成下一页游标）
+    query = Patient.query.options(*Patient.load_options(fields, embed, extra_columns=('created_at',)))
 
     if active_only:
         query = query.filter_by(is_active=True)
 
+    # 游标分页的搜索走内存索引（按相关度排序），游标为上一页最后一条的 (匹配程度, 创建时间戳, ID)；
+    # 索引构建完成前以及 page 分页仍用 SQL LIKE，SQL 分页返回的游标（两个值）继续走 SQL
+    cursor = request.args.get('cursor')
+    after = None
+    if search and cursor:
+        try:
+            after = tuple(decode_cursor(cursor, 3))
+        except ValueError:
+            after = False
+    if search and 'cursor' in request.args and after is not False:
+        found = patient_search_index.search(search, limit=per_page, active_only=active_only, after=after)
+        if found is not None:
+            patient_ids, total, next_key = found
+            patients = {patient.id: patient for patient in query.filter(Patient.id.in_(patient_ids))} \
+                if patient_ids else {}
+            return cursor_response(
+                data=[patients[pid].to_dict(fields, embed) for pid in patient_ids if pid in patients],
+                next_cursor=encode_cursor(list(next_key)) if next_key else None,
+                per_page=per_page,
+                total=total,
+                message='查询成功'
+            )
+
     if search:
         query = query.filter(
             (Patient.patient_id.like(f'%{search}%')) |
@@ -68,19 +155,75 @@ def get_patients():
             (Patient.phone.like(f'%{search}%'))
         )
 
-    # 排序
-    query = query.order_by(Patient.created_at.desc())
+    # 未传 cursor 参数时保持原有的 OFFSET 分页和响应格式
+    if 'cursor' not in request.args:
+        page = int(request.args.get('page', 1))
+        pagination = query.order_by(Patient.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return paginated_response(
+            data=[patient.to_dict(fields, embed) for patient in pagination.items],
+            total=pagination.total,
+            page=page,
+            per_page=per_page,
+            message='查询成功'
+        )
 
-    # 分页
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # 按 (创建时间, ID) 倒序游标分页，with_total=true 时才统计总数
+    total = None
+    if request.args.get('with_total', 'false').lower() == 'true':
+        total = count_total(query)
 
-    patients = [patient.to_dict() for patient in pagination.items]
+    try:
+        patients, next_cursor = keyset_page(
+            query, [Patient.created_at, Patient.id], cursor=cursor, limit=per_page
+        )
+    except ValueError as e:
+        return error_response(str(e), 400)
 
-    return paginated_response(
-        data=patients,
-        total=pagination.total,
-        page=page,
+    return cursor_response(
+        data=[patient.to_dict(fields, embed) for patient in patients],
+        next_cursor=next_cursor,
         per_page=per_page,
+        total=total,
+        message='查询成功'
+    )
+
+
+@patient_bp.route('/suggest', methods=['GET'])
+@auth_required
+def suggest_patients():
+    """患者输入联想：姓名、姓名全拼或拼音首字母（如 zs、zhangs）以 q 开头，病历号也按前缀匹配"""
+    q = (request.args.get('q') or '').strip()
+    try:
+        limit = parse_limit(request.args.get('limit'), SUGGEST_LIMIT, 50)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    active_only = request.args.get('active_only', 'true').lower() == 'true'
+    if not q:
+        return success_response(data=[], message='查询成功')
+
+    query = Patient.query.options(*Patient.load_options(SUGGEST_FIELDS))
+    if active_only:
+        query = query.filter_by(is_active=True)
+
+    patient_ids = patient_search_index.suggest(q, limit=limit, active_only=active_only)
+    if patient_ids is not None:
+        patients = {patient.id: patient for patient in query.filter(Patient.id.in_(patient_ids))} \
+            if patient_ids else {}
+        suggestions = [patients[pid] for pid in patient_ids if pid in patients]
+    else:
+        # 索引构建完成前用前缀 LIKE（可使用拼音列上的索引）
+        key = q.lower()
+        suggestions = query.filter(
+            (Patient.name_pinyin.like(f'{key}%')) |
+            (Patient.name_initials.like(f'{key}%')) |
+            (Patient.full_name.like(f'{q}%')) |
+            (Patient.patient_id.like(f'{q}%'))
+        ).order_by(Patient.name_pinyin).limit(limit).all()
+
+    return success_response(
+        data=[patient.to_dict(SUGGEST_FIELDS) for patient in suggestions],
         message='查询成功'
     )
 
@@ -88,9 +231,14 @@ def get_patients():
 @patient_bp.route('/<int:patient_id>', methods=['GET'])
 @auth_required
 def get_patient(patient_id):
-    """获取单个患者"""
-    patient = Patient.query.get_or_404(patient_id)
-    return success_response(data=patient.to_dict())
+    """获取单个患者（支持 ?fields= 和 ?embed=medical_records）"""
+    try:
+        fields, embed = parse_patient_fieldset()
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    patient = Patient.query.options(*Patient.load_options(fields, embed)).get_or_404(patient_id)
+    return success_response(data=patient.to_dict(fields, embed))
 
 
 @patient_bp.route('/<int:patient_id>', methods=['PUT'])
@@ -117,6 +265,7 @@ def update_patient(patient_id):
             patient.age = patient.calculate_age()
 
         db.session.commit()
+        patient_search_index.mark_dirty()
         return success_response(data=patient.to_dict(), message='更新成功')
 
     except Exception as e:
@@ -136,8 +285,13 @@ def delete_patient(patient_id):
     patient = Patient.query.get_or_404(patient_id)
 
     try:
+        changed = patient.is_active
         patient.is_active = False
-        db.session.commit()
+        with event_bus.committing():
+            db.session.commit()
+            if changed:
+                publish_patient_active_changed(patient)
+        patient_search_index.mark_dirty()
         return success_response(message='患者已停用')
 
     except Exception as e:
@@ -157,8 +311,13 @@ def reactivate_patient(patient_id):
     patient = Patient.query.get_or_404(patient_id)
 
     try:
+        changed = not patient.is_active
         patient.is_active = True
-        db.session.commit()
+        with event_bus.committing():
+            db.session.commit()
+            if changed:
+                publish_patient_active_changed(patient)
+        patient_search_index.mark_dirty()
         return success_response(message='患者已重新激活')
 
     except Exception as e:
@@ -1,123 +1,309 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, current_app, request, stream_with_context
 from datetime import datetime, timedelta
-from sqlalchemy import func, case, extract
+import json
+from sqlalchemy import func, case, select
 from app import db
-from app.models import AssessmentResult, MedicalRecord, User, Patient
+from app.models import (AssessmentResult, AssessmentCategoryScore, AssessmentRuleEvaluation, AssessmentDailyStat,
+                        AssessmentPeriodStat, DoctorStat, MedicalRecord, Rule, User, Patient)
+from app.services.assessment_rollup import period_start
+from app.services.data_version import analytics_version, request_analytics_version
+from app.services.patient_stats import age_distribution
+from app.services.assessment_details import load_stored_value
+from app.services.assessment_export import DEFAULT_CHUNK_SIZE, stream_export
 from app.utils.response import success_response, error_response
-from app.middlewares.auth_middleware import auth_required
-import json
+from app.utils.event_bus import event_bus
+from app.utils.cache import TTLCache
+from app.utils.etag import conditional_get
+from app.utils.downsample import lttb_indices
+from app.utils.pagination import parse_limit
+from app.middlewares.auth_middleware import auth_required, authenticate
 
 visualization_bp = Blueprint('visualization', __name__)
 
+# 统计接口共用同一个数据版本：数据未变化时对 If-None-Match 直接返回304
+analytics_etag = conditional_get(lambda *args, **kwargs: request_analytics_version())
 
-@visualization_bp.route('/dashboard-stats', methods=['GET'])
-@auth_required
-def get_dashboard_statistics():
-    """获取仪表盘统计数据"""
 
-    # 总体统计
-    total_patients = db.session.query(func.count(Patient.id)).filter_by(is_active=True).scalar()
-    total_records = db.session.query(func.count(MedicalRecord.id)).scalar()
-    total_assessments = db.session.query(func.count(AssessmentResult.id)).filter_by(is_latest=True).scalar()
+# 仪表盘统计缓存：短时间内的重复请求直接复用，过期时并发请求只计算一次
+DASHBOARD_STATS_TTL = 10
+dashboard_cache = TTLCache(default_ttl=DASHBOARD_STATS_TTL)
 
-    # 今日统计
-    today = datetime.now().date()
+
+def compute_dashboard_statistics(today=None):
+    """计算仪表盘统计数据（两次查询），today.* 按 today 当天统计（默认今天）"""
+    today = today or datetime.now().date()
     today_start = datetime.combine(today, datetime.min.time())
     today_end = datetime.combine(today, datetime.max.time())
 
-    today_patients = db.session.query(func.count(Patient.id)).filter(
-        Patient.created_at >= today_start,
-        Patient.created_at <= today_end
-    ).scalar() or 0
-
-    today_records = db.session.query(func.count(MedicalRecord.id)).filter(
-        MedicalRecord.created_at >= today_start,
-        MedicalRecord.created_at <= today_end
-    ).scalar() or 0
-
-    today_assessments = db.session.query(func.count(AssessmentResult.id)).filter(
-        AssessmentResult.assessed_at >= today_start,
-        AssessmentResult.assessed_at <= today_end
-    ).scalar() or 0
-
-    # 成功率统计
-    success_stats = db.session.query(
-        func.avg(AssessmentResult.success_probability).label('avg_success_rate'),
+    # 计数类统计合并为一条由标量子查询组成的语句
+    counts = db.session.query(
+        select(func.count(Patient.id)).where(
+            Patient.is_active == True
+        ).scalar_subquery().label('total_patients'),
+        select(func.count(MedicalRecord.id)).scalar_subquery().label('total_records'),
+        select(func.count(Patient.id)).where(
+            Patient.created_at >= today_start,
+            Patient.created_at <= today_end
+        ).scalar_subquery().label('today_patients'),
+        select(func.count(MedicalRecord.id)).where(
+            MedicalRecord.created_at >= today_start,
+            MedicalRecord.created_at <= today_end
+        ).scalar_subquery().label('today_records'),
+        select(func.count(AssessmentResult.id)).where(
+            AssessmentResult.assessed_at >= today_start,
+            AssessmentResult.assessed_at <= today_end
+        ).scalar_subquery().label('today_assessments')
+    ).one()
+
+    # 最新评估按 (风险等级, 治疗方案) 一次分组，分布和成功率都由此得出
+    groups = db.session.query(
+        AssessmentResult.risk_level,
+        AssessmentResult.recommended_treatment,
+        func.count(AssessmentResult.id).label('count'),
+        func.count(AssessmentResult.success_probability).label('success_count'),
+        func.sum(AssessmentResult.success_probability).label('success_sum'),
         func.min(AssessmentResult.success_probability).label('min_success_rate'),
         func.max(AssessmentResult.success_probability).label('max_success_rate')
     ).filter(
         AssessmentResult.is_latest == True
-    ).first()
-
-    # 风险等级分布
-    risk_distribution = db.session.query(
-        AssessmentResult.risk_level,
-        func.count(AssessmentResult.id).label('count')
-    ).filter(
-        AssessmentResult.is_latest == True
-    ).group_by(
-        AssessmentResult.risk_level
-    ).all()
-
-    # 治疗类型分布
-    treatment_distribution = db.session.query(
-        AssessmentResult.recommended_treatment,
-        func.count(AssessmentResult.id).label('count')
-    ).filter(
-        AssessmentResult.is_latest == True,
-        AssessmentResult.recommended_treatment.isnot(None)
     ).group_by(
+        AssessmentResult.risk_level,
         AssessmentResult.recommended_treatment
     ).all()
 
-    return success_response({
+    total_assessments = 0
+    success_count = 0
+    success_sum = 0.0
+    min_success = None
+    max_success = None
+    risk_distribution = {}
+    treatment_distribution = {}
+    for item in groups:
+        total_assessments += item.count
+        success_count += item.success_count
+        success_sum += float(item.success_sum or 0)
+        if item.min_success_rate is not None:
+            min_success = item.min_success_rate if min_success is None else min(min_success, item.min_success_rate)
+        if item.max_success_rate is not None:
+            max_success = item.max_success_rate if max_success is None else max(max_success, item.max_success_rate)
+
+        risk_distribution[item.risk_level] = risk_distribution.get(item.risk_level, 0) + item.count
+        if item.recommended_treatment is not None:
+            treatment_distribution[item.recommended_treatment] = \
+                treatment_distribution.get(item.recommended_treatment, 0) + item.count
+
+    return {
         'overall': {
-            'total_patients': total_patients,
-            'total_records': total_records,
+            'total_patients': counts.total_patients,
+            'total_records': counts.total_records,
             'total_assessments': total_assessments
         },
         'today': {
-            'new_patients': today_patients,
-            'new_records': today_records,
-            'new_assessments': today_assessments
+            'new_patients': counts.today_patients or 0,
+            'new_records': counts.today_records or 0,
+            'new_assessments': counts.today_assessments or 0
         },
         'success_rates': {
-            'average': float(success_stats.avg_success_rate or 0),
-            'minimum': float(success_stats.min_success_rate or 0),
-            'maximum': float(success_stats.max_success_rate or 0)
-        },
-        'risk_distribution': {
-            item.risk_level: item.count for item in risk_distribution
+            'average': success_sum / success_count if success_count else 0.0,
+            'minimum': float(min_success or 0),
+            'maximum': float(max_success or 0)
         },
-        'treatment_distribution': {
-            item.recommended_treatment: item.count for item in treatment_distribution
-        }
-    }, '查询成功')
+        'risk_distribution': risk_distribution,
+        'treatment_distribution': treatment_distribution
+    }
+
+
+@visualization_bp.route('/dashboard-stats', methods=['GET'])
+@auth_required
+@analytics_etag
+def get_dashboard_statistics():
+    """获取仪表盘统计数据"""
+    # 缓存键带上数据版本，避免写入后仍返回旧数据却配上新的ETag；带上日期，跨天后不复用前一天的 today.* 计数
+    today = datetime.now().date()
+    data = dashboard_cache.get_or_compute(('dashboard-stats', today, request_analytics_version()),
+                                          lambda: compute_dashboard_statistics(today))
+    return success_response(data, '查询成功')
+
+
+# SSE心跳间隔（秒），防止代理关闭空闲连接
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def format_sse(event_id, event_type, data):
+    """格式化一条SSE消息"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def take_dashboard_snapshot(today):
+    """取 today 当天的仪表盘快照，返回 (快照, 快照对应的事件ID)
+
+    统计在事件总线的闸门外计算（缓存命中时直接复用），不阻塞写操作的提交；
+    ID不大于快照事件ID的事件都已计入快照，之后的事件都未计入。
+    """
+    def compute():
+        # 结束当前事务，使统计读取到最新提交的数据（MySQL 可重复读下事务内读取的是旧快照）
+        db.session.rollback()
+        return dashboard_cache.get_or_compute(
+            ('dashboard-stats', today, analytics_version()), lambda: compute_dashboard_statistics(today)
+        )
+
+    return event_bus.snapshot(compute)
+
+
+@visualization_bp.route('/dashboard-stream', methods=['GET'])
+def stream_dashboard_updates():
+    """仪表盘增量事件流（Server-Sent Events）
+
+    连接时先推送一次完整快照（snapshot），之后推送写操作发布的增量事件，
+    客户端据此更新计数，无需轮询。断线重连带 Last-Event-ID 时从事件历史补发，
+    历史不足或跨天时重新推送快照。EventSource 无法设置请求头，令牌也可通过 ?token= 传递。
+    事件来自进程内事件总线，多进程部署时每个连接只能收到同一进程内的写操作。
+    today.* 计数按天统计，连接跨过零点时推送新的快照。
+    每个连接在同步 WSGI 服务器上占用一个工作线程，生产环境需使用 gevent 等协程 worker（见 README）。
+    """
+    auth_result = authenticate(request.headers.get('Authorization') or request.args.get('token'))
+    if auth_result:
+        return auth_result
+
+    # 先订阅再取快照，避免两者之间发布的事件丢失
+    subscription = event_bus.subscribe()
+
+    today = datetime.now().date()
+    backlog = None
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id and last_event_id.isdigit():
+        # 客户端最后收到的事件不是今天发布的（或已不在历史中）时，其 today.* 计数可能已过期
+        last_event_time = event_bus.event_time(int(last_event_id))
+        if last_event_time and last_event_time.date() == today:
+            backlog = event_bus.events_since(int(last_event_id))
+
+    snapshot, snapshot_id = None, None
+    if backlog is None:
+        try:
+            snapshot, snapshot_id = take_dashboard_snapshot(today)
+        except Exception:
+            event_bus.unsubscribe(subscription)
+            raise
+    # 流式响应期间不再访问数据库，提前归还连接
+    db.session.remove()
+    app = current_app._get_current_object()
+
+    def generate():
+        last_sent = snapshot_id if snapshot is not None else int(last_event_id)
+        snapshot_day = today
+        try:
+            yield f'retry: {SSE_HEARTBEAT_SECONDS * 1000}\n\n'
+            if snapshot is not None:
+                yield format_sse(snapshot_id, 'snapshot', snapshot)
+            for event in backlog or []:
+                yield format_sse(event['id'], event['type'], event['data'])
+                last_sent = event['id']
+
+            while True:
+                if datetime.now().date() != snapshot_day:
+                    # 跨天后 today.* 计数归零，推送新的快照（队列中已计入快照的事件随后按ID跳过）
+                    snapshot_day = datetime.now().date()
+                    with app.app_context():
+                        day_snapshot, last_sent = take_dashboard_snapshot(snapshot_day)
+                        db.session.remove()
+                    yield format_sse(last_sent, 'snapshot', day_snapshot)
+
+                event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if subscription.overflowed:
+                    # 客户端消费过慢，通知其重连后按快照重新同步
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event['id'] <= last_sent:
+                    continue
+                yield format_sse(event['id'], event['type'], event['data'])
+                last_sent = event['id']
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # 连接在生成器开始前就关闭时 finally 不会执行，这里兜底取消订阅
+    response.call_on_close(lambda: event_bus.unsubscribe(subscription))
+    return response
+
+
+# 自动粒度时每个序列的最大点数
+AUTO_MAX_POINTS = 180
+# 时间跨度参数 days 的上限（约10年），过大的值会使日期计算溢出
+MAX_DAYS = 3650
+
+
+def parse_days(value, default):
+    """解析时间跨度参数 days，超出 1 到 MAX_DAYS 时抛出 ValueError"""
+    if value is None or value == '':
+        return default
+    try:
+        days = int(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError('days必须是整数') from e
+    if not 1 <= days <= MAX_DAYS:
+        raise ValueError(f'days必须在1到{MAX_DAYS}之间')
+    return days
+
+
+def choose_granularity(days):
+    """按时间跨度自动选择粒度，使点数不超过 AUTO_MAX_POINTS"""
+    if days <= AUTO_MAX_POINTS:
+        return 'day'
+    if days / 7 <= AUTO_MAX_POINTS:
+        return 'week'
+    return 'month'
 
 
 @visualization_bp.route('/success-chart', methods=['GET'])
 @auth_required
+@analytics_etag
 def get_success_chart_data():
-    """获取成功率图表数据"""
-    # 时间范围参数
-    days = int(request.args.get('days', 30))
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
+    """获取成功率图表数据
 
-    # 按日期分组统计
-    daily_stats = db.session.query(
-        func.date(AssessmentResult.assessed_at).label('date'),
-        func.count(AssessmentResult.id).label('count'),
-        func.avg(AssessmentResult.success_probability).label('avg_success'),
-        func.avg(AssessmentResult.total_score).label('avg_score')
+    granularity 可选 auto / day / week / month（默认 auto，按 days 自动加宽时间桶）；
+    max_points 指定时用 LTTB 算法把点数降到不超过该值。数据来自日汇总和周/月汇总表。
+    """
+    # 时间范围参数
+    try:
+        days = parse_days(request.args.get('days'), 30)
+        max_points = request.args.get('max_points')
+        max_points = int(max_points) if max_points else None
+    except ValueError as e:
+        return error_response(f'参数格式错误: {str(e)}', 400)
+    if max_points is not None and max_points < 3:
+        return error_response('max_points不能小于3', 400)
+
+    granularity = request.args.get('granularity', 'auto')
+    if granularity == 'auto':
+        granularity = choose_granularity(days)
+    elif granularity not in ('day', 'week', 'month'):
+        return error_response('granularity必须是auto、day、week或month', 400)
+
+    end_date = datetime.now().date()
+    start_date = period_start(end_date - timedelta(days=days), granularity)
+
+    # 合并同一周期内各风险等级/治疗方案的汇总行
+    model, period_column, filters = rollup_source(granularity)
+    period_stats = db.session.query(
+        period_column.label('date'),
+        func.sum(model.assessment_count).label('count'),
+        func.sum(model.success_sum).label('success_sum'),
+        func.sum(model.score_sum).label('score_sum')
     ).filter(
-        AssessmentResult.is_latest == True,
-        AssessmentResult.assessed_at >= start_date,
-        AssessmentResult.assessed_at <= end_date
+        *filters,
+        period_column >= start_date,
+        period_column <= end_date
     ).group_by(
-        func.date(AssessmentResult.assessed_at)
+        period_column
+    ).having(
+        func.sum(model.assessment_count) > 0
     ).order_by(
-        func.date(AssessmentResult.assessed_at)
+        period_column
     ).all()
 
     dates = []
@@ -125,13 +311,27 @@ def get_success_chart_data():
     success_rates = []
     scores = []
 
-    for stat in daily_stats:
+    for stat in period_stats:
+        count = int(stat.count)
         dates.append(stat.date.isoformat())
-        counts.append(stat.count)
-        success_rates.append(float(stat.avg_success or 0))
-        scores.append(float(stat.avg_score or 0))
+        counts.append(count)
+        success_rates.append(float(stat.success_sum or 0) / count)
+        scores.append(float(stat.score_sum or 0) / count)
+
+    downsampled = False
+    if max_points is not None and len(dates) > max_points:
+        # 以成功率曲线的形状选点，其余序列取相同的点
+        xs = [stat.date.toordinal() for stat in period_stats]
+        keep = lttb_indices(xs, success_rates, max_points)
+        dates = [dates[i] for i in keep]
+        counts = [counts[i] for i in keep]
+        success_rates = [success_rates[i] for i in keep]
+        scores = [scores[i] for i in keep]
+        downsampled = True
 
     return success_response({
+        'granularity': granularity,
+        'downsampled': downsampled,
         'dates': dates,
         'counts': counts,
         'success_rates': success_rates,
@@ -141,6 +341,7 @@ def get_success_chart_data():
 
 @visualization_bp.route('/radar-chart/<int:record_id>', methods=['GET'])
 @auth_required
+@analytics_etag
 def get_radar_chart_data(record_id):
     """获取雷达图数据"""
     assessment = AssessmentResult.query.filter_by(
@@ -152,15 +353,19 @@ def get_radar_chart_data(record_id):
         return error_response('未找到评估结果', 404)
 
     try:
-        # 检查是否有category_scores字段
-        if not hasattr(assessment, 'category_scores'):
-            return error_response('评估结果格式错误', 400)
-
-        # 解析JSON数据
-        if isinstance(assessment.category_scores, str):
-            category_scores = json.loads(assessment.category_scores)
+        # 优先读取类别得分明细表；早期评估没有明细时解析文本字段
+        items = AssessmentCategoryScore.query.filter_by(
+            assessment_id=assessment.id
+        ).order_by(
+            AssessmentCategoryScore.id
+        ).all()
+
+        if items:
+            category_scores = {item.category_name: {'weighted_score': item.weighted_score} for item in items}
         else:
-            category_scores = assessment.category_scores or {}
+            category_scores = load_stored_value(assessment.category_scores, {})
+            if not isinstance(category_scores, dict):
+                return error_response('评估结果格式错误', 400)
 
         categories = []
         scores = []
@@ -191,45 +396,188 @@ def get_radar_chart_data(record_id):
             'risk_level': assessment.risk_level or 'unknown'
         }, '查询成功')
 
-    except (json.JSONDecodeError, ValueError) as e:
+    except (TypeError, ValueError) as e:
         return error_response(f'数据处理失败: {str(e)}', 400)
 
 
+def parse_date_arg(value):
+    """解析日期查询参数（YYYY-MM-DD 或 ISO 时间），返回 date"""
+    value = value.replace('Z', '+00:00') if 'Z' in value else value
+    return datetime.fromisoformat(value).date()
+
+
+def parse_range_args(default_days):
+    """解析 start_date / end_date / days 参数，返回 [开始时间, 结束时间) 区间"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+
+    end_day = parse_date_arg(end_date) if end_date else datetime.now().date()
+    if start_date:
+        start_day = parse_date_arg(start_date)
+    else:
+        start_day = end_day - timedelta(days=parse_days(request.args.get('days'), default_days))
+
+    return (datetime.combine(start_day, datetime.min.time()),
+            datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
+
+
+@visualization_bp.route('/rule-hit-rates', methods=['GET'])
+@auth_required
+@analytics_etag
+def get_rule_hit_rates():
+    """获取规则命中率（按最新评估统计，可指定日期范围）"""
+    try:
+        range_start, range_end = parse_range_args(default_days=90)
+        limit = parse_limit(request.args.get('limit'), 20, 100)
+    except (ValueError, OverflowError) as e:
+        return error_response(f'参数格式错误: {str(e)}', 400)
+
+    period = [
+        AssessmentResult.is_latest == True,
+        AssessmentResult.assessed_at >= range_start,
+        AssessmentResult.assessed_at < range_end
+    ]
+
+    total = db.session.query(func.count(AssessmentResult.id)).filter(*period).scalar() or 0
+
+    hits = db.session.query(
+        AssessmentRuleEvaluation.rule_id,
+        Rule.name,
+        AssessmentRuleEvaluation.category_name,
+        func.count(AssessmentRuleEvaluation.id).label('hit_count'),
+        func.sum(
+            case((AssessmentResult.risk_level == 'high', 1), else_=0)
+        ).label('high_risk_count')
+    ).join(
+        AssessmentResult, AssessmentResult.id == AssessmentRuleEvaluation.assessment_id
+    ).join(
+        Rule, Rule.id == AssessmentRuleEvaluation.rule_id
+    ).filter(
+        *period
+    ).group_by(
+        AssessmentRuleEvaluation.rule_id,
+        Rule.name,
+        AssessmentRuleEvaluation.category_name
+    ).order_by(
+        func.count(AssessmentRuleEvaluation.id).desc()
+    ).limit(limit).all()
+
+    rules = []
+    for hit in hits:
+        rules.append({
+            'rule_id': hit.rule_id,
+            'rule_name': hit.name,
+            'category': hit.category_name,
+            'hit_count': hit.hit_count,
+            'hit_rate': hit.hit_count / total * 100 if total else 0.0,
+            'high_risk_rate': float(hit.high_risk_count or 0) / hit.hit_count * 100 if hit.hit_count else 0.0
+        })
+
+    return success_response({
+        'total_assessments': total,
+        'rules': rules
+    }, '查询成功')
+
+
+@visualization_bp.route('/category-trend', methods=['GET'])
+@auth_required
+@analytics_etag
+def get_category_trend():
+    """获取各类别平均加权得分的每日趋势（按最新评估统计）"""
+    try:
+        range_start, range_end = parse_range_args(default_days=30)
+    except (ValueError, OverflowError) as e:
+        return error_response(f'参数格式错误: {str(e)}', 400)
+    category = request.args.get('category')
+
+    stat_date = func.date(AssessmentResult.assessed_at)
+    query = db.session.query(
+        stat_date.label('date'),
+        AssessmentCategoryScore.category_name,
+        func.avg(AssessmentCategoryScore.weighted_score).label('avg_score')
+    ).join(
+        AssessmentResult, AssessmentResult.id == AssessmentCategoryScore.assessment_id
+    ).filter(
+        AssessmentResult.is_latest == True,
+        AssessmentResult.assessed_at >= range_start,
+        AssessmentResult.assessed_at < range_end
+    )
+    if category:
+        query = query.filter(AssessmentCategoryScore.category_name == category)
+
+    rows = query.group_by(
+        stat_date,
+        AssessmentCategoryScore.category_name
+    ).order_by(
+        stat_date
+    ).all()
+
+    dates = []
+    series = {}
+    for row in rows:
+        day = str(row.date)
+        if not dates or dates[-1] != day:
+            dates.append(day)
+        series.setdefault(row.category_name, {})[day] = float(row.avg_score or 0)
+
+    return success_response({
+        'dates': dates,
+        'series': {
+            name: [scores.get(day) for day in dates] for name, scores in series.items()
+        }
+    }, '查询成功')
+
+
+@visualization_bp.route('/export/assessments', methods=['GET'])
+@auth_required
+def export_assessments():
+    """导出评估数据（分块列式 .npz，流式下载，仅管理员）
+
+    参数：start_date / end_date（按评估日期，含两端）、latest_only、chunk_size。
+    数据经服务端游标分块读取并逐块压缩输出，导出行数再多内存占用也只与块大小有关。
+    """
+    if request.user_role != 'admin':
+        return error_response('权限不足', 403)
+
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    try:
+        start = datetime.combine(parse_date_arg(start_date), datetime.min.time()) if start_date else None
+        end = datetime.combine(parse_date_arg(end_date) + timedelta(days=1), datetime.min.time()) \
+            if end_date else None
+        chunk_size = min(max(int(request.args.get('chunk_size', DEFAULT_CHUNK_SIZE)), 1000), 200000)
+    except ValueError:
+        return error_response('参数格式错误', 400)
+    latest_only = request.args.get('latest_only', 'false').lower() == 'true'
+
+    filename = f"assessments_{datetime.now():%Y%m%d%H%M%S}.npz"
+    response = Response(
+        stream_with_context(stream_export(chunk_size, start=start, end=end, latest_only=latest_only)),
+        mimetype='application/zip'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
 @visualization_bp.route('/doctor-stats', methods=['GET'])
 @auth_required
+@analytics_etag
 def get_doctor_statistics():
-    """获取医生工作统计"""
-    # 按医生统计
+    """获取医生工作统计（读取增量维护的医生统计表，患者数为HyperLogLog估计值）"""
     doctor_stats = db.session.query(
-        User.id,
-        User.full_name,
-        func.count(MedicalRecord.id).label('record_count'),
-        func.avg(AssessmentResult.success_probability).label('avg_success_rate'),
-        func.count(func.distinct(Patient.id)).label('patient_count')
-    ).join(
-        MedicalRecord, MedicalRecord.creator_id == User.id
+        DoctorStat,
+        User.full_name
     ).join(
-        AssessmentResult, AssessmentResult.medical_record_id == MedicalRecord.id
-    ).join(
-        Patient, Patient.id == MedicalRecord.patient_id
+        User, User.id == DoctorStat.doctor_id
     ).filter(
-        User.role.in_(['doctor', 'intern']),
-        AssessmentResult.is_latest == True
-    ).group_by(
-        User.id
+        User.role.in_(['doctor', 'intern'])
     ).order_by(
-        func.count(MedicalRecord.id).desc()
+        DoctorStat.record_count.desc()
     ).all()
 
     statistics = []
-    for stat in doctor_stats:
-        statistics.append({
-            'doctor_id': stat.id,
-            'doctor_name': stat.full_name,
-            'record_count': stat.record_count or 0,
-            'average_success_rate': float(stat.avg_success_rate or 0),
-            'patient_count': stat.patient_count or 0
-        })
+    for stat, full_name in doctor_stats:
+        statistics.append(dict(stat.to_dict(), doctor_name=full_name))
 
     return success_response({
         'doctor_statistics': statistics
@@ -238,135 +586,224 @@ def get_doctor_statistics():
 
 @visualization_bp.route('/treatment-comparison', methods=['GET'])
 @auth_required
+@analytics_etag
 def get_treatment_comparison():
-    """获取治疗方案对比数据"""
+    """获取治疗方案对比数据
+
+    可选参数 start_date / end_date（按评估日期，含两端）和 doctor_id（病历创建医生）。
+    未指定医生时从日汇总表分组；指定医生时对最新评估做一次分组查询。
+    """
     treatments = ['full_crown', 'implant', 'bridge', 'filling', 'root_canal', 'extraction']
 
-    comparison_data = []
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    doctor_id = request.args.get('doctor_id')
+
+    try:
+        start_day = parse_date_arg(start_date) if start_date else None
+    except ValueError:
+        return error_response('开始日期格式错误', 400)
+    try:
+        end_day = parse_date_arg(end_date) if end_date else None
+    except ValueError:
+        return error_response('结束日期格式错误', 400)
+    if doctor_id:
+        try:
+            doctor_id = int(doctor_id)
+        except ValueError:
+            return error_response('医生ID格式错误', 400)
+
+    if doctor_id:
+        # 日汇总表不区分医生，按病历创建者过滤时直接聚合最新评估
+        filters = [
+            AssessmentResult.is_latest == True,
+            AssessmentResult.recommended_treatment.in_(treatments),
+            MedicalRecord.creator_id == doctor_id
+        ]
+        if start_day:
+            filters.append(AssessmentResult.assessed_at >= datetime.combine(start_day, datetime.min.time()))
+        if end_day:
+            filters.append(AssessmentResult.assessed_at <
+                           datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
 
-    for treatment in treatments:
         stats = db.session.query(
+            AssessmentResult.recommended_treatment,
             func.count(AssessmentResult.id).label('count'),
-            func.avg(AssessmentResult.success_probability).label('avg_success'),
-            func.avg(AssessmentResult.total_score).label('avg_score'),
-            func.avg(
+            func.coalesce(func.sum(AssessmentResult.success_probability), 0).label('success_sum'),
+            func.coalesce(func.sum(AssessmentResult.total_score), 0).label('score_sum'),
+            func.sum(
+                case((AssessmentResult.risk_level == 'high', 1), else_=0)
+            ).label('high_risk_count')
+        ).join(
+            MedicalRecord, MedicalRecord.id == AssessmentResult.medical_record_id
+        ).filter(
+            *filters
+        ).group_by(
+            AssessmentResult.recommended_treatment
+        ).all()
+    else:
+        # 从日汇总表一次分组得到各治疗方案的统计
+        filters = [AssessmentDailyStat.recommended_treatment.in_(treatments)]
+        if start_day:
+            filters.append(AssessmentDailyStat.stat_date >= start_day)
+        if end_day:
+            filters.append(AssessmentDailyStat.stat_date <= end_day)
+
+        stats = db.session.query(
+            AssessmentDailyStat.recommended_treatment,
+            func.sum(AssessmentDailyStat.assessment_count).label('count'),
+            func.sum(AssessmentDailyStat.success_sum).label('success_sum'),
+            func.sum(AssessmentDailyStat.score_sum).label('score_sum'),
+            func.sum(
                 case(
-                    [(AssessmentResult.risk_level == 'high', 1)],
+                    (AssessmentDailyStat.risk_level == 'high', AssessmentDailyStat.assessment_count),
                     else_=0
                 )
-            ).label('high_risk_rate')
+            ).label('high_risk_count')
         ).filter(
-            AssessmentResult.recommended_treatment == treatment,
-            AssessmentResult.is_latest == True
-        ).first()
+            *filters
+        ).group_by(
+            AssessmentDailyStat.recommended_treatment
+        ).all()
+
+    stats_by_treatment = {stat.recommended_treatment: stat for stat in stats}
+
+    comparison_data = []
+
+    for treatment in treatments:
+        stat = stats_by_treatment.get(treatment)
+        count = int(stat.count or 0) if stat else 0
 
         comparison_data.append({
             'treatment': treatment,
-            'count': stats.count or 0,
-            'average_success_rate': float(stats.avg_success or 0),
-            'average_score': float(stats.avg_score or 0),
-            'high_risk_rate': float(stats.high_risk_rate or 0) * 100
+            'count': count,
+            'average_success_rate': float(stat.success_sum or 0) / count if count else 0.0,
+            'average_score': float(stat.score_sum or 0) / count if count else 0.0,
+            'high_risk_rate': float(stat.high_risk_count or 0) / count * 100 if count else 0.0
         })
 
     return success_response({
-        'comparison': comparison_data
+        'comparison': comparison_data,
+        'filters': {
+            'start_date': start_day.isoformat() if start_day else None,
+            'end_date': end_day.isoformat() if end_day else None,
+            'doctor_id': doctor_id or None
+        }
     }, '查询成功')
 
 
+def rollup_source(granularity):
+    """按粒度选择汇总表，返回 (模型, 周期起始列, 过滤条件)"""
+    if granularity == 'day':
+        return AssessmentDailyStat, AssessmentDailyStat.stat_date, []
+    return (AssessmentPeriodStat, AssessmentPeriodStat.period_start,
+            [AssessmentPeriodStat.granularity == granularity])
+
+
+def period_label(start, granularity):
+    """周期标签：日 2024-03-05，周 2024-W10（ISO周），月 2024-03"""
+    if granularity == 'week':
+        iso_year, iso_week, _ = start.isocalendar()
+        return f"{iso_year}-W{str(iso_week).zfill(2)}"
+    if granularity == 'month':
+        return start.strftime('%Y-%m')
+    return start.isoformat()
+
+
 @visualization_bp.route('/risk-trend', methods=['GET'])
 @auth_required
+@analytics_etag
 def get_risk_trend():
-    """获取风险趋势数据"""
+    """获取风险趋势数据
+
+    granularity 可选 day / week / month（默认 week）；日粒度读日汇总表，周/月读周期汇总表，
+    不依赖数据库特定的日期函数。
+    """
     # 时间范围参数
-    days = int(request.args.get('days', 90))
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
-
-    # 按周统计风险趋势
-    weekly_stats = db.session.query(
-        func.year(AssessmentResult.assessed_at).label('year'),
-        func.week(AssessmentResult.assessed_at).label('week'),
-        func.count(AssessmentResult.id).label('total_count'),
-        func.sum(case([(AssessmentResult.risk_level == 'high', 1)], else_=0)).label('high_risk_count'),
-        func.sum(case([(AssessmentResult.risk_level == 'medium', 1)], else_=0)).label('medium_risk_count'),
-        func.sum(case([(AssessmentResult.risk_level == 'low', 1)], else_=0)).label('low_risk_count'),
-        func.avg(AssessmentResult.success_probability).label('avg_success')
+    try:
+        days = parse_days(request.args.get('days'), 90)
+    except ValueError as e:
+        return error_response(f'参数格式错误: {str(e)}', 400)
+    granularity = request.args.get('granularity', 'week')
+    if granularity not in ('day', 'week', 'month'):
+        return error_response('granularity必须是day、week或month', 400)
+
+    end_date = datetime.now().date()
+    start_date = period_start(end_date - timedelta(days=days), granularity)
+
+    model, period_column, filters = rollup_source(granularity)
+
+    period_stats = db.session.query(
+        period_column.label('period_start'),
+        model.risk_level,
+        func.sum(model.assessment_count).label('count'),
+        func.sum(model.success_sum).label('success_sum')
     ).filter(
-        AssessmentResult.is_latest == True,
-        AssessmentResult.assessed_at >= start_date,
-        AssessmentResult.assessed_at <= end_date
+        *filters,
+        period_column >= start_date,
+        period_column <= end_date
     ).group_by(
-        func.year(AssessmentResult.assessed_at),
-        func.week(AssessmentResult.assessed_at)
-    ).order_by(
-        func.year(AssessmentResult.assessed_at),
-        func.week(AssessmentResult.assessed_at)
+        period_column,
+        model.risk_level
     ).all()
 
-    weeks = []
+    periods = {}
+    for stat in period_stats:
+        period = periods.setdefault(stat.period_start, {
+            'total_count': 0, 'high': 0, 'medium': 0, 'low': 0, 'success_sum': 0.0
+        })
+        count = int(stat.count or 0)
+        period['total_count'] += count
+        period['success_sum'] += float(stat.success_sum or 0)
+        if stat.risk_level in ('high', 'medium', 'low'):
+            period[stat.risk_level] += count
+
+    labels = []
     high_risk_percentages = []
     medium_risk_percentages = []
     low_risk_percentages = []
     avg_success_rates = []
 
-    for stat in weekly_stats:
-        week_label = f"{stat.year}-W{str(stat.week).zfill(2)}"
-        weeks.append(week_label)
+    for start, stat in sorted(periods.items()):
+        if stat['total_count'] <= 0:
+            continue
 
-        total = stat.total_count or 1
-        high_risk_percentages.append((stat.high_risk_count or 0) / total * 100)
-        medium_risk_percentages.append((stat.medium_risk_count or 0) / total * 100)
-        low_risk_percentages.append((stat.low_risk_count or 0) / total * 100)
-        avg_success_rates.append(float(stat.avg_success or 0))
+        labels.append(period_label(start, granularity))
 
-    return success_response({
-        'weeks': weeks,
+        total = stat['total_count']
+        high_risk_percentages.append(stat['high'] / total * 100)
+        medium_risk_percentages.append(stat['medium'] / total * 100)
+        low_risk_percentages.append(stat['low'] / total * 100)
+        avg_success_rates.append(stat['success_sum'] / total)
+
+    data = {
+        'granularity': granularity,
+        'periods': labels,
         'high_risk_percentages': high_risk_percentages,
         'medium_risk_percentages': medium_risk_percentages,
         'low_risk_percentages': low_risk_percentages,
         'avg_success_rates': avg_success_rates
-    }, '查询成功')
+    }
+    if granularity == 'week':
+        # 兼容原有前端字段
+        data['weeks'] = labels
+
+    return success_response(data, '查询成功')
 
 
 @visualization_bp.route('/patient-age-distribution', methods=['GET'])
 @auth_required
+@analytics_etag
 def get_patient_age_distribution():
     """获取患者年龄分布"""
-    # 获取所有活跃患者的年龄信息
-    patients = Patient.query.filter_by(is_active=True).all()
-
-    age_distribution = {
-        'under_20': 0,
-        '20_29': 0,
-        '30_39': 0,
-        '40_49': 0,
-        '50_59': 0,
-        '60_plus': 0
-    }
-
-    for patient in patients:
-        if patient.date_of_birth:
-            age = calculate_age(patient.date_of_birth)
-            if age < 20:
-                age_distribution['under_20'] += 1
-            elif 20 <= age < 30:
-                age_distribution['20_29'] += 1
-            elif 30 <= age < 40:
-                age_distribution['30_39'] += 1
-            elif 40 <= age < 50:
-                age_distribution['40_49'] += 1
-            elif 50 <= age < 60:
-                age_distribution['50_59'] += 1
-            else:
-                age_distribution['60_plus'] += 1
-
     return success_response({
-        'age_distribution': age_distribution
+        'age_distribution': age_distribution(datetime.now().date())
     }, '查询成功')
 
 
 @visualization_bp.route('/top-treatments/<int:patient_id>', methods=['GET'])
 @auth_required
+@analytics_etag
 def get_patient_top_treatments(patient_id):
     """获取患者最常见治疗方案"""
     # 检查患者是否存在
@@ -402,10 +839,4 @@ def get_patient_top_treatments(patient_id):
     return success_response({
         'patient_id': patient_id,
         'top_treatments': treatments
-    }, '查询成功')
-
-
-def calculate_age(birth_date):
-    """计算年龄"""
-    today = datetime.now().date()
-    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
\ No newline at end of file
+    }, '查询成功')
\ No newline at end of file
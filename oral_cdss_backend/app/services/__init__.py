@@ -8,7 +8,7 @@
 try:
     from .decision_algorithm import DecisionAlgorithm
     from .rule_engine import RuleEngine
-    from .similarity_search import SimilaritySearch
+    from .similarity_search import SimpleSimilaritySearch as SimilaritySearch
 except ImportError as e:
     print(f"服务导入警告: {e}")
 
@@ -0,0 +1,68 @@
+# app/services/assessment_details.py
+import ast
+import json
+
+from sqlalchemy import insert
+
+from app import db
+from app.models import AssessmentCategoryScore, AssessmentRuleEvaluation
+
+
+def build_detail_rows(assessment_id, evaluation):
+    """把规则引擎的评估结果拆成类别得分行和规则命中行"""
+    category_rows = [
+        {
+            'assessment_id': assessment_id,
+            'category_name': name,
+            'raw_score': data.get('raw_score', 0),
+            'weighted_score': data.get('weighted_score', 0),
+            'weight': data.get('weight', 1.0)
+        }
+        for name, data in (evaluation.get('category_scores') or {}).items()
+    ]
+
+    rule_rows = [
+        {
+            'assessment_id': assessment_id,
+            'rule_id': item['rule_id'],
+            'category_name': item.get('category'),
+            'score': item.get('score', 0),
+            'is_mandatory': bool(item.get('is_mandatory')),
+            'risk_level': item.get('risk_level'),
+            'treatment_suggestion': item.get('treatment_suggestion')
+        }
+        for item in (evaluation.get('rule_evaluations') or [])
+        if item.get('condition_met', True)
+    ]
+
+    return category_rows, rule_rows
+
+
+def insert_detail_rows(category_rows, rule_rows):
+    """批量写入评估明细行"""
+    if category_rows:
+        db.session.execute(insert(AssessmentCategoryScore), category_rows)
+    if rule_rows:
+        db.session.execute(insert(AssessmentRuleEvaluation), rule_rows)
+
+
+def save_assessment_details(assessment_id, evaluation):
+    """写入一条评估的明细（在调用方的事务中执行，由调用方提交）"""
+    insert_detail_rows(*build_detail_rows(assessment_id, evaluation))
+
+
+def load_stored_value(text, default=None):
+    """解析评估结果中的文本字段
+
+    新数据为JSON；早期数据用 str() 写入，是Python字面量格式，用 literal_eval 兜底。
+    """
+    if not text:
+        return default
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return default
\ No newline at end of file
@@ -0,0 +1,82 @@
+# app/services/assessment_export.py
+from sqlalchemy import select
+
+from app import db
+from app.models import AssessmentResult, MedicalRecord
+from app.utils.columnar import NpzStreamWriter, StreamBuffer
+
+# 导出列：(列名, 类型, 字段)
+EXPORT_COLUMNS = [
+    ('assessment_id', 'int', AssessmentResult.id),
+    ('medical_record_id', 'int', AssessmentResult.medical_record_id),
+    ('assessed_at', 'datetime', AssessmentResult.assessed_at),
+    ('is_latest', 'bool', AssessmentResult.is_latest),
+    ('total_score', 'float', AssessmentResult.total_score),
+    ('success_probability', 'float', AssessmentResult.success_probability),
+    ('risk_level', 'str', AssessmentResult.risk_level),
+    ('passed_mandatory', 'bool', AssessmentResult.passed_mandatory),
+    ('recommended_treatment', 'str', AssessmentResult.recommended_treatment),
+    ('confidence_level', 'float', AssessmentResult.confidence_level),
+    ('record_id', 'str', MedicalRecord.record_id),
+    ('patient_id', 'int', MedicalRecord.patient_id),
+    ('creator_id', 'int', MedicalRecord.creator_id),
+    ('visit_date', 'datetime', MedicalRecord.visit_date),
+    ('tooth_number', 'str', MedicalRecord.tooth_number),
+    ('periodontal_status', 'str', MedicalRecord.periodontal_status),
+    ('bone_loss_percentage', 'float', MedicalRecord.bone_loss_percentage),
+    ('mobility_degree', 'float', MedicalRecord.mobility_degree),
+    ('caries_degree', 'str', MedicalRecord.caries_degree),
+    ('pulp_condition', 'str', MedicalRecord.pulp_condition),
+    ('occlusion_type', 'str', MedicalRecord.occlusion_type),
+    ('oral_hygiene', 'str', MedicalRecord.oral_hygiene),
+    ('smoking_status', 'str', MedicalRecord.smoking_status),
+    ('diabetic_status', 'bool', MedicalRecord.diabetic_status)
+]
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def export_query(start=None, end=None, latest_only=False):
+    """构建导出查询：评估结果关联病历结构化字段，按评估ID排序"""
+    query = select(*[column for _, _, column in EXPORT_COLUMNS]).join(
+        MedicalRecord, MedicalRecord.id == AssessmentResult.medical_record_id
+    )
+    if start is not None:
+        query = query.where(AssessmentResult.assessed_at >= start)
+    if end is not None:
+        query = query.where(AssessmentResult.assessed_at < end)
+    if latest_only:
+        query = query.where(AssessmentResult.is_latest == True)
+    return query.order_by(AssessmentResult.id)
+
+
+def iter_export_chunks(chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """用服务端游标按块读取导出数据，每次只在内存中保留一个块"""
+    result = db.session.execute(
+        export_query(**filters).execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    try:
+        for rows in result.partitions(chunk_size):
+            yield rows
+    finally:
+        result.close()
+
+
+def write_export(fileobj, chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """把评估数据导出到文件对象，返回导出行数"""
+    writer = NpzStreamWriter(fileobj, [(name, kind) for name, kind, _ in EXPORT_COLUMNS])
+    for rows in iter_export_chunks(chunk_size, **filters):
+        writer.write_chunk(rows)
+    writer.close()
+    return writer.row_count
+
+
+def stream_export(chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """生成导出文件的字节流（每写完一个块产出一次），用于HTTP流式响应"""
+    buffer = StreamBuffer()
+    writer = NpzStreamWriter(buffer, [(name, kind) for name, kind, _ in EXPORT_COLUMNS])
+    for rows in iter_export_chunks(chunk_size, **filters):
+        writer.write_chunk(rows)
+        yield buffer.drain()
+    writer.close()
+    yield buffer.drain()
\ No newline at end of file
@@ -0,0 +1,196 @@
+# app/services/assessment_rollup.py
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import AssessmentResult, AssessmentDailyStat, AssessmentPeriodStat
+
+# 周/月汇总的粒度
+PERIOD_GRANULARITIES = ('week', 'month')
+
+
+def period_start(day, granularity):
+    """返回日期所在周期的起始日（周一或月初）"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _daily_key_filter(stat_date, risk_level, treatment):
+    """按汇总键定位日汇总行（NULL值用 IS NULL 比较）"""
+    return [
+        AssessmentDailyStat.stat_date == stat_date,
+        AssessmentDailyStat.risk_level == risk_level,
+        AssessmentDailyStat.recommended_treatment == treatment
+    ]
+
+
+def _period_key_filter(granularity, start, risk_level, treatment):
+    """按汇总键定位周/月汇总行"""
+    return [
+        AssessmentPeriodStat.granularity == granularity,
+        AssessmentPeriodStat.period_start == start,
+        AssessmentPeriodStat.risk_level == risk_level,
+        AssessmentPeriodStat.recommended_treatment == treatment
+    ]
+
+
+def _increment(model, key, key_values, sign, score, success):
+    """对一行汇总做原子增减，行不存在时插入；并发插入冲突时回退到保存点后重新自增"""
+    values = {
+        model.assessment_count: model.assessment_count + sign,
+        model.score_sum: model.score_sum + score,
+        model.success_sum: model.success_sum + success,
+        model.updated_at: datetime.utcnow()
+    }
+
+    updated = model.query.filter(*key).update(values, synchronize_session=False)
+    if updated or sign < 0:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(
+                assessment_count=1,
+                score_sum=score,
+                success_sum=success,
+                updated_at=datetime.utcnow(),
+                **key_values
+            ))
+    except IntegrityError:
+        model.query.filter(*key).update(values, synchronize_session=False)
+
+
+def apply_assessment(assessment, sign=1):
+    """把一条评估结果计入（sign=1）或移出（sign=-1）日汇总和周/月汇总
+
+    在调用方的事务中执行，与评估结果一同提交。
+    """
+    assessed_at = assessment.assessed_at or datetime.utcnow()
+    stat_date = assessed_at.date()
+    score = (assessment.total_score or 0) * sign
+    success = (assessment.success_probability or 0) * sign
+    risk_level = assessment.risk_level
+    treatment = assessment.recommended_treatment
+
+    _increment(
+        AssessmentDailyStat,
+        _daily_key_filter(stat_date, risk_level, treatment),
+        {'stat_date': stat_date, 'risk_level': risk_level, 'recommended_treatment': treatment},
+        sign, score, success
+    )
+
+    for granularity in PERIOD_GRANULARITIES:
+        start = period_start(stat_date, granularity)
+        _increment(
+            AssessmentPeriodStat,
+            _period_key_filter(granularity, start, risk_level, treatment),
+            {'granularity': granularity, 'period_start': start,
+             'risk_level': risk_level, 'recommended_treatment': treatment},
+            sign, score, success
+        )
+
+
+def replace_latest_assessment(record_id, new_assessment):
+    """将病历原有的最新评估标记为非最新，并同步调整各汇总表
+
+    new_assessment 需已 add 到会话中；调用方负责提交。返回被替换的旧评估列表。
+    """
+    old_latest = AssessmentResult.query.filter_by(
+        medical_record_id=record_id,
+        is_latest=True
+    ).all()
+
+    replaced = []
+    for old in old_latest:
+        if old is new_assessment:
+            continue
+        old.is_latest = False
+        apply_assessment(old, sign=-1)
+        replaced.append(old)
+
+    apply_assessment(new_assessment, sign=1)
+    return replaced
+
+
+def rebuild_daily_stats():
+    """根据评估结果全量重建日汇总和周/月汇总（初始化或数据修复时使用）"""
+    stat_date = func.date(AssessmentResult.assessed_at)
+
+    AssessmentDailyStat.query.delete(synchronize_session=False)
+    db.session.execute(
+        insert(AssessmentDailyStat).from_select(
+            ['stat_date', 'risk_level', 'recommended_treatment', 'assessment_count',
+             'score_sum', 'success_sum', 'updated_at'],
+            select(
+                stat_date,
+                AssessmentResult.risk_level,
+                AssessmentResult.recommended_treatment,
+                func.count(AssessmentResult.id),
+                func.coalesce(func.sum(AssessmentResult.total_score), 0),
+                func.coalesce(func.sum(AssessmentResult.success_probability), 0),
+                func.now()
+            ).where(
+                AssessmentResult.is_latest == True
+            ).group_by(
+                stat_date,
+                AssessmentResult.risk_level,
+                AssessmentResult.recommended_treatment
+            )
+        )
+    )
+
+    rebuild_period_stats()
+    db.session.commit()
+
+
+def rebuild_period_stats():
+    """由日汇总重建周/月汇总
+
+    周、月的起始日在Python中计算，避免依赖各数据库不同的日期函数；日汇总行数很少，代价可忽略。
+    """
+    AssessmentPeriodStat.query.delete(synchronize_session=False)
+
+    totals = {}
+    for row in db.session.query(AssessmentDailyStat).all():
+        for granularity in PERIOD_GRANULARITIES:
+            key = (granularity, period_start(row.stat_date, granularity), row.risk_level, row.recommended_treatment)
+            total = totals.setdefault(key, [0, 0.0, 0.0])
+            total[0] += row.assessment_count
+            total[1] += row.score_sum
+            total[2] += row.success_sum
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            'granularity': granularity,
+            'period_start': start,
+            'risk_level': risk_level,
+            'recommended_treatment': treatment,
+            'assessment_count': count,
+            'score_sum': score_sum,
+            'success_sum': success_sum,
+            'updated_at': now
+        }
+        for (granularity, start, risk_level, treatment), (count, score_sum, success_sum) in totals.items()
+    ]
+    if rows:
+        db.session.execute(insert(AssessmentPeriodStat), rows)
+
+
+def ensure_rollups():
+    """汇总表为空而已有评估时全量重建（升级已有数据库或启动时调用），返回重建的汇总名称列表"""
+    if not db.session.query(AssessmentResult.query.filter_by(is_latest=True).exists()).scalar():
+        return []
+    if not db.session.query(AssessmentDailyStat.query.exists()).scalar():
+        rebuild_daily_stats()
+        return ['daily', 'period']
+    if not db.session.query(AssessmentPeriodStat.query.exists()).scalar():
+        rebuild_period_stats()
+        db.session.commit()
+        return ['period']
+    return []
\ No newline at end of file
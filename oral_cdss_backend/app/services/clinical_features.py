@@ -0,0 +1,118 @@
+# app/services/clinical_features.py
+"""
+病历临床特征的保存和按特征条件检索
+
+- 增量保存：按 feature_name 对比已保存的特征和提交的完整列表，新增的批量插入、值或类型变化的批量更新、
+  不再提交的批量删除，未变化的特征不产生任何写入（自动保存频繁提交相同内容时没有写流量）。
+- 数值型特征同时写入 numeric_value 列，特征条件（如 probing_depth>5）通过 (名称, 数值) 索引范围查询。
+"""
+import re
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+
+from app import db
+from app.models import ClinicalFeature, MedicalRecord
+
+FEATURE_TYPES = tuple(ClinicalFeature.feature_type.type.enums)
+
+# 特征条件：名称 + 操作符 + 值，如 probing_depth>=5、bleeding_on_probing=yes
+PREDICATE_PATTERN = re.compile(r'^\s*([^<>=!]+?)\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$')
+RANGE_OPERATORS = {
+    '>': lambda column, value: column > value,
+    '<': lambda column, value: column < value,
+    '>=': lambda column, value: column >= value,
+    '<=': lambda column, value: column <= value
+}
+
+
+def normalize_features(items):
+    """把提交的特征列表转成 {特征名: (值, 类型)}，同名特征以最后一项为准"""
+    if not isinstance(items, list):
+        raise ValueError('clinical_features必须是数组')
+
+    features = {}
+    for item in items:
+        if not isinstance(item, dict) or not item.get('name'):
+            raise ValueError('临床特征必须包含name')
+        feature_type = item.get('type', 'text')
+        if feature_type not in FEATURE_TYPES:
+            raise ValueError(f"临床特征类型必须是以下之一: {', '.join(FEATURE_TYPES)}")
+        value = item.get('value')
+        if value is not None and feature_type == 'numeric' and ClinicalFeature.parse_numeric(value, 'numeric') is None:
+            raise ValueError(f"数值型临床特征 {item['name']} 的值必须是数字")
+        features[str(item['name'])] = (None if value is None else str(value), feature_type)
+    return features
+
+
+def sync_clinical_features(record_id, items):
+    """把病历的临床特征更新为 items（在调用方的事务中执行），返回各类写入的行数"""
+    features = normalize_features(items)
+
+    inserts, updates, deletes = [], [], []
+    kept = set()
+    for row in db.session.execute(
+        select(ClinicalFeature.id, ClinicalFeature.feature_name, ClinicalFeature.feature_value,
+               ClinicalFeature.feature_type, ClinicalFeature.numeric_value)
+        .where(ClinicalFeature.medical_record_id == record_id)
+        .order_by(ClinicalFeature.id)
+    ):
+        # 已删除的特征，以及历史数据中同名的多余行
+        if row.feature_name not in features or row.feature_name in kept:
+            deletes.append(row.id)
+            continue
+        kept.add(row.feature_name)
+        value, feature_type = features[row.feature_name]
+        numeric_value = ClinicalFeature.parse_numeric(value, feature_type)
+        if (row.feature_value, row.feature_type, row.numeric_value) != (value, feature_type, numeric_value):
+            updates.append({'id': row.id, 'feature_value': value, 'feature_type': feature_type,
+                            'numeric_value': numeric_value})
+
+    for name, (value, feature_type) in features.items():
+        if name not in kept:
+            inserts.append({'medical_record_id': record_id, 'feature_name': name, 'feature_value': value,
+                            'feature_type': feature_type,
+                            'numeric_value': ClinicalFeature.parse_numeric(value, feature_type)})
+
+    if deletes:
+        db.session.execute(delete(ClinicalFeature).where(ClinicalFeature.id.in_(deletes)))
+    if updates:
+        db.session.execute(update(ClinicalFeature), updates)
+    if inserts:
+        db.session.execute(insert(ClinicalFeature.__table__), inserts)
+
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(deletes)}
+
+
+def parse_feature_predicate(text):
+    """解析特征条件，返回 (特征名, 操作符, 值)"""
+    match = PREDICATE_PATTERN.match(text or '')
+    if not match or not match.group(3):
+        raise ValueError(f'特征条件格式错误: {text}（应为 名称+操作符+值，如 probing_depth>5）')
+    return match.groups()
+
+
+def feature_condition(name, operator, value):
+    """病历满足特征条件的过滤表达式（特征子查询走 feature_name 开头的复合索引）
+
+    >、<、>=、<= 比较数值列；= 和 != 在值为数字时按数值或原值匹配（5 与 5.0 相等），否则按原值匹配。
+    != 表示有该特征且值不同，没有该特征的病历不匹配。
+    """
+    number = ClinicalFeature.parse_numeric(value, 'numeric')
+    if operator in RANGE_OPERATORS:
+        if number is None:
+            raise ValueError(f'特征条件 {name}{operator}{value} 的比较值必须是数字')
+        condition = RANGE_OPERATORS[operator](ClinicalFeature.numeric_value, number)
+    elif operator == '=':
+        condition = ClinicalFeature.feature_value == value
+        if number is not None:
+            condition = or_(condition, ClinicalFeature.numeric_value == number)
+    else:
+        # 非数值型特征的 numeric_value 为 NULL，需显式处理，不能直接对相等条件取反
+        condition = ClinicalFeature.feature_value != value
+        if number is not None:
+            condition = and_(condition, or_(ClinicalFeature.numeric_value.is_(None),
+                                            ClinicalFeature.numeric_value != number))
+
+    return MedicalRecord.id.in_(
+        select(ClinicalFeature.medical_record_id).where(ClinicalFeature.feature_name == name, condition)
+    )
\ No newline at end of file
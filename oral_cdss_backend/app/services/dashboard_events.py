@@ -0,0 +1,90 @@
+# app/services/dashboard_events.py
+from app.utils.event_bus import event_bus
+
+# 仪表盘增量事件：data['counters'] 中的键对应 /dashboard-stats 返回结构中的路径，值为增量
+
+
+def publish_patient_created(patient):
+    """新增患者"""
+    event_bus.publish('new_patient', {
+        'patient_id': patient.id,
+        'counters': {
+            'overall.total_patients': 1,
+            'today.new_patients': 1
+        }
+    })
+
+
+def publish_patients_created(count):
+    """批量新增患者（每个批次提交后发布一次）"""
+    event_bus.publish('patients_imported', {
+        'count': count,
+        'counters': {
+            'overall.total_patients': count,
+            'today.new_patients': count
+        }
+    })
+
+
+def publish_patient_active_changed(patient):
+    """患者停用或重新激活（影响活跃患者总数）"""
+    event_bus.publish('patient_status', {
+        'patient_id': patient.id,
+        'is_active': patient.is_active,
+        'counters': {
+            'overall.total_patients': 1 if patient.is_active else -1
+        }
+    })
+
+
+def publish_record_created(record):
+    """新增病历"""
+    event_bus.publish('new_record', {
+        'record_id': record.id,
+        'patient_id': record.patient_id,
+        'counters': {
+            'overall.total_records': 1,
+            'today.new_records': 1
+        }
+    })
+
+
+def publish_records_imported(count):
+    """批量导入病历（每个批次提交后发布一次）"""
+    event_bus.publish('records_imported', {
+        'count': count,
+        'counters': {
+            'overall.total_records': count,
+            'today.new_records': count
+        }
+    })
+
+
+def publish_assessment(assessment, replaced=()):
+    """新增评估；替换旧的最新评估时，分布计数从旧值移到新值"""
+    counters = {'today.new_assessments': 1}
+
+    def add(key, value):
+        counters[key] = counters.get(key, 0) + value
+
+    if not replaced:
+        add('overall.total_assessments', 1)
+    for old in replaced:
+        add(f'risk_distribution.{old.risk_level}', -1)
+        if old.recommended_treatment:
+            add(f'treatment_distribution.{old.recommended_treatment}', -1)
+    # 替换多条（异常数据）时总数相应减少
+    if len(replaced) > 1:
+        add('overall.total_assessments', 1 - len(replaced))
+
+    add(f'risk_distribution.{assessment.risk_level}', 1)
+    if assessment.recommended_treatment:
+        add(f'treatment_distribution.{assessment.recommended_treatment}', 1)
+
+    event_bus.publish('new_assessment', {
+        'record_id': assessment.medical_record_id,
+        'risk_level': assessment.risk_level,
+        'recommended_treatment': assessment.recommended_treatment,
+        'success_probability': assessment.success_probability,
+        'counters': {key: value for key, value in counters.items() if value}
+    })
\ No newline at end of file
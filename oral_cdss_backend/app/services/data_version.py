@@ -0,0 +1,90 @@
+# app/services/data_version.py
+from datetime import datetime
+
+from flask import g
+from sqlalchemy import func, select
+
+from app import db
+from app.models import (AssessmentResult, AssessmentDailyStat, ClinicalFeature, MedicalRecord, Patient, Rule,
+                        User)
+
+
+def _max(column):
+    """单列最大值的标量子查询（主键和带索引的 updated_at 上都只需读索引一端）"""
+    return select(func.max(column)).scalar_subquery()
+
+
+def analytics_version():
+    """统计图表数据的版本标识
+
+    由各表最大主键和最大 updated_at（MySQL 上为微秒精度，见 PreciseDateTime）组成，一条语句取回；
+    任何新增或修改都会改变它。
+    加上当天日期，使“今日”统计和年龄分段在跨天后失效。
+    """
+    row = db.session.query(
+        _max(Patient.id),
+        _max(Patient.updated_at),
+        _max(MedicalRecord.id),
+        _max(MedicalRecord.updated_at),
+        _max(AssessmentResult.id),
+        _max(AssessmentDailyStat.updated_at),
+        _max(User.updated_at),
+        _max(Rule.updated_at)
+    ).one()
+
+    return '|'.join(str(value) for value in row) + f'|{datetime.now().date()}'
+
+
+def request_analytics_version():
+    """本次请求的统计数据版本：ETag 校验和缓存键共用，同一请求内只查询一次（保存在 flask.g）"""
+    if 'analytics_version' not in g:
+        g.analytics_version = analytics_version()
+    return g.analytics_version
+
+
+def patient_version():
+    """患者数据的版本标识（最大主键和最大 updated_at；患者只做软删除，停用也会更新 updated_at）"""
+    row = db.session.query(_max(Patient.id), _max(Patient.updated_at)).one()
+    return '|'.join(str(value) for value in row)
+
+
+def similarity_corpus_version():
+    """相似病例库的版本标识，返回 (病历版本, 最大评估ID)
+
+    病历版本由已最终化病历的最大主键和最大 updated_at 组成，只在最终化或修改已最终化的病历时变化
+    （草稿的修改不改变它），用于特征索引；加上最大评估ID用于相似病例结果缓存。
+    版本取自数据库，任何工作进程中的写入都会使所有进程的索引和缓存失效。
+    """
+    finalized = MedicalRecord.is_finalized == True
+    max_id, max_updated_at, max_assessment_id = db.session.query(
+        select(func.max(MedicalRecord.id)).where(finalized).scalar_subquery(),
+        select(func.max(MedicalRecord.updated_at)).where(finalized).scalar_subquery(),
+        _max(AssessmentResult.id)
+    ).one()
+    return f'{max_id}|{max_updated_at}', max_assessment_id
+
+
+def record_version(record_id):
+    """单个病历（含临床特征和评估结果）的版本标识，病历不存在时返回 None
+
+    病历本身的修改由版本号 version 反映（每次修改递增，不依赖时间戳精度）。
+    """
+    row = db.session.query(
+        MedicalRecord.version,
+        MedicalRecord.updated_at,
+        select(func.max(ClinicalFeature.id)).where(
+            ClinicalFeature.medical_record_id == record_id
+        ).scalar_subquery(),
+        select(func.count(ClinicalFeature.id)).where(
+            ClinicalFeature.medical_record_id == record_id
+        ).scalar_subquery(),
+        select(func.max(AssessmentResult.id)).where(
+            AssessmentResult.medical_record_id == record_id
+        ).scalar_subquery()
+    ).filter(
+        MedicalRecord.id == record_id
+    ).first()
+
+    if row is None:
+        return None
+    return '|'.join(str(value) for value in row)
\ No newline at end of file
@@ -0,0 +1,150 @@
+# app/services/doctor_stats.py
+from datetime import datetime
+
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import AssessmentResult, DoctorStat, MedicalRecord
+from app.utils.hyperloglog import HyperLogLog
+
+
+def _aggregate_stats(doctor_id=None):
+    """按病历和最新评估汇总医生统计，返回 {医生ID: 统计}；指定 doctor_id 时只汇总该医生"""
+    stats = {}
+
+    def get(creator_id):
+        if creator_id not in stats:
+            stats[creator_id] = {'record_count': 0, 'success_sum': 0.0, 'success_count': 0,
+                                 'sketch': HyperLogLog()}
+        return stats[creator_id]
+
+    def scoped(query):
+        return query if doctor_id is None else query.filter(MedicalRecord.creator_id == doctor_id)
+
+    for creator_id, count in scoped(db.session.query(
+        MedicalRecord.creator_id, func.count(MedicalRecord.id)
+    )).group_by(MedicalRecord.creator_id):
+        get(creator_id)['record_count'] = count
+
+    for creator_id, success_sum, success_count in scoped(db.session.query(
+        MedicalRecord.creator_id,
+        func.sum(AssessmentResult.success_probability),
+        func.count(AssessmentResult.success_probability)
+    ).join(
+        AssessmentResult, AssessmentResult.medical_record_id == MedicalRecord.id
+    ).filter(
+        AssessmentResult.is_latest == True
+    )).group_by(MedicalRecord.creator_id):
+        stat = get(creator_id)
+        stat['success_sum'] = float(success_sum or 0)
+        stat['success_count'] = success_count
+
+    pairs = scoped(db.session.query(
+        MedicalRecord.creator_id, MedicalRecord.patient_id
+    )).distinct().execution_options(yield_per=5000)
+    for creator_id, patient_id in pairs:
+        get(creator_id)['sketch'].add(patient_id)
+
+    return stats
+
+
+def _locked_stat(doctor_id):
+    """取医生统计行并加行锁（SELECT ... FOR UPDATE），返回 (统计行, 是否新建)
+
+    不存在时（如升级前已有病历）按该医生已有的数据汇总创建。汇总在调用方的事务中执行，
+    已包含本次写入，新建时调用方不再累加增量。
+    """
+    stat = DoctorStat.query.filter_by(doctor_id=doctor_id).with_for_update().first()
+    if stat is not None:
+        return stat, False
+
+    aggregate = _aggregate_stats(doctor_id).get(doctor_id)
+    try:
+        with db.session.begin_nested():
+            stat = DoctorStat(
+                doctor_id=doctor_id,
+                record_count=aggregate['record_count'] if aggregate else 0,
+                success_sum=aggregate['success_sum'] if aggregate else 0,
+                success_count=aggregate['success_count'] if aggregate else 0,
+                patient_sketch=(aggregate['sketch'] if aggregate else HyperLogLog()).to_bytes()
+            )
+            db.session.add(stat)
+    except IntegrityError:
+        # 并发请求已创建该行（其汇总不含本次写入）
+        stat = DoctorStat.query.filter_by(doctor_id=doctor_id).with_for_update().first()
+        return stat, False
+    return stat, True
+
+
+def record_created(record):
+    """病历创建后计入医生统计（在调用方的事务中执行）"""
+    records_created(record.creator_id, [record.patient_id])
+
+
+def records_created(creator_id, patient_ids):
+    """同一医生批量新增病历后计入统计，patient_ids 为每条病历的患者ID（可重复）"""
+    stat, seeded = _locked_stat(creator_id)
+    if seeded:
+        return
+    stat.record_count += len(patient_ids)
+
+    sketch = HyperLogLog.from_bytes(stat.patient_sketch)
+    changed = False
+    for patient_id in set(patient_ids):
+        changed = sketch.add(patient_id) or changed
+    if changed:
+        stat.patient_sketch = sketch.to_bytes()
+    stat.updated_at = datetime.utcnow()
+
+
+def assessment_written(record, assessment, replaced=()):
+    """写入新的最新评估后调整医生的成功率汇总，replaced 为被替换的旧评估"""
+    stat, seeded = _locked_stat(record.creator_id)
+    if seeded:
+        return
+
+    for old in replaced:
+        if old.success_probability is not None:
+            stat.success_sum -= old.success_probability
+            stat.success_count -= 1
+    if assessment.success_probability is not None:
+        stat.success_sum += assessment.success_probability
+        stat.success_count += 1
+    # 统计行与实际数据不一致（如手工修改过数据）时不出现负数，可用 rebuild_doctor_stats 修复
+    if stat.success_count <= 0:
+        stat.success_sum, stat.success_count = 0, 0
+    stat.success_sum = max(stat.success_sum, 0)
+    stat.updated_at = datetime.utcnow()
+
+
+def rebuild_doctor_stats():
+    """根据病历和最新评估全量重建医生统计（初始化或数据修复时使用）"""
+    stats = _aggregate_stats()
+
+    DoctorStat.query.delete(synchronize_session=False)
+    now = datetime.utcnow()
+    rows = [
+        {
+            'doctor_id': doctor_id,
+            'record_count': stat['record_count'],
+            'success_sum': stat['success_sum'],
+            'success_count': stat['success_count'],
+            'patient_sketch': stat['sketch'].to_bytes(),
+            'updated_at': now
+        }
+        for doctor_id, stat in stats.items()
+    ]
+    if rows:
+        db.session.execute(insert(DoctorStat), rows)
+    db.session.commit()
+
+
+def ensure_doctor_stats():
+    """医生统计表为空而已有病历时全量重建（升级已有数据库或启动时调用），返回是否重建"""
+    if not db.session.query(MedicalRecord.query.exists()).scalar():
+        return False
+    if db.session.query(DoctorStat.query.exists()).scalar():
+        return False
+    rebuild_doctor_stats()
+    return True
\ No newline at end of file
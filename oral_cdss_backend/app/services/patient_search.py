@@ -0,0 +1,326 @@
+# app/services/patient_search.py
+"""
+患者搜索的内存索引（病历号、姓名、电话、姓名拼音）
+
+- n-gram 倒排索引：汉字连续片段按单字和二元组切分，适合中文姓名；字母数字片段按三元组切分，
+  适合部分电话号码、病历号和拼音。查询时取最短的倒排表作为候选，再做子串校验并排序，只返回前 limit 条。
+- 前缀索引：病历号、姓名、全拼、拼音首字母按字典序排成数组，输入联想时二分定位前缀区间（相当于压缩的前缀树，
+  不需要为每个字符建节点），只读取前 limit 条。
+- 索引按 updated_at 增量刷新（最多每秒一次，本进程写入后立即刷新），多个工作进程各自保持同步。
+- 首次使用时在后台线程中全量构建，构建完成前返回 None，由调用方退回 SQL LIKE 查询。
+"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import Patient
+from app.utils.pinyin import name_keys
+
+# 增量刷新的最小间隔（秒）
+REFRESH_INTERVAL = 1.0
+# 增量刷新时从上次刷新时间再往前多读的窗口，覆盖提交时间晚于 updated_at 的写入
+REFRESH_LAG = timedelta(seconds=2)
+# 增量追加的倒排条目超过全量条目的该比例时重建（清理已失效的条目）
+REBUILD_RATIO = 0.5
+BUILD_BATCH_SIZE = 10000
+
+# 匹配程度：完全相同 > 前缀 > 包含
+EXACT, PREFIX, CONTAINS = 3, 2, 1
+
+
+def normalize(text):
+    """转小写并去掉空格、横线等非字母数字字符"""
+    if not text:
+        return ''
+    return ''.join(ch for ch in str(text).lower() if ch.isalnum())
+
+
+def is_cjk(ch):
+    return '\u4e00' <= ch <= '\u9fff'
+
+
+def split_runs(text):
+    """切分为连续的汉字片段和非汉字片段"""
+    runs = []
+    start = 0
+    for i in range(1, len(text) + 1):
+        if i == len(text) or is_cjk(text[i]) != is_cjk(text[start]):
+            runs.append(text[start:i])
+            start = i
+    return runs
+
+
+def index_grams(text):
+    """文档的 n-gram：汉字取单字和二元组，其余取三元组（不足3个字符的片段整体作为一项）"""
+    grams = set()
+    for run in split_runs(text):
+        if is_cjk(run[0]):
+            grams.update(run)
+            grams.update(run[i:i + 2] for i in range(len(run) - 1))
+        elif len(run) < 3:
+            grams.add(run)
+        else:
+            grams.update(run[i:i + 3] for i in range(len(run) - 2))
+    return grams
+
+
+def query_grams(text):
+    """查询的 n-gram；含不足3个字符的字母数字片段时返回 None（无法用索引定位，需要扫描）"""
+    grams = set()
+    for run in split_runs(text):
+        if is_cjk(run[0]):
+            grams.update(run if len(run) == 1 else (run[i:i + 2] for i in range(len(run) - 1)))
+        elif len(run) < 3:
+            return None
+        else:
+            grams.update(run[i:i + 3] for i in range(len(run) - 2))
+    return grams
+
+
+def match_level(query, value):
+    if not value or query not in value:
+        return 0
+    if value == query:
+        return EXACT
+    if value.startswith(query):
+        return PREFIX
+    return CONTAINS
+
+
+class PatientSearchIndex:
+    """患者搜索索引（线程安全）"""
+
+    def __init__(self):
+        # 患者ID -> (病历号, 姓名, 电话, 是否在用, 创建时间戳, 全拼, 拼音首字母)，文本均为规范化后的值
+        self.docs = {}
+        # n-gram -> 患者ID数组（只追加，修改后的旧条目在查询校验时过滤）
+        self.postings = {}
+        self.entries = 0
+        self.appended = 0
+        # 前缀索引：按 (键, 患者ID) 排序的两个平行数组
+        self.prefix_keys = []
+        self.prefix_ids = array('l')
+        # 上次刷新（或构建）开始的时间，下次刷新读取此后更新的患者
+        self.refreshed_at = None
+        self.ready = False
+        self.building = False
+        self.dirty = False
+        self.last_refresh = 0.0
+        self._lock = threading.RLock()
+
+    # ---------- 构建与刷新 ----------
+
+    @staticmethod
+    def _columns():
+        return select(Patient.id, Patient.patient_id, Patient.full_name, Patient.phone, Patient.is_active,
+                      Patient.created_at, Patient.updated_at, Patient.name_pinyin, Patient.name_initials)
+
+    @staticmethod
+    def _doc(row):
+        created = row.created_at.timestamp() if row.created_at else 0.0
+        name_pinyin, name_initials = row.name_pinyin, row.name_initials
+        if name_pinyin is None:
+            # 尚未回填拼音检索键的旧数据
+            name_pinyin, name_initials = name_keys(row.full_name)
+        return (normalize(row.patient_id), normalize(row.full_name), normalize(row.phone),
+                bool(row.is_active), created, name_pinyin or '', name_initials or '')
+
+    @staticmethod
+    def _prefix_keys(doc):
+        """参与输入联想的键：病历号、姓名、全拼、拼音首字母"""
+        return {key for key in (doc[0], doc[1], doc[5], doc[6]) if key}
+
+    def _add(self, postings, patient_id, doc):
+        """把文档的 n-gram 追加到倒排表，返回追加的条目数"""
+        grams = set()
+        for value in (doc[0], doc[1], doc[2], doc[5], doc[6]):
+            grams |= index_grams(value)
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array('l')
+            posting.append(patient_id)
+        return len(grams)
+
+    def build(self):
+        """全量构建（在调用方的应用上下文中执行）"""
+        started_at = datetime.utcnow()
+        docs = {}
+        postings = {}
+        prefix_entries = []
+        entries = 0
+
+        result = db.session.execute(
+            self._columns().order_by(Patient.id).execution_options(yield_per=BUILD_BATCH_SIZE)
+        )
+        for row in result:
+            doc = self._doc(row)
+            docs[row.id] = doc
+            entries += self._add(postings, row.id, doc)
+            prefix_entries.extend((key, row.id) for key in self._prefix_keys(doc))
+        prefix_entries.sort()
+
+        with self._lock:
+            self.docs, self.postings = docs, postings
+            self.prefix_keys = [key for key, _ in prefix_entries]
+            self.prefix_ids = array('l', (patient_id for _, patient_id in prefix_entries))
+            self.entries, self.appended = entries, 0
+            self.refreshed_at = started_at
+            self.last_refresh = time.monotonic()
+            self.ready = True
+
+    def start_build(self, app):
+        """在后台线程中构建索引（已在构建或已就绪时不重复启动）"""
+        with self._lock:
+            if self.building:
+                return
+            self.building = True
+
+        def run():
+            try:
+                with app.app_context():
+                    self.build()
+            finally:
+                with self._lock:
+                    self.building = False
+
+        threading.Thread(target=run, name='patient-search-build', daemon=True).start()
+
+    def mark_dirty(self):
+        """本进程写入患者后调用，下次查询前立即增量刷新"""
+        self.dirty = True
+
+    def refresh(self):
+        """读取上次刷新以来更新过的患者，更新索引"""
+        with self._lock:
+            if not self.ready:
+                return
+            if not self.dirty and time.monotonic() - self.last_refresh < REFRESH_INTERVAL:
+                return
+            self.dirty = False
+            self.last_refresh = time.monotonic()
+
+            since = self.refreshed_at - REFRESH_LAG
+            self.refreshed_at = datetime.utcnow()
+            for row in db.session.execute(self._columns().where(Patient.updated_at >= since)):
+                doc = self._doc(row)
+                old = self.docs.get(row.id)
+                if old != doc:
+                    self.docs[row.id] = doc
+                    self.appended += self._add(self.postings, row.id, doc)
+                    self._update_prefix(row.id, self._prefix_keys(old) if old else set(), self._prefix_keys(doc))
+
+            needs_rebuild = self.appended > self.entries * REBUILD_RATIO + BUILD_BATCH_SIZE
+
+        if needs_rebuild:
+            self.start_build(current_app._get_current_object())
+
+    def _update_prefix(self, patient_id, old_keys, new_keys):
+        """在前缀索引中删除不再使用的键、插入新键（保持有序）"""
+        for key in old_keys - new_keys:
+            i = bisect_left(self.prefix_keys, key)
+            while i < len(self.prefix_keys) and self.prefix_keys[i] == key:
+                if self.prefix_ids[i] == patient_id:
+                    del self.prefix_keys[i]
+                    del self.prefix_ids[i]
+                    break
+                i += 1
+        for key in new_keys - old_keys:
+            i = bisect_left(self.prefix_keys, key)
+            self.prefix_keys.insert(i, key)
+            self.prefix_ids.insert(i, patient_id)
+
+    # ---------- 查询 ----------
+
+    def search(self, text, limit=20, active_only=True, after=None):
+        """搜索患者，返回 (按相关度排序的患者ID列表, 匹配总数, 下一页的排序键)
+
+        结果按 (匹配程度, 创建时间戳, 患者ID) 倒序，after 为上一页返回的排序键，只返回排在其后的患者；
+        没有下一页时排序键为 None。索引未就绪时启动后台构建并返回 None。
+        """
+        if not self.ready:
+            self.start_build(current_app._get_current_object())
+            return None
+        self.refresh()
+
+        query = normalize(text)
+        if not query:
+            return [], 0, None
+
+        with self._lock:
+            grams = query_grams(query)
+            if grams is None:
+                candidates = self.docs.keys()
+            else:
+                postings = [self.postings.get(gram) for gram in grams]
+                if any(posting is None for posting in postings):
+                    return [], 0, None
+                candidates = set(min(postings, key=len))
+
+            ranked = []
+            for patient_id in candidates:
+                doc = self.docs.get(patient_id)
+                if doc is None or (active_only and not doc[3]):
+                    continue
+                # 病历号和电话的匹配优先于姓名（含拼音）
+                level = max(match_level(query, doc[0]) * 2, match_level(query, doc[2]) * 2,
+                            match_level(query, doc[1]) * 2 - 1, match_level(query, doc[5]) * 2 - 1,
+                            match_level(query, doc[6]) * 2 - 1)
+                if level > 0:
+                    ranked.append((level, doc[4], patient_id))
+
+        total = len(ranked)
+        if after is not None:
+            ranked = [key for key in ranked if key < after]
+        top = heapq.nlargest(limit, ranked)
+        next_key = top[-1] if len(ranked) > limit else None
+        return [patient_id for _, _, patient_id in top], total, next_key
+
+    def suggest(self, text, limit=10, active_only=True):
+        """输入联想：病历号、姓名、全拼或拼音首字母以 text 开头的患者ID（按键的字典序，完全匹配的在前）
+
+        索引未就绪时启动后台构建并返回 None。
+        """
+        if not self.ready:
+            self.start_build(current_app._get_current_object())
+            return None
+        self.refresh()
+
+        prefix = normalize(text)
+        if not prefix:
+            return []
+
+        found = []
+        seen = set()
+        with self._lock:
+            keys, ids = self.prefix_keys, self.prefix_ids
+            i = bisect_left(keys, prefix)
+            while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+                patient_id = ids[i]
+                i += 1
+                if patient_id in seen:
+                    continue
+                seen.add(patient_id)
+                doc = self.docs.get(patient_id)
+                if doc is not None and (doc[3] or not active_only):
+                    found.append(patient_id)
+        return found
+
+    def stats(self):
+        return {
+            'ready': self.ready,
+            'patients': len(self.docs),
+            'grams': len(self.postings),
+            'entries': self.entries + self.appended,
+            'prefix_keys': len(self.prefix_keys)
+        }
+
+
+patient_search_index = PatientSearchIndex()
\ No newline at end of file
@@ -0,0 +1,79 @@
+# app/services/patient_stats.py
+"""
+患者统计（年龄分布）
+
+结果按 (当天日期, 患者数据版本) 缓存：任何进程写入患者都会改变版本，
+各工作进程在下次请求时自行重新计算，不依赖本进程内的失效通知。
+"""
+from sqlalchemy import case, func
+
+from app import db
+from app.models import Patient
+from app.services.data_version import patient_version
+from app.utils.cache import TTLCache
+
+# 年龄分段边界（下限），最后一段不设上限
+AGE_BUCKETS = [
+    ('under_20', 0),
+    ('20_29', 20),
+    ('30_39', 30),
+    ('40_49', 40),
+    ('50_59', 50),
+    ('60_plus', 60)
+]
+
+# 键中含日期和数据版本，版本变化后旧结果不会再被访问
+age_distribution_cache = TTLCache(default_ttl=24 * 3600)
+
+
+def years_before(day, years):
+    """day 往前推 years 年的同一天（2月29日在平年取2月28日）"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+def compute_age_distribution(today):
+    """在数据库中按年龄分段计数
+
+    有出生日期时按出生日期与各分段截止日比较（生日当天满岁），否则使用 age 字段。
+    """
+    dob_whens = []
+    age_whens = []
+    for label, lower in reversed(AGE_BUCKETS[1:]):
+        dob_whens.append((Patient.date_of_birth <= years_before(today, lower), label))
+        age_whens.append((Patient.age >= lower, label))
+
+    bucket = case(
+        (Patient.date_of_birth.isnot(None), case(*dob_whens, else_=AGE_BUCKETS[0][0])),
+        (Patient.age.isnot(None), case(*age_whens, else_=AGE_BUCKETS[0][0])),
+        else_=None
+    ).label('bucket')
+
+    rows = db.session.query(
+        bucket,
+        func.count(Patient.id).label('count')
+    ).filter(
+        Patient.is_active == True
+    ).group_by(
+        bucket
+    ).all()
+
+    age_distribution = {label: 0 for label, _ in AGE_BUCKETS}
+    for row in rows:
+        if row.bucket is not None:
+            age_distribution[row.bucket] = row.count
+    return age_distribution
+
+
+def age_distribution(today):
+    """当天的患者年龄分布（按患者数据版本缓存）"""
+    def compute():
+        # 只保留最新版本的结果
+        age_distribution_cache.invalidate()
+        return compute_age_distribution(today)
+
+    return age_distribution_cache.get_or_compute(
+        ('age-distribution', today.isoformat(), patient_version()), compute
+    )
\ No newline at end of file
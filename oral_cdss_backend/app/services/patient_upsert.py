@@ -0,0 +1,184 @@
+# app/services/patient_upsert.py
+"""
+患者批量新增/更新（按病历号 patient_id 匹配）
+
+每个批次用一条 IN 查询找出已存在的患者，新患者批量插入，已存在的患者只在字段有变化时批量更新，
+每个批次一个事务，返回每一行的处理结果。
+"""
+from datetime import date, datetime
+
+from sqlalchemy import insert, select, update
+
+from app import db
+from app.models import Patient
+from app.services.dashboard_events import publish_patients_created
+from app.utils.event_bus import event_bus
+from app.utils.pinyin import name_keys
+from app.utils.validation import validate_patient_data
+
+DEFAULT_BATCH_SIZE = 1000
+
+# 可批量写入的字段（patient_id 为匹配键；age 由出生日期计算或直接提供）
+UPSERT_FIELDS = ('full_name', 'gender', 'date_of_birth', 'age', 'phone', 'email', 'address',
+                 'emergency_contact', 'emergency_phone', 'blood_type', 'allergies', 'medical_history',
+                 'dental_history')
+# 由其他字段派生、随之写入的列
+DERIVED_FIELDS = ('name_pinyin', 'name_initials')
+ENUM_VALUES = {
+    'gender': tuple(Patient.gender.type.enums),
+    'blood_type': tuple(Patient.blood_type.type.enums)
+}
+
+
+def calculate_age(birth_date, today=None):
+    """按出生日期计算周岁"""
+    today = today or date.today()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def normalize_patient(data):
+    """校验一行患者数据并转换为列值，返回 (patient_id, values, errors)"""
+    if not isinstance(data, dict):
+        return None, {}, ['每一项必须是JSON对象']
+
+    errors = validate_patient_data(data)
+    patient_id = str(data['patient_id']).strip() if data.get('patient_id') else None
+
+    values = {}
+    for field in UPSERT_FIELDS:
+        if field not in data:
+            continue
+        value = data[field]
+        if isinstance(value, str):
+            value = value.strip() or None
+        if field in ENUM_VALUES and value is not None and value not in ENUM_VALUES[field]:
+            errors.append(f"{field}必须是以下之一: {', '.join(ENUM_VALUES[field])}")
+            continue
+        values[field] = value
+
+    if errors:
+        return patient_id, values, errors
+
+    if values.get('date_of_birth'):
+        values['date_of_birth'] = datetime.fromisoformat(values['date_of_birth'].replace('Z', '+00:00')).date()
+        values['age'] = calculate_age(values['date_of_birth'])
+    elif values.get('age') is not None:
+        values['age'] = int(values['age'])
+
+    if 'full_name' in values:
+        values['name_pinyin'], values['name_initials'] = name_keys(values['full_name'])
+
+    return patient_id, values, errors
+
+
+class PatientUpserter:
+    """患者批量新增/更新
+
+    update_existing=False 时已存在的患者不做修改，结果记为 skipped。
+    """
+
+    def __init__(self, created_by, batch_size=DEFAULT_BATCH_SIZE, update_existing=True):
+        self.created_by = created_by
+        self.batch_size = batch_size
+        self.update_existing = update_existing
+        self.results = []
+        self.counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+        self.seen = set()
+
+    def record(self, row, patient_id, status, patient_pk=None, errors=None):
+        """记录一行的处理结果"""
+        self.counts[status] += 1
+        result = {'row': row, 'patient_id': patient_id, 'status': status}
+        if patient_pk is not None:
+            result['id'] = patient_pk
+        if errors:
+            result['errors'] = errors
+        self.results.append(result)
+
+    def run(self, items):
+        """处理患者数据列表，返回汇总和逐行结果"""
+        for start in range(0, len(items), self.batch_size):
+            self.upsert_batch(list(enumerate(items[start:start + self.batch_size], start=start)))
+        return self.summary(len(items))
+
+    def summary(self, total):
+        return dict(self.counts, total=total, results=sorted(self.results, key=lambda r: r['row']))
+
+    def upsert_batch(self, batch):
+        """处理一个批次（单个事务）"""
+        pending = {}
+        for row, data in batch:
+            try:
+                patient_id, values, errors = normalize_patient(data)
+            except (TypeError, ValueError, AttributeError) as e:
+                patient_id, values, errors = None, {}, [f'数据格式错误: {str(e)}']
+            if not errors and (patient_id in self.seen or patient_id in pending):
+                errors = ['病历号在本次提交中重复']
+            if errors:
+                self.record(row, patient_id, 'failed', errors=errors)
+                continue
+            pending[patient_id] = (row, values)
+
+        if not pending:
+            return
+
+        # 一条 IN 查询取出本批次中已存在的患者
+        columns = [getattr(Patient, field) for field in UPSERT_FIELDS + DERIVED_FIELDS]
+        existing = {
+            row.patient_id: row
+            for row in db.session.execute(
+                select(Patient.id, Patient.patient_id, *columns).where(Patient.patient_id.in_(list(pending)))
+            )
+        }
+
+        now = datetime.utcnow()
+        inserts = []
+        updates = []
+        outcomes = []
+        for patient_id, (row, values) in pending.items():
+            current = existing.get(patient_id)
+            if current is None:
+                inserts.append(dict(values, patient_id=patient_id, created_by=self.created_by,
+                                    is_active=True, created_at=now, updated_at=now))
+                outcomes.append((row, patient_id, 'created', None))
+            elif not self.update_existing:
+                outcomes.append((row, patient_id, 'skipped', current.id))
+            else:
+                changes = {field: value for field, value in values.items() if getattr(current, field) != value}
+                if changes:
+                    updates.append(dict(changes, id=current.id, updated_at=now))
+                    outcomes.append((row, patient_id, 'updated', current.id))
+                else:
+                    outcomes.append((row, patient_id, 'unchanged', current.id))
+
+        try:
+            if inserts:
+                # 各行字段可能不同，补齐缺失的列以便 executemany
+                insert_columns = set().union(*inserts)
+                db.session.execute(insert(Patient.__table__), [
+                    {column: values.get(column) for column in insert_columns} for values in inserts
+                ])
+            if updates:
+                # 按主键批量更新（字段集合相同的行合并为一次 executemany）
+                db.session.execute(update(Patient), updates)
+
+            created_ids = dict(db.session.execute(
+                select(Patient.patient_id, Patient.id).where(
+                    Patient.patient_id.in_([values['patient_id'] for values in inserts])
+                )
+            ).all()) if inserts else {}
+            with event_bus.committing():
+                db.session.commit()
+                if inserts:
+                    publish_patients_created(len(inserts))
+        except Exception as e:
+            db.session.rollback()
+            for row, patient_id, _, _ in outcomes:
+                self.record(row, patient_id, 'failed', errors=[f'写入失败: {str(e)}'])
+            return
+
+        # 只记录已提交的病历号：回滚批次中的患者在后续行中重新出现时仍可写入
+        self.seen.update(pending)
+
+        for row, patient_id, status, patient_pk in outcomes:
+            self.record(row, patient_id, status, created_ids.get(patient_id, patient_pk))
\ No newline at end of file
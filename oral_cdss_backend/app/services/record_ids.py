@@ -0,0 +1,115 @@
+# app/services/record_ids.py
+"""
+病历号生成：MR + 日期 + 当天序号（至少6位），如 MR20240315000042
+
+每天的序号保存在 record_id_sequences 表中。各进程每次用一个独立的短事务原子地预留一段序号（一个块），
+之后在内存中逐个分配，用完再预留下一块，不需要每个病历号访问一次数据库。
+块一经预留即提交，调用方事务回滚也不会归还，所以多个工作进程之间不会重复（只会留下空号）。
+
+新病历号为16位以上，与旧的4位随机号（14位）长度不同。批量导入可以指定病历号，
+符合生成格式的病历号由导入器拒绝（见 is_generated_record_id），否则可能与之后分配的序号重复。
+"""
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import db
+from app.models import RecordIdSequence
+
+# 每次预留的序号数（批量分配时按需要的数量预留）
+BLOCK_SIZE = 100
+SEQUENCE_WIDTH = 6
+RESERVE_RETRIES = 5
+# MySQL 死锁（1213）和锁等待超时（1205），事务已回滚，可以重试
+RETRYABLE_ERROR_CODES = (1213, 1205)
+GENERATED_PATTERN = re.compile(r'^MR\d{8}\d{%d,}$' % SEQUENCE_WIDTH)
+
+
+def format_record_id(day, value):
+    return f'MR{day}{value:0{SEQUENCE_WIDTH}d}'
+
+
+def is_generated_record_id(record_id):
+    """是否符合系统生成的病历号格式（MR + 日期 + 至少6位序号）"""
+    return bool(GENERATED_PATTERN.match(record_id))
+
+
+def is_retryable_lock_error(error):
+    """是否为可重试的死锁/锁等待超时错误"""
+    args = getattr(error.orig, 'args', None)
+    return bool(args) and args[0] in RETRYABLE_ERROR_CODES
+
+
+def reserve_block(day, size):
+    """在独立事务中预留 day 当天的 size 个序号，返回第一个序号"""
+    table = RecordIdSequence.__table__
+    for _ in range(RESERVE_RETRIES):
+        try:
+            with db.engine.begin() as conn:
+                # UPDATE 持有行锁直到提交，并发进程的预留按顺序执行
+                if conn.execute(
+                    update(table).where(table.c.day == day).values(
+                        next_value=table.c.next_value + size, updated_at=datetime.utcnow()
+                    )
+                ).rowcount:
+                    return conn.scalar(select(table.c.next_value).where(table.c.day == day)) - size
+                conn.execute(insert(table).values(day=day, next_value=1 + size, updated_at=datetime.utcnow()))
+                return 1
+        except IntegrityError:
+            # 并发进程刚创建了当天的行，重试走 UPDATE
+            continue
+        except OperationalError as e:
+            # InnoDB 上两个进程同时为新的一天建行时，UPDATE 的间隙锁与 INSERT 互相等待，其中一方被判死锁回滚
+            if not is_retryable_lock_error(e):
+                raise
+            time.sleep(random.uniform(0.01, 0.05))
+            continue
+    raise RuntimeError('病历号序列预留失败')
+
+
+class RecordIdAllocator:
+    """进程内的病历号分配器（线程安全）"""
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.day = None
+        self.next_value = 0
+        self.end_value = 0  # 当前块的结束序号（不含）
+        self._lock = threading.Lock()
+
+    def allocate(self, count=1):
+        """分配 count 个病历号；当前块不够时一次预留剩余所需的数量（至少一个块）"""
+        day = datetime.now().strftime('%Y%m%d')
+        with self._lock:
+            if day != self.day:
+                self.day, self.next_value, self.end_value = day, 0, 0
+
+            values = []
+            while len(values) < count:
+                if self.next_value >= self.end_value:
+                    size = max(self.block_size, count - len(values))
+                    self.next_value = reserve_block(day, size)
+                    self.end_value = self.next_value + size
+                take = min(count - len(values), self.end_value - self.next_value)
+                values.extend(range(self.next_value, self.next_value + take))
+                self.next_value += take
+
+        return [format_record_id(day, value) for value in values]
+
+
+record_id_allocator = RecordIdAllocator()
+
+
+def next_record_id():
+    """分配一个病历号"""
+    return record_id_allocator.allocate()[0]
+
+
+def allocate_record_ids(count):
+    """批量分配病历号"""
+    return record_id_allocator.allocate(count) if count else []
\ No newline at end of file
@@ -0,0 +1,348 @@
+# app/services/record_import.py
+"""
+病历批量导入（CSV / NDJSON）
+
+逐行流式读取，按批次校验、批量解析患者、批量插入病历和临床特征，每个批次一个事务。
+某一行出错只跳过该行并记录原因，不影响同批次的其他行。
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from app import db
+from app.models import ClinicalFeature, MedicalRecord, Patient
+from app.services.dashboard_events import publish_records_imported
+from app.services.doctor_stats import records_created
+from app.services.record_ids import allocate_record_ids, is_generated_record_id
+from app.utils.event_bus import event_bus
+from app.utils.validation import validate_medical_record_data
+
+DEFAULT_BATCH_SIZE = 1000
+# 返回给调用方的行级错误条数上限（失败计数不受限制）
+MAX_REPORTED_ERRORS = 1000
+
+# 可导入的病历字段
+TEXT_FIELDS = ('record_id', 'chief_complaint', 'diagnosis', 'treatment_plan', 'tooth_number')
+INTEGER_FIELDS = ('bone_loss_percentage', 'mobility_degree')
+ENUM_FIELDS = ('periodontal_status', 'caries_degree', 'pulp_condition', 'occlusion_type', 'oral_hygiene',
+               'smoking_status')
+ENUM_VALUES = {field: tuple(getattr(MedicalRecord, field).type.enums) for field in ENUM_FIELDS}
+FEATURE_TYPES = ('numeric', 'categorical', 'text')
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y', '是')
+
+# 患者引用列：patient_pk 为患者ID（主键），patient_no 为患者病历号；
+# 旧的 patient_id 列两者都可以，按病历号和患者ID分别解析，同时匹配到不同患者时报错
+PATIENT_REF_COLUMNS = ('patient_pk', 'patient_no', 'patient_id')
+
+
+def iter_csv_rows(stream):
+    """逐行读取CSV（首行为表头），产出 (行号, 数据, 解析错误)"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        yield reader.line_num, row, None
+
+
+def iter_ndjson_rows(stream):
+    """逐行读取NDJSON（每行一个JSON对象），产出 (行号, 数据, 解析错误)"""
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8-sig'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'JSON格式错误: {e}'
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, '每行必须是一个JSON对象'
+            continue
+        yield line_number, data, None
+
+
+ROW_READERS = {
+    'csv': iter_csv_rows,
+    'ndjson': iter_ndjson_rows
+}
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def parse_patient_ref(data, errors):
+    """解析患者引用，返回 (列名, 值)，未填写或格式错误时返回 None"""
+    given = [column for column in PATIENT_REF_COLUMNS if not _blank(data.get(column))]
+    if not given:
+        errors.append(f"{'、'.join(PATIENT_REF_COLUMNS)}必须填写一个")
+        return None
+    if len(given) > 1:
+        errors.append(f"{'、'.join(given)}只能填写一个")
+        return None
+
+    column = given[0]
+    text = str(data[column]).strip()
+    if column == 'patient_pk':
+        if not text.isdigit():
+            errors.append('patient_pk必须是整数')
+            return None
+        return column, int(text)
+    return column, text
+
+
+def normalize_row(data):
+    """把一行原始数据转成病历列值和临床特征，返回 (values, features, errors)
+
+    CSV 的值都是字符串：空串视为未填写，数字和布尔值在这里转换；
+    clinical_features 在CSV中为JSON数组字符串，在NDJSON中可直接是数组。
+    values['patient_id'] 为患者引用 (列名, 值)，由导入器批量解析为患者ID。
+    """
+    data = {key.strip(): value for key, value in data.items() if key is not None}
+    errors = []
+    patient_ref = parse_patient_ref(data, errors)
+    # 患者引用已由 parse_patient_ref 校验，这里只校验其余字段
+    errors.extend(validate_medical_record_data(dict(data, patient_id=patient_ref or 'checked')))
+    values = {}
+
+    if patient_ref:
+        values['patient_id'] = patient_ref
+
+    for field in TEXT_FIELDS:
+        if not _blank(data.get(field)):
+            values[field] = str(data[field]).strip()
+
+    # 系统生成格式的病历号由序号表分配，导入时指定可能与之后生成的病历号重复
+    if 'record_id' in values and is_generated_record_id(values['record_id']):
+        errors.append('record_id不能使用系统生成的格式（MR+日期+6位以上序号），请留空由系统分配')
+
+    for field in INTEGER_FIELDS:
+        if not _blank(data.get(field)):
+            try:
+                values[field] = int(data[field])
+            except (TypeError, ValueError):
+                pass  # 已由 validate_medical_record_data 报告
+
+    for field, allowed in ENUM_VALUES.items():
+        if not _blank(data.get(field)):
+            value = str(data[field]).strip()
+            if value in allowed:
+                values[field] = value
+            else:
+                errors.append(f"{field}必须是以下之一: {', '.join(allowed)}")
+
+    diabetic = data.get('diabetic_status')
+    if isinstance(diabetic, bool):
+        values['diabetic_status'] = diabetic
+    else:
+        values['diabetic_status'] = not _blank(diabetic) and str(diabetic).strip().lower() in TRUE_VALUES
+
+    if not _blank(data.get('visit_date')):
+        try:
+            visit_date = str(data['visit_date']).strip().replace('Z', '+00:00')
+            values['visit_date'] = datetime.fromisoformat(visit_date)
+        except ValueError as e:
+            errors.append(f'就诊日期格式错误: {str(e)}')
+
+    features = data.get('clinical_features') or []
+    if isinstance(features, str):
+        try:
+            features = json.loads(features)
+        except ValueError:
+            errors.append('clinical_features必须是JSON数组')
+            features = []
+    if not isinstance(features, list):
+        errors.append('clinical_features必须是数组')
+        features = []
+
+    feature_rows = []
+    for feature in features:
+        if not isinstance(feature, dict) or _blank(feature.get('name')):
+            errors.append('临床特征必须包含name')
+            continue
+        feature_type = feature.get('type', 'text')
+        if feature_type not in FEATURE_TYPES:
+            errors.append(f"临床特征类型必须是以下之一: {', '.join(FEATURE_TYPES)}")
+            continue
+        value = feature.get('value')
+        numeric_value = ClinicalFeature.parse_numeric(value, feature_type)
+        if value is not None and feature_type == 'numeric' and numeric_value is None:
+            errors.append(f"数值型临床特征 {feature['name']} 的值必须是数字")
+            continue
+        feature_rows.append({
+            'feature_name': str(feature['name']),
+            'feature_value': None if value is None else str(value),
+            'feature_type': feature_type,
+            'numeric_value': numeric_value
+        })
+
+    return values, feature_rows, errors
+
+
+class RecordImporter:
+    """病历批量导入器"""
+
+    def __init__(self, creator_id, batch_size=DEFAULT_BATCH_SIZE):
+        self.creator_id = creator_id
+        self.batch_size = batch_size
+        self.total = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, row_number, messages):
+        """记录一行失败（每个批次结束后按行号排序、截断，见 run）"""
+        self.failed += 1
+        self.errors.append({'row': row_number, 'errors': messages})
+
+    def run(self, rows):
+        """导入 (行号, 数据, 解析错误) 序列，返回汇总"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.run_batch(batch)
+                batch = []
+        if batch:
+            self.run_batch(batch)
+        return self.summary()
+
+    def run_batch(self, batch):
+        """导入一个批次；同一批次的错误在不同阶段产生，按行号排序后只保留前 MAX_REPORTED_ERRORS 条"""
+        self.import_batch(batch)
+        self.errors.sort(key=lambda error: error['row'])
+        del self.errors[MAX_REPORTED_ERRORS:]
+
+    def summary(self):
+        return {
+            'total': self.total,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+    def resolve_patients(self, patient_refs):
+        """批量解析患者引用 (列名, 值)，返回 ({引用: 患者ID}, 有歧义的引用集合)
+
+        patient_id 列的值先按病历号解析；全为数字时也按患者ID解析，两者匹配到不同患者时视为有歧义。
+        """
+        ids = {value for column, value in patient_refs if column == 'patient_pk'}
+        ids.update(int(value) for column, value in patient_refs if column == 'patient_id' and value.isdigit())
+        codes = {value for column, value in patient_refs if column != 'patient_pk'}
+
+        existing_ids = set(db.session.scalars(select(Patient.id).where(Patient.id.in_(ids)))) if ids else set()
+        by_code = dict(db.session.execute(
+            select(Patient.patient_id, Patient.id).where(Patient.patient_id.in_(codes))
+        ).all()) if codes else {}
+
+        resolved, ambiguous = {}, set()
+        for ref in patient_refs:
+            column, value = ref
+            if column == 'patient_pk':
+                patient_pk = value if value in existing_ids else None
+            elif column == 'patient_no':
+                patient_pk = by_code.get(value)
+            else:
+                patient_pk = by_code.get(value)
+                id_match = int(value) if value.isdigit() and int(value) in existing_ids else None
+                if patient_pk is not None and id_match is not None and patient_pk != id_match:
+                    ambiguous.add(ref)
+                    continue
+                patient_pk = patient_pk if patient_pk is not None else id_match
+            if patient_pk is not None:
+                resolved[ref] = patient_pk
+        return resolved, ambiguous
+
+    def import_batch(self, batch):
+        """校验并插入一个批次（单个事务）"""
+        self.total += len(batch)
+
+        # 1. 逐行转换和校验
+        pending = []
+        for row_number, data, parse_error in batch:
+            if parse_error:
+                self.fail(row_number, [parse_error])
+                continue
+            try:
+                values, features, errors = normalize_row(data)
+            except (TypeError, ValueError, AttributeError) as e:
+                self.fail(row_number, [f'数据格式错误: {str(e)}'])
+                continue
+            if errors:
+                self.fail(row_number, errors)
+                continue
+            pending.append((row_number, values, features))
+
+        # 2. 批量解析患者、检查病历号重复
+        patients, ambiguous = self.resolve_patients({values['patient_id'] for _, values, _ in pending})
+        given_ids = [values['record_id'] for _, values, _ in pending if 'record_id' in values]
+        taken = set(db.session.scalars(
+            select(MedicalRecord.record_id).where(MedicalRecord.record_id.in_(given_ids))
+        )) if given_ids else set()
+
+        valid = []
+        for row_number, values, features in pending:
+            if values['patient_id'] in ambiguous:
+                self.fail(row_number, ['patient_id同时匹配一个患者的病历号和另一个患者的ID，请改用patient_no或patient_pk列'])
+                continue
+            if values['patient_id'] not in patients:
+                self.fail(row_number, ['患者不存在'])
+                continue
+            if values.get('record_id') in taken:
+                self.fail(row_number, ['病历号已存在'])
+                continue
+            values['patient_id'] = patients[values['patient_id']]
+            if 'record_id' in values:
+                taken.add(values['record_id'])
+            valid.append((row_number, values, features))
+
+        if not valid:
+            return
+
+        # 3. 补齐病历号，批量插入病历和临床特征
+        missing = [values for _, values, _ in valid if 'record_id' not in values]
+        for values, record_id in zip(missing, allocate_record_ids(len(missing))):
+            values['record_id'] = record_id
+
+        records = []
+        for _, values, _ in valid:
+            values['creator_id'] = self.creator_id
+            records.append(values)
+
+        try:
+            # 各行字段不完全相同，补齐缺失的列以便 executemany
+            columns = set().union(*records)
+            rows = [{column: values.get(column) for column in columns} for values in records]
+            for row in rows:
+                if row.get('visit_date') is None:
+                    row['visit_date'] = datetime.utcnow()
+            # 用表级 insert 做 executemany：不回取主键，特征行再按病历号批量查回主键
+            db.session.execute(insert(MedicalRecord.__table__), rows)
+
+            with_features = [(values['record_id'], features) for _, values, features in valid if features]
+            if with_features:
+                record_pks = dict(db.session.execute(
+                    select(MedicalRecord.record_id, MedicalRecord.id).where(
+                        MedicalRecord.record_id.in_([record_id for record_id, _ in with_features])
+                    )
+                ).all())
+                db.session.execute(insert(ClinicalFeature.__table__), [
+                    dict(feature, medical_record_id=record_pks[record_id])
+                    for record_id, features in with_features
+                    for feature in features
+                ])
+
+            records_created(self.creator_id, [values['patient_id'] for values in records])
+            with event_bus.committing():
+                db.session.commit()
+                publish_records_imported(len(valid))
+        except Exception as e:
+            db.session.rollback()
+            for row_number, _, _ in valid:
+                self.fail(row_number, [f'写入失败: {str(e)}'])
+            return
+
+        self.imported += len(valid)
\ No newline at end of file
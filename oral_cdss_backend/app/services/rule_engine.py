@@ -3,6 +3,9 @@ from datetime import datetime
 from app import db
 from app.models import Rule, RuleCategory, MedicalRecord
 
+# 引用病历扩展临床特征的条件字段前缀，如 feature:probing_depth
+FEATURE_FIELD_PREFIX = 'feature:'
+
 
 class RuleEngine:
     """规则引擎服务"""
@@ -23,6 +26,11 @@ class RuleEngine:
         mandatory_failures = []
         passed_mandatory = True
 
+        # 有规则引用临床特征时，一次取出病历的全部特征
+        features = None
+        if any(rule.condition_field.startswith(FEATURE_FIELD_PREFIX) for rule in self.rules):
+            features = self.feature_values(medical_record)
+
         # 按类别分组规则
         rules_by_category = {}
         for rule in self.rules:
@@ -37,7 +45,7 @@ class RuleEngine:
 
             for rule in rules:
                 # 检查规则条件
-                condition_met = self.check_condition(rule, medical_record)
+                condition_met = self.check_condition(rule, medical_record, features)
 
                 if condition_met:
                     # 硬性条件检查
@@ -90,10 +98,36 @@ class RuleEngine:
             'rule_evaluations': rule_evaluations
         }
 
-    def check_condition(self, rule, medical_record):
-        """检查规则条件是否满足"""
+    @staticmethod
+    def feature_values(medical_record):
+        """病历的临床特征 {特征名: 值}，数值型特征为 float"""
+        return {
+            feature.feature_name: feature.typed_value()
+            for feature in getattr(medical_record, 'clinical_features', None) or []
+        }
+
+    @staticmethod
+    def values_equal(field_value, condition_value):
+        """相等比较：数值型特征按数值比较（5.0 等于 '5'），其余按字符串比较"""
+        if isinstance(field_value, float):
+            try:
+                return field_value == float(condition_value)
+            except ValueError:
+                return False
+        return str(field_value) == condition_value
+
+    def check_condition(self, rule, medical_record, features=None):
+        """检查规则条件是否满足
+
+        condition_field 为 feature:<特征名> 时取病历的临床特征，features 为预先取出的特征字典。
+        """
         # 获取字段值
-        field_value = getattr(medical_record, rule.condition_field, None)
+        if rule.condition_field.startswith(FEATURE_FIELD_PREFIX):
+            if features is None:
+                features = self.feature_values(medical_record)
+            field_value = features.get(rule.condition_field[len(FEATURE_FIELD_PREFIX):])
+        else:
+            field_value = getattr(medical_record, rule.condition_field, None)
 
         if field_value is None:
             return False
@@ -104,9 +138,9 @@ class RuleEngine:
 
         try:
             if operator == '=':
-                return str(field_value) == condition_value
+                return self.values_equal(field_value, condition_value)
             elif operator == '!=':
-                return str(field_value) != condition_value
+                return not self.values_equal(field_value, condition_value)
             elif operator == '>':
                 return float(field_value) > float(condition_value)
             elif operator == '<':
@@ -117,10 +151,10 @@ class RuleEngine:
                 return float(field_value) <= float(condition_value)
             elif operator == 'in':
                 values = [v.strip() for v in condition_value.split(',')]
-                return str(field_value) in values
+                return any(self.values_equal(field_value, v) for v in values)
             elif operator == 'not_in':
                 values = [v.strip() for v in condition_value.split(',')]
-                return str(field_value) not in values
+                return not any(self.values_equal(field_value, v) for v in values)
             elif operator == 'contains':
                 return condition_value in str(field_value)
             else:
@@ -1,73 +1,412 @@
 # similarity_search.py - 学生简化版
 
+import hashlib
+import heapq
+import json
+import math
+import threading
+from array import array
+from operator import add
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from app import db
 from app.models import MedicalRecord, AssessmentResult
+from app.services.data_version import similarity_corpus_version
+from app.utils.cache import LRUCache
+from app.utils.pagination import keyset_page
+
+# 参与相似度计算的病历字段，用于生成缓存键
+SIMILARITY_FIELDS = [
+    'diagnosis', 'chief_complaint', 'bone_loss_percentage', 'mobility_degree', 'caries_degree',
+    'periodontal_status', 'pulp_condition', 'oral_hygiene', 'smoking_status', 'diabetic_status'
+]
+
+# 枚举特征的取值（有序特征按严重程度排列，距离为序号差归一化）
+ENUM_FEATURES = {
+    'periodontal_status': ['healthy', 'gingivitis', 'periodontitis'],
+    'caries_degree': ['none', 'superficial', 'medium', 'deep'],
+    'pulp_condition': ['vital', 'pulpitis', 'necrotic'],
+    'oral_hygiene': ['good', 'fair', 'poor'],
+    'smoking_status': ['non-smoker', 'former-smoker', 'smoker'],
+    'diabetic_status': [False, True]
+}
+
+# 数值特征及其取值上限（用于归一化）
+NUMERIC_FEATURES = {
+    'bone_loss_percentage': 100,
+    'mobility_degree': 3
+}
+
+# 加权模式的默认权重
+DEFAULT_WEIGHTS = {
+    'diagnosis': 2.0,
+    'bone_loss_percentage': 1.0,
+    'mobility_degree': 1.0,
+    'caries_degree': 1.0,
+    'periodontal_status': 1.0,
+    'pulp_condition': 1.0,
+    'oral_hygiene': 1.0,
+    'smoking_status': 1.0,
+    'diabetic_status': 1.0
+}
+
+
+def _build_distance_table(values):
+    """预计算枚举特征两两取值之间的距离（0-1）"""
+    n = len(values)
+    return [[abs(i - j) / (n - 1) for j in range(n)] for i in range(n)]
+
+
+ENUM_DISTANCE_TABLES = {field: _build_distance_table(values) for field, values in ENUM_FEATURES.items()}
+
+# 相似病例结果缓存上限
+SIMILAR_CASE_CACHE_MAX_ENTRIES = 2048
+SIMILAR_CASE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+_similar_case_cache = LRUCache(
+    max_entries=SIMILAR_CASE_CACHE_MAX_ENTRIES,
+    max_bytes=SIMILAR_CASE_CACHE_MAX_BYTES
+)
+
+def clinical_inputs_hash(record):
+    """计算病历临床输入的哈希值"""
+    values = [getattr(record, field, None) for field in SIMILARITY_FIELDS]
+    payload = json.dumps(values, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def parse_weights(weights_str):
+    """解析权重参数，格式如 bone_loss_percentage:2,smoking_status:0"""
+    weights = dict(DEFAULT_WEIGHTS)
+    if not weights_str:
+        return weights
+
+    for item in weights_str.split(','):
+        if not item.strip():
+            continue
+        name, sep, value = item.partition(':')
+        name = name.strip()
+        if not sep or name not in DEFAULT_WEIGHTS:
+            raise ValueError(f'未知的权重项: {item}')
+        weight = float(value)
+        if not math.isfinite(weight):
+            raise ValueError(f'权重必须是有限数值: {item}')
+        if weight < 0:
+            raise ValueError(f'权重不能为负数: {item}')
+        weights[name] = weight
+
+    return weights
+
+
+def parse_min_score(value, default=60):
+    """解析相似度下限，拒绝 nan/inf，并限制在 0-100 之间"""
+    if value is None or value == '':
+        return default
+    min_score = float(value)
+    if not math.isfinite(min_score):
+        raise ValueError(f'min_score必须是有限数值: {value}')
+    return min(max(min_score, 0.0), 100.0)
+
+
+class FeatureIndex:
+    """已最终化病历的列式特征索引
+
+    每个特征存为一列整数编码（缺失值编码为该列取值个数），查询时先按查询值
+    生成每列的加权距离行，再对整列做查表累加，权重在查询时才参与计算，
+    调整权重不需要重建索引。
+
+    安装了 numpy 时列存为整数数组，查表累加和打分都是整列的向量运算；
+    未安装时退回逐元素的 Python 计算（结果相同，较慢）。
+    """
+
+    def __init__(self):
+        self.generation = None
+        # (record_ids, columns, diagnosis_codes)，整体替换，避免读到重建到一半的索引
+        self.snapshot = (array('l'), {}, {})
+        self._lock = threading.Lock()
+
+    def ensure_built(self, version):
+        """索引版本与病例库的病历版本（见 similarity_corpus_version）不同时重建"""
+        if self.generation == version:
+            return
+        with self._lock:
+            if self.generation != version:
+                self._build(version)
+
+    def _build(self, generation):
+        fields = ['diagnosis'] + list(NUMERIC_FEATURES) + list(ENUM_FEATURES)
+        rows = db.session.query(
+            MedicalRecord.id,
+            *[getattr(MedicalRecord, field) for field in fields]
+        ).filter(
+            MedicalRecord.is_finalized == True
+        ).order_by(MedicalRecord.id).all()
+
+        record_ids = array('l')
+        columns = {field: array('l') for field in fields}
+        diagnosis_codes = {}
+
+        for row in rows:
+            record_ids.append(row[0])
+            for field, value in zip(fields, row[1:]):
+                columns[field].append(self.encode(field, value, diagnosis_codes))
+
+        if np is not None:
+            columns = {field: np.asarray(column, dtype=np.intp)
+                       for field, column in columns.items()}
+
+        self.snapshot = (record_ids, columns, diagnosis_codes)
+        self.generation = generation
+
+    @staticmethod
+    def missing_code(field):
+        """缺失值编码"""
+        if field in NUMERIC_FEATURES:
+            return NUMERIC_FEATURES[field] + 1
+        if field in ENUM_FEATURES:
+            return len(ENUM_FEATURES[field])
+        return -1
+
+    @classmethod
+    def encode(cls, field, value, diagnosis_codes, add_new=True):
+        """把特征值编码为整数"""
+        if value is None or value == '':
+            return cls.missing_code(field)
+
+        if field == 'diagnosis':
+            key = str(value).strip().lower()
+            if key not in diagnosis_codes:
+                if not add_new:
+                    return -2  # 不在索引中的诊断，与所有病例都不同
+                diagnosis_codes[key] = len(diagnosis_codes)
+            return diagnosis_codes[key]
+
+        if field in NUMERIC_FEATURES:
+            try:
+                return max(0, min(NUMERIC_FEATURES[field], int(value)))
+            except (TypeError, ValueError):
+                return cls.missing_code(field)
+
+        if field == 'diabetic_status':
+            value = bool(value) and str(value).lower() not in ('false', '0')
+        values = ENUM_FEATURES[field]
+        return values.index(value) if value in values else cls.missing_code(field)
+
+    @staticmethod
+    def distance_row(field, query_code, weight, diagnosis_codes):
+        """生成某列的加权距离行和权重行（按编码下标查表）"""
+        if field == 'diagnosis':
+            size = len(diagnosis_codes)
+            dist = [weight] * size
+            if 0 <= query_code < size:
+                dist[query_code] = 0.0
+            # 最后一位对应缺失值（下标-1）
+            return dist + [0.0], [weight] * size + [0.0]
+
+        if field in NUMERIC_FEATURES:
+            upper = NUMERIC_FEATURES[field]
+            dist = [weight * abs(v - query_code) / upper for v in range(upper + 1)]
+            return dist + [0.0], [weight] * (upper + 1) + [0.0]
+
+        table_row = ENUM_DISTANCE_TABLES[field][query_code]
+        return [weight * d for d in table_row] + [0.0], [weight] * len(table_row) + [0.0]
+
+    def score(self, current_record, weights, version):
+        """计算查询病历与索引中所有病历的相似度（0-100分），返回 (病历ID列, 分数列)"""
+        self.ensure_built(version)
+        record_ids, columns, diagnosis_codes = self.snapshot
+
+        size = len(record_ids)
+        if np is not None:
+            distances = np.zeros(size)
+            weight_sums = np.zeros(size)
+        else:
+            distances = [0.0] * size
+            weight_sums = [0.0] * size
+
+        for field, column in columns.items():
+            weight = weights.get(field, 0)
+            if not weight:
+                continue
+
+            query_code = self.encode(field, getattr(current_record, field, None),
+                                     diagnosis_codes, add_new=False)
+            if query_code == self.missing_code(field):
+                continue
+
+            dist_row, weight_row = self.distance_row(field, query_code, weight, diagnosis_codes)
+            if np is not None:
+                # 以整列编码为下标一次性查表
+                distances += np.asarray(dist_row)[column]
+                weight_sums += np.asarray(weight_row)[column]
+            else:
+                distances = list(map(add, distances, map(dist_row.__getitem__, column)))
+                weight_sums = list(map(add, weight_sums, map(weight_row.__getitem__, column)))
+
+        if np is not None:
+            scored = weight_sums > 0
+            scores = np.zeros(size)
+            scores[scored] = np.round(100 * (1 - distances[scored] / weight_sums[scored]), 1)
+            return record_ids, scores.tolist()
+
+        scores = [
+            round(100 * (1 - d / w), 1) if w else 0.0
+            for d, w in zip(distances, weight_sums)
+        ]
+        return record_ids, scores
+
+
+_feature_index = FeatureIndex()
 
 
 class SimpleSimilaritySearch:
     """简单版相似病例搜索 - 适合学生项目"""
 
     def __init__(self):
-        # 简单权重，不需要机器学习
-        self.weights = {
-            'bone_loss_percentage': 1.0,
-            'mobility_degree': 1.0,
-            'caries_degree': 1.0,
-            'periodontal_status': 1.0,
-            'pulp_condition': 1.0,
-            'oral_hygiene': 1.0,
-            'smoking_status': 1.0,
-            'diabetic_status': 1.0
-        }
+        # 简单权重，不需要机器学习（加权模式使用）
+        self.weights = dict(DEFAULT_WEIGHTS)
+
+    def find_similar_cases(self, current_record, limit=5, use_cache=True, mode='basic', weights=None,
+                           min_score=60):
+        """查找相似病例（结果按病历、临床输入和病例库版本缓存，病例库版本取自数据库，各工作进程一致）
+
+        mode='basic' 为原有的诊断/主诉匹配打分，mode='weighted' 按全部结构化特征加权打分，
+        weights 可以按请求覆盖默认权重；min_score 为两种模式共用的相似度下限（得分须高于该值）。
+        """
+        if mode == 'weighted':
+            weights = weights or self.weights
+            weights_key = tuple(sorted(weights.items()))
+        else:
+            weights_key = None
+
+        records_version, assessments_version = similarity_corpus_version()
+        cache_key = (
+            current_record.id,
+            clinical_inputs_hash(current_record),
+            records_version,
+            assessments_version,
+            limit,
+            mode,
+            weights_key,
+            min_score
+        )
+
+        if use_cache:
+            cached = _similar_case_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-    def find_similar_cases(self, current_record, limit=5):
-        """查找相似病例 - 超简单版"""
         try:
-            # 1. 获取所有病历（排除当前病历）
-            all_records = MedicalRecord.query.filter(
-                MedicalRecord.id != current_record.id,
-                MedicalRecord.is_finalized == True
-            ).all()
-
-            if not all_records:
-                return []
-
-            # 2. 为每个病历计算相似度
-            results = []
-            for record in all_records:
-                # 计算相似度（0-100分）
-                similarity_score = self._calculate_similarity(current_record, record)
-
-                # 只保留相似度大于60分的
-                if similarity_score > 60:
-                    # 获取评估结果
-                    assessment = AssessmentResult.query.filter_by(
-                        medical_record_id=record.id,
-                        is_latest=True
-                    ).first()
-
-                    # 添加到结果
-                    results.append({
-                        'record_id': record.id,
-                        'patient_id': record.patient_id,
-                        'chief_complaint': record.chief_complaint[:50] + "..." if len(
-                            record.chief_complaint) > 50 else record.chief_complaint,
-                        'diagnosis': record.diagnosis,
-                        'treatment_plan': record.treatment_plan,
-                        'visit_date': record.visit_date.strftime('%Y-%m-%d') if record.visit_date else None,
-                        'similarity_score': similarity_score,  # 0-100分
-                        'similarity_level': self._get_similarity_level(similarity_score),
-                        'assessment': self._format_assessment(assessment)
-                    })
-
-            # 3. 按相似度排序，取前几个
-            results.sort(key=lambda x: x['similarity_score'], reverse=True)
-            return results[:limit]
-
+            if mode == 'weighted':
+                results = self._search_weighted_cases(current_record, limit, weights, min_score, records_version)
+            else:
+                results = self._search_similar_cases(current_record, limit, min_score)
         except Exception as e:
             print(f"搜索出错（别担心，正常现象）: {str(e)}")
             return []
 
+        if use_cache:
+            _similar_case_cache.set(cache_key, results)
+
+        return results
+
+    def _search_similar_cases(self, current_record, limit, min_score=60):
+        """全量扫描计算相似病例"""
+        # 1. 获取所有病历（排除当前病历）
+        all_records = MedicalRecord.query.filter(
+            MedicalRecord.id != current_record.id,
+            MedicalRecord.is_finalized == True
+        ).all()
+
+        if not all_records:
+            return []
+
+        # 2. 为每个病历计算相似度
+        results = []
+        for record in all_records:
+            # 计算相似度（0-100分）
+            similarity_score = self._calculate_similarity(current_record, record)
+
+            # 只保留相似度大于下限的（默认60分）
+            if similarity_score > min_score:
+                # 获取评估结果
+                assessment = AssessmentResult.query.filter_by(
+                    medical_record_id=record.id,
+                    is_latest=True
+                ).first()
+
+                # 添加到结果
+                results.append({
+                    'record_id': record.id,
+                    'patient_id': record.patient_id,
+                    'chief_complaint': record.chief_complaint[:50] + "..." if len(
+                        record.chief_complaint) > 50 else record.chief_complaint,
+                    'diagnosis': record.diagnosis,
+                    'treatment_plan': record.treatment_plan,
+                    'visit_date': record.visit_date.strftime('%Y-%m-%d') if record.visit_date else None,
+                    'similarity_score': similarity_score,  # 0-100分
+                    'similarity_level': self._get_similarity_level(similarity_score),
+                    'assessment': self._format_assessment(assessment)
+                })
+
+        # 3. 按相似度排序，取前几个
+        results.sort(key=lambda x: x['similarity_score'], reverse=True)
+        return results[:limit]
+
+    def _search_weighted_cases(self, current_record, limit, weights, min_score, records_version):
+        """基于特征索引的加权相似度搜索"""
+        record_ids, scores = _feature_index.score(current_record, weights, records_version)
+
+        candidates = (
+            (score, record_id) for score, record_id in zip(scores, record_ids)
+            if score > min_score and record_id != current_record.id
+        )
+        top = heapq.nlargest(limit, candidates)
+        if not top:
+            return []
+
+        top_ids = [record_id for _, record_id in top]
+        records = {
+            record.id: record
+            for record in MedicalRecord.query.filter(MedicalRecord.id.in_(top_ids)).all()
+        }
+        assessments = {
+            assessment.medical_record_id: assessment
+            for assessment in AssessmentResult.query.filter(
+                AssessmentResult.medical_record_id.in_(top_ids),
+                AssessmentResult.is_latest == True
+            ).all()
+        }
+
+        results = []
+        for score, record_id in top:
+            record = records.get(record_id)
+            if not record:
+                continue
+            complaint = record.chief_complaint or ''
+            results.append({
+                'record_id': record.id,
+                'patient_id': record.patient_id,
+                'chief_complaint': complaint[:50] + "..." if len(complaint) > 50 else complaint,
+                'diagnosis': record.diagnosis,
+                'treatment_plan': record.treatment_plan,
+                'visit_date': record.visit_date.strftime('%Y-%m-%d') if record.visit_date else None,
+                'similarity_score': score,
+                'similarity_level': self._get_similarity_level(score),
+                'assessment': self._format_assessment(assessments.get(record_id))
+            })
+
+        return results
+
+    @staticmethod
+    def cache_stats():
+        """相似病例缓存统计"""
+        return _similar_case_cache.stats()
+
     def _calculate_similarity(self, record1, record2):
         """计算两个病历的相似度（0-100分）"""
         score = 0
@@ -132,39 +471,55 @@ class SimpleSimilaritySearch:
             'recommended_treatment': assessment.recommended_treatment
         }
 
-    def find_cases_by_treatment(self, treatment_type, limit=10):
+    def find_cases_by_treatment(self, treatment_type, limit=10, cursor=None):
         """根据治疗类型查找病例"""
         try:
-            records = MedicalRecord.query.join(
-                AssessmentResult,
-                AssessmentResult.medical_record_id == MedicalRecord.id
-            ).filter(
-                AssessmentResult.recommended_treatment == treatment_type,
-                MedicalRecord.is_finalized == True
-            ).limit(limit).all()
-
-            cases = []
-            for record in records:
-                assessment = AssessmentResult.query.filter_by(
-                    medical_record_id=record.id,
-                    is_latest=True
-                ).first()
-
-                cases.append({
-                    'record_id': record.id,
-                    'patient_id': record.patient_id,
-                    'diagnosis': record.diagnosis,
-                    'treatment_plan': record.treatment_plan,
-                    'visit_date': record.visit_date.strftime('%Y-%m-%d') if record.visit_date else None,
-                    'assessment': self._format_assessment(assessment)
-                })
-
+            cases, _ = self.find_cases_by_treatment_page(treatment_type, limit, cursor)
             return cases
 
         except Exception as e:
             print(f"按治疗类型查找出错: {str(e)}")
             return []
 
+    def find_cases_by_treatment_page(self, treatment_type, limit=10, cursor=None):
+        """按最新评估的推荐方案分页查找病例，返回 (病例列表, 下一页游标)
+
+        通过 latest_treatment 冗余字段走 (latest_treatment, visit_date, id) 索引范围扫描，
+        使用游标分页而不是 OFFSET；游标格式错误时抛出 ValueError。
+        """
+        query = MedicalRecord.query.filter(
+            MedicalRecord.latest_treatment == treatment_type,
+            MedicalRecord.is_finalized == True
+        )
+        records, next_cursor = keyset_page(
+            query, [MedicalRecord.visit_date, MedicalRecord.id], cursor=cursor, limit=limit
+        )
+
+        # 一次查询取出本页病历的最新评估
+        record_ids = [record.id for record in records]
+        assessments = {}
+        if record_ids:
+            assessments = {
+                assessment.medical_record_id: assessment
+                for assessment in AssessmentResult.query.filter(
+                    AssessmentResult.medical_record_id.in_(record_ids),
+                    AssessmentResult.is_latest == True
+                ).all()
+            }
+
+        cases = []
+        for record in records:
+            cases.append({
+                'record_id': record.id,
+                'patient_id': record.patient_id,
+                'diagnosis': record.diagnosis,
+                'treatment_plan': record.treatment_plan,
+                'visit_date': record.visit_date.strftime('%Y-%m-%d') if record.visit_date else None,
+                'assessment': self._format_assessment(assessments.get(record.id))
+            })
+
+        return cases, next_cursor
+
     def validate_record(self, medical_record):
         """验证病历是否完整"""
         required_fields = ['diagnosis', 'chief_complaint']
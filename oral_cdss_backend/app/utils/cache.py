@@ -0,0 +1,175 @@
+# app/utils/cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """粗略估算缓存值占用的字节数（按JSON序列化长度计算）"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+class LRUCache:
+    """带条目数和内存上限的LRU缓存（线程安全）"""
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """读取缓存，命中时移到队尾"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, size=None):
+        """写入缓存，超出上限时淘汰最久未使用的条目"""
+        if size is None:
+            size = estimate_size(value)
+
+        # 单个值超过总上限时不缓存
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._data[key] = (value, size)
+            self._bytes += size
+
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+
+        return True
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """缓存统计信息"""
+        return {
+            'entries': len(self._data),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class _Flight:
+    """正在进行中的一次计算"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """带过期时间的缓存，支持单飞（single-flight）计算合并
+
+    同一个键过期后，并发请求中只有一个线程执行计算，其余线程等待并复用其结果。
+    """
+
+    def __init__(self, default_ttl=10):
+        self.default_ttl = default_ttl
+        self._data = {}  # key -> (value, expires_at)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.computations = 0
+
+    def get(self, key, default=None):
+        """读取未过期的缓存值"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] > time.monotonic():
+                return item[0]
+            return default
+
+    def set(self, key, value, ttl=None):
+        """写入缓存"""
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            # 顺带清理已过期的键（键中含版本号时旧键不会再被访问）
+            for expired in [k for k, item in self._data.items() if item[1] <= now]:
+                del self._data[expired]
+            self._data[key] = (value, now + ttl)
+
+    def invalidate(self, key=None):
+        """删除指定键，未指定时清空全部"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """读取缓存，过期时合并并发请求只计算一次"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] > time.monotonic():
+                self.hits += 1
+                return item[0]
+
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            self.computations += 1
+            self.set(key, flight.value, ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        """缓存统计信息"""
+        return {
+            'entries': len(self._data),
+            'in_flight': len(self._flights),
+            'hits': self.hits,
+            'misses': self.misses,
+            'computations': self.computations
+        }
\ No newline at end of file
@@ -0,0 +1,129 @@
+# app/utils/columnar.py
+"""
+分块列式文件写入（NumPy .npz 兼容格式，仅依赖标准库）
+
+文件是一个 zip 包，每个数据块的每一列是一个 .npy 数组：chunk_00000/<列名>.npy，
+另有 schema.json 记录列类型、块数和总行数。可用 numpy.load 直接读取，
+也可以逐块读取拼接，内存占用只与块大小有关。
+"""
+import json
+import math
+import sys
+import zipfile
+from array import array
+from datetime import datetime, timedelta
+
+# 列类型 -> NumPy dtype 描述
+DTYPES = {
+    'int': '<i8',
+    'float': '<f8',
+    'bool': '|b1',
+    'datetime': '<M8[us]',
+    'str': '<U'
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+_NAT = -(2 ** 63)
+
+
+def _little_endian(values):
+    """array 按本机字节序存储，统一转为小端"""
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_column(kind, values):
+    """把一列Python值编码为 (dtype描述, 原始字节)
+
+    float 的空值写为 NaN，datetime 的空值写为 NaT，bool 的空值写为 False，str 的空值写为空串。
+    """
+    if kind == 'int':
+        return DTYPES['int'], _little_endian(array('q', values))
+    if kind == 'float':
+        return DTYPES['float'], _little_endian(array('d', [math.nan if v is None else float(v) for v in values]))
+    if kind == 'bool':
+        return DTYPES['bool'], bytes(1 if v else 0 for v in values)
+    if kind == 'datetime':
+        micros = [
+            _NAT if v is None else (v - _EPOCH) // _ONE_MICROSECOND
+            for v in values
+        ]
+        return DTYPES['datetime'], _little_endian(array('q', micros))
+    if kind == 'str':
+        texts = ['' if v is None else str(v) for v in values]
+        width = max((len(text) for text in texts), default=0) or 1
+        raw = b''.join(text.ljust(width, '\0').encode('utf-32-le') for text in texts)
+        return f"{DTYPES['str']}{width}", raw
+    raise ValueError(f'未知的列类型: {kind}')
+
+
+def npy_header(descr, length):
+    """生成 .npy 1.0 格式头（总长度按64字节对齐）"""
+    header = repr({'descr': descr, 'fortran_order': False, 'shape': (length,)})
+    prefix_length = 10  # 魔数6字节 + 版本2字节 + 头长度2字节
+    padding = 64 - (prefix_length + len(header) + 1) % 64
+    header = header + ' ' * (padding % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+class NpzStreamWriter:
+    """逐块写入列式 .npz 文件
+
+    fileobj 可以是普通文件，也可以是不可 seek 的流（如HTTP响应管道），zipfile 会改用数据描述符。
+    """
+
+    def __init__(self, fileobj, columns, compress=True):
+        self.columns = columns  # [(列名, 类型), ...]
+        self.chunk_count = 0
+        self.row_count = 0
+        self.zip = zipfile.ZipFile(
+            fileobj, 'w',
+            compression=zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED,
+            allowZip64=True
+        )
+
+    def write_chunk(self, rows):
+        """写入一个数据块，rows 为按列顺序排列的元组序列"""
+        if not rows:
+            return
+        for index, (name, kind) in enumerate(self.columns):
+            descr, raw = encode_column(kind, [row[index] for row in rows])
+            entry = f'chunk_{self.chunk_count:05d}/{name}.npy'
+            with self.zip.open(entry, 'w', force_zip64=True) as f:
+                f.write(npy_header(descr, len(rows)))
+                f.write(raw)
+        self.chunk_count += 1
+        self.row_count += len(rows)
+
+    def close(self):
+        """写入 schema.json 并结束zip"""
+        schema = {
+            'format': 'chunked-npz',
+            'columns': [{'name': name, 'type': kind} for name, kind in self.columns],
+            'chunks': self.chunk_count,
+            'rows': self.row_count
+        }
+        self.zip.writestr('schema.json', json.dumps(schema, ensure_ascii=False, indent=2))
+        self.zip.close()
+
+
+class StreamBuffer:
+    """供 zipfile 写入的只写缓冲区，调用方定期取走已写入的字节（用于流式HTTP响应）"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """取走并清空已写入的字节"""
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
\ No newline at end of file
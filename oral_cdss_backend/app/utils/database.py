@@ -7,8 +7,20 @@ def init_db():
         # 在函数内部导入 models，避免循环导入
         from app.models import User, Patient, MedicalRecord, Rule, RuleCategory, AssessmentResult
 
-        # 创建所有表
+        # 创建所有表，并为已有的表补建新增的列和索引
         db.create_all()
+        upgrade_schema()
+
+        # 已有评估但汇总表为空（从旧版本升级）时重建统计汇总
+        from app.services.assessment_rollup import ensure_rollups
+        ensure_rollups()
+
+        # 已有病历但医生统计表为空时重建医生统计
+        from app.services.doctor_stats import ensure_doctor_stats
+        ensure_doctor_stats()
+
+        # 已有评估但明细表为空时补写类别得分和规则命中
+        ensure_assessment_details()
 
         # 创建默认管理员用户
         admin = User.query.filter_by(username='admin').first()
@@ -156,6 +168,185 @@ def init_db():
         raise
 
 
+def sync_latest_treatments():
+    """根据最新评估结果回填病历的 latest_treatment 字段（升级已有数据时运行一次）"""
+    from app.models import MedicalRecord, AssessmentResult
+
+    latest = db.session.query(
+        AssessmentResult.recommended_treatment
+    ).filter(
+        AssessmentResult.medical_record_id == MedicalRecord.id,
+        AssessmentResult.is_latest == True
+    ).order_by(
+        AssessmentResult.id.desc()
+    ).limit(1).scalar_subquery()
+
+    updated = db.session.query(MedicalRecord).update(
+        {MedicalRecord.latest_treatment: latest},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return updated
+
+
+def upgrade_schema():
+    """为已有的表补建模型中新增的列和索引，返回执行的DDL语句
+
+    db.create_all() 只创建不存在的表，不会修改已有的表。新增的列一律按可空列添加，
+    需要 NOT NULL 的列须另行迁移。MySQL 上已有的 DATETIME 列按模型提高小数秒精度（如 DATETIME(6)）。
+    可重复运行，已存在的列和索引会跳过。
+    """
+    from sqlalchemy import inspect, text
+    from sqlalchemy.schema import CreateIndex
+    import app.models  # noqa: F401  确保所有模型已注册到 metadata
+
+    dialect = db.engine.dialect
+    preparer = dialect.identifier_preparer
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    statements = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            columns = {column['name']: column for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    existing_type = columns[column.name]['type'].compile(dialect=dialect)
+                    model_type = column.type.compile(dialect=dialect)
+                    if dialect.name == 'mysql' and model_type.startswith('DATETIME(') and existing_type != model_type:
+                        statement = (f'ALTER TABLE {preparer.format_table(table)} '
+                                     f'MODIFY COLUMN {preparer.format_column(column)} {model_type} '
+                                     f"{'NULL' if column.nullable else 'NOT NULL'}")
+                        conn.execute(text(statement))
+                        statements.append(statement)
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f'{table.name}.{column.name} 为 NOT NULL 列，需要手动迁移')
+                statement = (f'ALTER TABLE {preparer.format_table(table)} '
+                             f'ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=dialect)}')
+                conn.execute(text(statement))
+                statements.append(statement)
+
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    statements.append(str(CreateIndex(index).compile(dialect=dialect)))
+
+    return statements
+
+
+def backfill_in_batches(query, key_column, handle_batch, batch_size=1000):
+    """按主键分批回填：每批读取 key > 上一批末尾 ORDER BY key LIMIT batch_size，不一次载入全部待处理行
+
+    query 的第一列须为 key_column；handle_batch 接收一批行，写入后返回处理的行数，每批单独提交。
+    回填后仍满足过滤条件的行（如无法转换的值）不会被重复读取。
+    """
+    count = 0
+    last_key = None
+    while True:
+        batch_query = query if last_key is None else query.filter(key_column > last_key)
+        rows = batch_query.order_by(key_column).limit(batch_size).all()
+        if not rows:
+            return count
+        count += handle_batch(rows)
+        db.session.commit()
+        last_key = rows[-1][0]
+
+
+def backfill_assessment_details(batch_size=1000):
+    """为尚无明细行的评估结果补写类别得分和规则命中明细（升级已有数据时运行一次）"""
+    from sqlalchemy import exists
+    from app.models import AssessmentResult, AssessmentCategoryScore, AssessmentRuleEvaluation
+    from app.services.assessment_details import build_detail_rows, insert_detail_rows, load_stored_value
+
+    pending = db.session.query(
+        AssessmentResult.id,
+        AssessmentResult.category_scores,
+        AssessmentResult.rule_evaluations
+    ).filter(
+        ~exists().where(AssessmentCategoryScore.assessment_id == AssessmentResult.id),
+        ~exists().where(AssessmentRuleEvaluation.assessment_id == AssessmentResult.id)
+    )
+
+    def handle_batch(rows):
+        category_rows, rule_rows = [], []
+        for assessment_id, category_text, rule_text in rows:
+            categories, rules = build_detail_rows(assessment_id, {
+                'category_scores': load_stored_value(category_text, {}),
+                'rule_evaluations': load_stored_value(rule_text, [])
+            })
+            category_rows.extend(categories)
+            rule_rows.extend(rules)
+        insert_detail_rows(category_rows, rule_rows)
+        return len(rows)
+
+    return backfill_in_batches(pending, AssessmentResult.id, handle_batch, batch_size)
+
+
+def ensure_assessment_details():
+    """已有评估但明细表（类别得分、规则命中）都为空时补写明细，返回补写的评估数"""
+    from app.models import AssessmentResult, AssessmentCategoryScore, AssessmentRuleEvaluation
+
+    if not db.session.query(AssessmentResult.query.exists()).scalar():
+        return 0
+    if db.session.query(AssessmentCategoryScore.query.exists()).scalar() or \
+            db.session.query(AssessmentRuleEvaluation.query.exists()).scalar():
+        return 0
+    return backfill_assessment_details()
+
+
+def backfill_patient_name_keys(batch_size=1000):
+    """为尚无拼音检索键的患者补写全拼和首字母（升级已有数据时运行一次）"""
+    from sqlalchemy import update
+    from app.models import Patient
+    from app.utils.pinyin import name_keys
+
+    pending = db.session.query(Patient.id, Patient.full_name).filter(
+        Patient.name_pinyin.is_(None),
+        Patient.full_name.isnot(None)
+    )
+
+    def handle_batch(rows):
+        updates = []
+        for patient_id, full_name in rows:
+            name_pinyin, name_initials = name_keys(full_name)
+            if name_pinyin:
+                updates.append({'id': patient_id, 'name_pinyin': name_pinyin, 'name_initials': name_initials})
+        if updates:
+            db.session.execute(update(Patient), updates)
+        return len(updates)
+
+    return backfill_in_batches(pending, Patient.id, handle_batch, batch_size)
+
+
+def backfill_feature_numeric_values(batch_size=1000):
+    """为数值型临床特征补写 numeric_value（升级已有数据时运行一次），返回补写的行数"""
+    from sqlalchemy import update
+    from app.models import ClinicalFeature
+
+    pending = db.session.query(ClinicalFeature.id, ClinicalFeature.feature_value).filter(
+        ClinicalFeature.feature_type == 'numeric',
+        ClinicalFeature.numeric_value.is_(None),
+        ClinicalFeature.feature_value.isnot(None)
+    )
+
+    def handle_batch(rows):
+        updates = []
+        for feature_id, feature_value in rows:
+            numeric_value = ClinicalFeature.parse_numeric(feature_value, 'numeric')
+            if numeric_value is not None:
+                updates.append({'id': feature_id, 'numeric_value': numeric_value})
+        if updates:
+            db.session.execute(update(ClinicalFeature), updates)
+        return len(updates)
+
+    return backfill_in_batches(pending, ClinicalFeature.id, handle_batch, batch_size)
+
+
 def db_session():
     """获取数据库会话"""
     return db.session
@@ -0,0 +1,44 @@
+# app/utils/downsample.py
+
+
+def lttb_indices(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标列表
+
+    首尾两点必定保留；中间的点按桶划分，每个桶保留与前一个保留点、下一个桶均值点
+    构成三角形面积最大的点，尽量保持曲线的形状（峰值和拐点）。
+    """
+    length = len(xs)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+
+    selected = [0]
+    bucket_size = (length - 2) / (threshold - 2)
+    previous = 0
+
+    for i in range(threshold - 2):
+        # 当前桶范围
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # 下一个桶的平均点（最后一个桶用终点）
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, length)
+        if next_start >= next_end:
+            avg_x, avg_y = xs[-1], ys[-1]
+        else:
+            span = next_end - next_start
+            avg_x = sum(xs[next_start:next_end]) / span
+            avg_y = sum(ys[next_start:next_end]) / span
+
+        px, py = xs[previous], ys[previous]
+        best, best_area = start, -1.0
+        for j in range(start, min(end, length - 1)):
+            area = abs((px - avg_x) * (ys[j] - py) - (px - xs[j]) * (avg_y - py))
+            if area > best_area:
+                best, best_area = j, area
+
+        selected.append(best)
+        previous = best
+
+    selected.append(length - 1)
+    return selected
\ No newline at end of file
@@ -0,0 +1,43 @@
+# app/utils/etag.py
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+
+def make_etag(version, path=None):
+    """由数据版本和请求路径（含查询参数）生成ETag值"""
+    raw = f'{version}|{path if path is not None else request.full_path}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def conditional_get(version_func):
+    """条件GET装饰器：版本未变化时直接返回304，不执行视图的查询和序列化
+
+    version_func 接收视图参数，返回可转成字符串的版本标识；返回 None 时跳过缓存校验
+    （例如资源不存在，交给视图返回404）。放在 auth_required 之后，保证先做认证。
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            version = version_func(*args, **kwargs)
+            if version is None:
+                return f(*args, **kwargs)
+
+            etag = make_etag(version)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            # 允许浏览器缓存，但每次都需要带 If-None-Match 重新校验
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        return decorated_function
+
+    return decorator
\ No newline at end of file
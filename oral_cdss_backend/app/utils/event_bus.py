@@ -0,0 +1,162 @@
+# app/utils/event_bus.py
+import itertools
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Subscription:
+    """事件订阅：每个订阅者一个有界队列，消费过慢时丢弃并标记溢出"""
+
+    def __init__(self, max_pending):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """取下一个事件，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """进程内事件总线
+
+    写操作提交后发布事件，订阅者（如SSE连接）各自从自己的队列读取。
+    保留最近的事件，断线重连时可按事件ID补发。只在当前进程内有效。
+
+    写操作的提交和发布放在 committing() 中，snapshot() 在闸门外计算快照，计算前后各在闸门内
+    （等待进行中的写操作完成）读一次事件ID，两次相同说明期间没有写操作提交，
+    因此快照对应的事件ID之前发布的事件都已计入快照，之后发布的都未计入。
+    """
+
+    def __init__(self, history_size=256, max_pending=1000):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._history = deque(maxlen=history_size)
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._lock = threading.Lock()
+        # 提交/快照互斥：进行中的写操作数、是否正在取快照、等待取快照的数量（等待时不再放行新的写操作）
+        self._gate = threading.Condition()
+        self._committing = 0
+        self._snapshotting = False
+        self._snapshot_waiters = 0
+
+    @contextmanager
+    def committing(self):
+        """写操作的提交和事件发布区间（多个写操作可同时进入，与 snapshot 互斥）"""
+        with self._gate:
+            while self._snapshotting or self._snapshot_waiters:
+                self._gate.wait()
+            self._committing += 1
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._committing -= 1
+                if not self._committing:
+                    self._gate.notify_all()
+
+    @contextmanager
+    def _exclusive(self):
+        """等待进行中的写操作完成，并在区间内阻止新的提交"""
+        with self._gate:
+            self._snapshot_waiters += 1
+            while self._snapshotting or self._committing:
+                self._gate.wait()
+            self._snapshot_waiters -= 1
+            self._snapshotting = True
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._snapshotting = False
+                self._gate.notify_all()
+
+    def settled_id(self):
+        """没有写操作处于提交和发布之间时的最近事件ID（只短暂阻止提交）"""
+        with self._exclusive():
+            return self.last_id()
+
+    def snapshot(self, compute, attempts=3):
+        """执行 compute，返回 (结果, 对应的事件ID)
+
+        compute 在闸门外执行，不阻塞写操作；期间有写操作提交（前后事件ID不同）时重算。
+        连续 attempts 次都被写操作打断时，最后一次在闸门内计算，保证能取到快照。
+        """
+        for _ in range(attempts):
+            start_id = self.settled_id()
+            result = compute()
+            if self.settled_id() == start_id:
+                return result, start_id
+
+        with self._exclusive():
+            return compute(), self.last_id()
+
+    def subscribe(self):
+        """新建订阅"""
+        subscription = Subscription(self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """取消订阅"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type, data):
+        """发布事件，返回事件字典"""
+        with self._lock:
+            event = {'id': next(self._ids), 'type': event_type, 'data': data, 'time': datetime.now()}
+            self._last_id = event['id']
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            subscription.put(event)
+        return event
+
+    def events_since(self, last_id):
+        """返回ID大于 last_id 的历史事件；历史不足以补齐（或进程已重启）时返回 None"""
+        with self._lock:
+            history = list(self._history)
+            latest_id = self._last_id
+
+        if last_id > latest_id:
+            return None
+        if history and history[0]['id'] > last_id + 1:
+            return None
+        return [event for event in history if event['id'] > last_id]
+
+    def event_time(self, event_id):
+        """历史中该事件的发布时间，不在历史中时返回 None"""
+        with self._lock:
+            for event in self._history:
+                if event['id'] == event_id:
+                    return event['time']
+        return None
+
+    def last_id(self):
+        """最近一次发布的事件ID"""
+        with self._lock:
+            return self._last_id
+
+    def subscriber_count(self):
+        """当前订阅者数量"""
+        with self._lock:
+            return len(self._subscribers)
+
+
+# 全局事件总线
+event_bus = EventBus()
\ No newline at end of file
@@ -0,0 +1,24 @@
+# app/utils/fieldsets.py
+from datetime import date, datetime
+
+
+def parse_fieldset(value, allowed, label='fields'):
+    """解析逗号分隔的 ?fields= / ?embed= 参数
+
+    未传参数时返回 None（表示使用默认字段），含未知名称时抛出 ValueError。
+    """
+    if value is None:
+        return None
+
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f'{label}包含未知字段: {", ".join(unknown)}')
+    return tuple(dict.fromkeys(names))
+
+
+def serialize_value(value):
+    """日期时间转为ISO字符串，其余原样返回"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
\ No newline at end of file
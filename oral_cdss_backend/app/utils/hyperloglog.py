@@ -0,0 +1,73 @@
+# app/utils/hyperloglog.py
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """HyperLogLog 基数估计
+
+    用固定大小的寄存器数组估计不同元素个数，可合并（按寄存器取最大值）、可序列化为字节保存到数据库。
+    precision=12 时占 4KB，标准误差约 1.6%；元素较少时使用线性计数，结果基本精确。
+    """
+
+    def __init__(self, precision=12, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision必须在4到16之间')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError('寄存器数量与精度不匹配')
+
+    @staticmethod
+    def _hash(value):
+        """64位哈希"""
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def add(self, value):
+        """加入一个元素，寄存器发生变化时返回 True"""
+        hashed = self._hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        # 剩余位中第一个1的位置（从1开始计）
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def count(self):
+        """估计不同元素个数"""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # 小基数时用线性计数修正
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def merge(self, other):
+        """合并另一个同精度的估计器"""
+        if other.precision != self.precision:
+            raise ValueError('只能合并相同精度的HyperLogLog')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def to_bytes(self):
+        """序列化（第一个字节为精度）"""
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """反序列化，data 为空时返回空估计器"""
+        if not data:
+            return cls()
+        return cls(precision=data[0], registers=data[1:])
+
+    def __len__(self):
+        return self.count()
\ No newline at end of file
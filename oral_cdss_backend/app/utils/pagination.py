@@ -0,0 +1,110 @@
+# app/utils/pagination.py
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, false, or_
+
+
+def encode_cursor(values):
+    """将排序键的值编码为不透明游标"""
+    payload = []
+    for value in values:
+        if isinstance(value, datetime):
+            payload.append({'dt': value.isoformat()})
+        else:
+            payload.append(value)
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """解码游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError('游标格式错误') from e
+
+    if not isinstance(payload, list) or len(payload) != size:
+        raise ValueError('游标格式错误')
+
+    values = []
+    for value in payload:
+        if isinstance(value, dict) and 'dt' in value:
+            try:
+                values.append(datetime.fromisoformat(value['dt']))
+            except (ValueError, TypeError) as e:
+                raise ValueError('游标格式错误') from e
+        elif value is None or isinstance(value, (str, int, float)):
+            values.append(value)
+        else:
+            raise ValueError('游标格式错误')
+    return values
+
+
+def _nullable(column):
+    return getattr(getattr(column, 'expression', column), 'nullable', False)
+
+
+def _equals(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _after(column, value, descending):
+    """排序方向上严格位于 value 之后的条件（NULL 按最小值处理，与 MySQL、SQLite 的排序一致）"""
+    if value is None:
+        return false() if descending else column.isnot(None)
+    if descending:
+        return or_(column < value, column.is_(None)) if _nullable(column) else column < value
+    return column > value
+
+
+def keyset_filter(columns, values, descending=True):
+    """生成 (c1, c2, ...) 在游标之后的过滤条件
+
+    等价于行比较 (c1, c2) < (v1, v2)（降序）或 > （升序），
+    展开成 OR/AND 形式以兼容不支持行值比较的数据库，并能利用复合索引。
+    可为空的列按 NULL 最小处理，值为 NULL 的行不会使分页提前结束。
+    """
+    conditions = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        prefix = [_equals(columns[j], values[j]) for j in range(i)]
+        conditions.append(and_(*prefix, _after(column, value, descending)))
+    return or_(*conditions)
+
+
+def keyset_page(query, columns, cursor=None, limit=20, descending=True):
+    """按复合键做游标分页，返回 (本页对象列表, 下一页游标)
+
+    columns 为排序列（最后一列需唯一，通常为主键），多取一条用于判断是否还有下一页。
+    """
+    if cursor:
+        query = query.filter(keyset_filter(columns, decode_cursor(cursor, len(columns)), descending))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    items = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return items, next_cursor
+
+
+def parse_limit(value, default, maximum, name='limit'):
+    """解析条数参数，限制在 1 到 maximum 之间，格式错误时抛出 ValueError"""
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'{name}必须是整数') from e
+    return max(1, min(limit, maximum))
+
+
+def count_total(query):
+    """统计查询的总行数（去掉排序），仅在客户端需要总数时调用"""
+    return query.order_by(None).count()
\ No newline at end of file
@@ -0,0 +1,37 @@
+# app/utils/pinyin.py
+"""
+姓名拼音检索键（全拼 + 首字母），如 张三 -> ('zhangsan', 'zs')
+
+依赖可选的 pypinyin；未安装时汉字部分无法转换，只保留姓名中的字母和数字。
+"""
+import re
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+_WORD = re.compile(r'[0-9a-z]+')
+
+
+def pinyin_available():
+    """是否安装了 pypinyin"""
+    return lazy_pinyin is not None
+
+
+def name_keys(name):
+    """返回 (全拼, 首字母)，姓名为空时返回 (None, None)
+
+    非汉字部分（如英文名）按单词处理：全拼为单词拼接，首字母取每个单词的首字母。
+    """
+    if not name:
+        return None, None
+
+    chunks = lazy_pinyin(name) if lazy_pinyin is not None else [name]
+    words = []
+    for chunk in chunks:
+        words.extend(_WORD.findall(chunk.lower()))
+
+    if not words:
+        return None, None
+    return ''.join(words)[:255], ''.join(word[0] for word in words)[:50]
\ No newline at end of file
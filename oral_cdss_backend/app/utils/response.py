@@ -34,6 +34,23 @@ def paginated_response(data, total, page, per_page, message="查询成功"):
     }
     return jsonify(response), 200
 
+def cursor_response(data, next_cursor, per_page, total=None, message="查询成功"):
+    """游标分页响应，total 仅在客户端请求时返回"""
+    pagination = {
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        'per_page': per_page
+    }
+    if total is not None:
+        pagination['total'] = total
+    response = {
+        'success': True,
+        'message': message,
+        'data': data,
+        'pagination': pagination
+    }
+    return jsonify(response), 200
+
 def created_response(data=None, message="创建成功"):
     """创建成功响应"""
     return success_response(data, message, 201)
@@ -0,0 +1,8 @@
+# benchmarks/__init__.py
+"""
+性能基准模块：合成病例库生成与基准测试
+
+用法（在 oral_cdss_backend 目录下运行）：
+    python -m benchmarks.generate_corpus --rows 10k
+    python -m benchmarks.run_benchmarks --rows 10k
+"""
\ No newline at end of file
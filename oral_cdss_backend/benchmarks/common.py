@@ -0,0 +1,42 @@
+# benchmarks/common.py
+import math
+import os
+
+from app import create_app
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+# 预设规模
+SIZE_PRESETS = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000
+}
+
+
+def parse_rows(value):
+    """解析规模参数，支持 10k / 100k / 1m 或具体数字"""
+    value = str(value).lower()
+    if value in SIZE_PRESETS:
+        return SIZE_PRESETS[value]
+    return int(value)
+
+
+def default_db_path(rows):
+    """按规模生成默认的SQLite文件路径"""
+    return os.path.join(DATA_DIR, f'corpus_{rows}.db')
+
+
+def create_benchmark_app(db_path):
+    """创建指向本地SQLite文件的应用"""
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(db_path)}'
+    })
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
\ No newline at end of file
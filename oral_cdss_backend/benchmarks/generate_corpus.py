@@ -0,0 +1,381 @@
+# benchmarks/generate_corpus.py
+"""
+合成临床病例库生成器
+
+按固定随机种子生成可复现的 Patient / MedicalRecord / AssessmentResult 数据，
+评估结果由真实的 DecisionAlgorithm 计算，保证与线上评估逻辑一致。
+
+用法：
+    python -m benchmarks.generate_corpus --rows 10k
+    python -m benchmarks.generate_corpus --rows 1m --db /tmp/corpus_1m.db --force
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.utils.pinyin import name_keys
+from benchmarks.common import create_benchmark_app, default_db_path, parse_rows
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤'
+GIVEN_CHARS = '伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超兰霞平刚桂华建国文辉玲晨宇轩浩然子涵欣怡梓萱思源雨博嘉俊佳琪'
+
+TOOTH_NUMBERS = [f'{quadrant}{tooth}' for quadrant in range(1, 5) for tooth in range(1, 9)]
+
+CHIEF_COMPLAINTS = {
+    'pulp': ['牙齿 自发痛', '夜间 疼痛 加重', '冷热 刺激痛', '咬合痛'],
+    'periodontal': ['牙龈 出血', '牙齿 松动', '牙龈 肿胀', '口臭', '咀嚼 无力'],
+    'caries': ['牙齿 发黑', '食物 嵌塞', '冷热 敏感', '牙齿 缺损'],
+    'general': ['要求 检查', '牙齿 不适', '要求 修复']
+}
+
+
+def weighted_choice(rnd, options):
+    """按权重随机选择，options为[(值, 权重), ...]"""
+    total = sum(weight for _, weight in options)
+    point = rnd.random() * total
+    for value, weight in options:
+        point -= weight
+        if point <= 0:
+            return value
+    return options[-1][0]
+
+
+def random_name(rnd):
+    """生成随机中文姓名"""
+    length = 1 if rnd.random() < 0.3 else 2
+    return rnd.choice(SURNAMES) + ''.join(rnd.choice(GIVEN_CHARS) for _ in range(length))
+
+
+def generate_clinical_features(rnd, age):
+    """生成相互关联的临床特征"""
+    smoking_status = weighted_choice(rnd, [('non-smoker', 70), ('former-smoker', 12), ('smoker', 18)])
+    oral_hygiene = weighted_choice(rnd, [('good', 40), ('fair', 40), ('poor', 20)])
+    diabetic_status = rnd.random() < (0.04 if age < 40 else 0.15)
+
+    # 吸烟、口腔卫生差、年龄大都会提高牙周炎概率
+    periodontitis_weight = 20 + (15 if smoking_status == 'smoker' else 0) + \
+        (15 if oral_hygiene == 'poor' else 0) + (10 if age >= 50 else 0)
+    periodontal_status = weighted_choice(rnd, [
+        ('healthy', 45), ('gingivitis', 30), ('periodontitis', periodontitis_weight)
+    ])
+
+    if periodontal_status == 'periodontitis':
+        bone_loss = int(max(15, min(95, rnd.gauss(45, 18))))
+    elif periodontal_status == 'gingivitis':
+        bone_loss = rnd.randint(0, 20)
+    else:
+        bone_loss = rnd.randint(0, 10)
+
+    if bone_loss < 20:
+        mobility = 0
+    elif bone_loss < 40:
+        mobility = rnd.choice([0, 1])
+    elif bone_loss < 60:
+        mobility = rnd.choice([1, 2])
+    else:
+        mobility = rnd.choice([2, 3])
+
+    caries_degree = weighted_choice(rnd, [('none', 35), ('superficial', 25), ('medium', 22), ('deep', 18)])
+    if caries_degree == 'deep':
+        pulp_condition = weighted_choice(rnd, [('vital', 25), ('pulpitis', 50), ('necrotic', 25)])
+    elif caries_degree == 'medium':
+        pulp_condition = weighted_choice(rnd, [('vital', 85), ('pulpitis', 15)])
+    else:
+        pulp_condition = 'vital'
+
+    occlusion_type = weighted_choice(rnd, [('normal', 70), ('deep', 12), ('cross', 10), ('open', 8)])
+
+    return {
+        'tooth_number': rnd.choice(TOOTH_NUMBERS),
+        'periodontal_status': periodontal_status,
+        'bone_loss_percentage': bone_loss,
+        'mobility_degree': mobility,
+        'caries_degree': caries_degree,
+        'pulp_condition': pulp_condition,
+        'occlusion_type': occlusion_type,
+        'oral_hygiene': oral_hygiene,
+        'smoking_status': smoking_status,
+        'diabetic_status': diabetic_status
+    }
+
+
+def derive_diagnosis(rnd, features):
+    """根据主要问题推导诊断和主诉"""
+    if features['pulp_condition'] == 'necrotic':
+        diagnosis, group = '牙髓坏死', 'pulp'
+    elif features['pulp_condition'] == 'pulpitis':
+        diagnosis, group = rnd.choice(['急性牙髓炎', '慢性牙髓炎']), 'pulp'
+    elif features['periodontal_status'] == 'periodontitis':
+        diagnosis, group = '慢性牙周炎', 'periodontal'
+    elif features['caries_degree'] in ('medium', 'deep'):
+        diagnosis, group = '深龋' if features['caries_degree'] == 'deep' else '中龋', 'caries'
+    elif features['caries_degree'] == 'superficial':
+        diagnosis, group = '浅龋', 'caries'
+    elif features['periodontal_status'] == 'gingivitis':
+        diagnosis, group = '牙龈炎', 'periodontal'
+    else:
+        diagnosis, group = '牙体缺损', 'general'
+
+    phrases = rnd.sample(CHIEF_COMPLAINTS[group], k=min(2, len(CHIEF_COMPLAINTS[group])))
+    return diagnosis, ' '.join(phrases)
+
+
+class CorpusGenerator:
+    """可复现的合成病例库生成器"""
+
+    def __init__(self, rows, seed=20240601, finalized_ratio=0.8, with_plans=True, chunk_size=5000,
+                 doctor_count=20):
+        self.rows = rows
+        self.rnd = random.Random(seed)
+        self.finalized_ratio = finalized_ratio
+        self.with_plans = with_plans
+        self.chunk_size = chunk_size
+        self.doctor_count = doctor_count
+        self.patient_count = max(1, rows // 4)
+        # 固定基准时间，保证多次生成的数据完全一致
+        self.end_time = datetime(2024, 6, 1)
+        self.start_time = self.end_time - timedelta(days=730)
+
+    def run(self):
+        """生成全部数据"""
+        from app.models import RuleCategory
+        from app.services.decision_algorithm import DecisionAlgorithm
+        from app.services.assessment_rollup import rebuild_daily_stats
+        from app.services.doctor_stats import rebuild_doctor_stats
+
+        started = time.time()
+        doctor_ids = self.create_doctors()
+        patients = self.create_patients(doctor_ids)
+        print(f'  患者: {self.patient_count}  ({time.time() - started:.1f}s)')
+
+        # 持有规则分类的强引用，使规则引擎中的 RuleCategory.query.get 命中会话身份映射
+        categories = RuleCategory.query.all()
+        algorithm = DecisionAlgorithm()
+        self.create_records(algorithm, doctor_ids, patients)
+        del categories
+        print(f'  病历: {self.rows}  ({time.time() - started:.1f}s)')
+
+        rebuild_daily_stats()
+        rebuild_doctor_stats()
+        print(f'  汇总表  ({time.time() - started:.1f}s)')
+
+    def create_doctors(self):
+        """创建医生账号（共用一个密码哈希，避免重复计算）"""
+        from app.models import User
+
+        password_hash = generate_password_hash('doctor123')
+        doctors = []
+        for i in range(self.doctor_count):
+            doctor = User(
+                username=f'bench_doctor{i:03d}',
+                password_hash=password_hash,
+                full_name=random_name(self.rnd) + '医生',
+                email=f'bench_doctor{i:03d}@oralcdss.com',
+                role='doctor' if i % 5 else 'intern',
+                department='口腔科'
+            )
+            db.session.add(doctor)
+            doctors.append(doctor)
+        db.session.commit()
+        return [doctor.id for doctor in doctors]
+
+    def random_time(self):
+        """在时间范围内随机取一个时间点"""
+        span = (self.end_time - self.start_time).total_seconds()
+        return self.start_time + timedelta(seconds=self.rnd.random() * span)
+
+    def create_patients(self, doctor_ids):
+        """批量写入患者，返回 [(id, 年龄)]"""
+        from app.models import Patient
+
+        patients = []
+        batch = []
+        for i in range(1, self.patient_count + 1):
+            age = int(max(6, min(90, self.rnd.gauss(42, 16))))
+            created_at = self.random_time()
+            birth_date = (self.end_time - timedelta(days=age * 365 + self.rnd.randint(0, 364))).date()
+            full_name = random_name(self.rnd)
+            name_pinyin, name_initials = name_keys(full_name)
+            batch.append({
+                'id': i,
+                'patient_id': f'P{i:08d}',
+                'full_name': full_name,
+                'name_pinyin': name_pinyin,
+                'name_initials': name_initials,
+                'gender': self.rnd.choice(['male', 'female']),
+                'date_of_birth': birth_date,
+                'age': age,
+                'phone': '1' + self.rnd.choice('3578') + ''.join(self.rnd.choice('0123456789') for _ in range(9)),
+                'blood_type': weighted_choice(self.rnd, [('A', 28), ('B', 24), ('AB', 9), ('O', 34), ('unknown', 5)]),
+                'is_active': self.rnd.random() > 0.03,
+                'created_by': self.rnd.choice(doctor_ids),
+                'created_at': created_at,
+                'updated_at': created_at
+            })
+            patients.append((i, age))
+
+            if len(batch) >= self.chunk_size:
+                db.session.execute(insert(Patient), batch)
+                db.session.commit()
+                batch = []
+
+        if batch:
+            db.session.execute(insert(Patient), batch)
+            db.session.commit()
+
+        return patients
+
+    def create_records(self, algorithm, doctor_ids, patients):
+        """分批写入病历、评估结果和治疗方案"""
+        from app.models import MedicalRecord, AssessmentResult, TreatmentPlan
+
+        records, assessments, plans = [], [], []
+        category_rows, rule_rows = [], []
+        assessment_id = 0
+        plan_id = 0
+
+        for record_id in range(1, self.rows + 1):
+            patient_id, age = self.rnd.choice(patients)
+            features = generate_clinical_features(self.rnd, age)
+            diagnosis, chief_complaint = derive_diagnosis(self.rnd, features)
+            visit_date = self.random_time()
+
+            recommendation = algorithm.generate_recommendation(SimpleNamespace(
+                diagnosis=diagnosis, chief_complaint=chief_complaint, **features
+            ))
+            evaluation = recommendation['evaluation']
+            treatment = recommendation['recommended_treatment']
+            treatment_name = algorithm.treatment_options.get(treatment, {}).get('name', treatment)
+
+            records.append(dict(
+                features,
+                id=record_id,
+                record_id=f'MR{visit_date:%Y%m%d}{record_id:07d}',
+                patient_id=patient_id,
+                creator_id=self.rnd.choice(doctor_ids),
+                visit_date=visit_date,
+                chief_complaint=chief_complaint,
+                diagnosis=diagnosis,
+                treatment_plan=f'{treatment_name} ({treatment})',
+                latest_treatment=treatment,
+                is_finalized=self.rnd.random() < self.finalized_ratio,
+                created_at=visit_date,
+                updated_at=visit_date
+            ))
+
+            assessed_at = visit_date + timedelta(minutes=self.rnd.randint(5, 120))
+            base_assessment = {
+                'medical_record_id': record_id,
+                'total_score': int(evaluation['total_score']),
+                'success_probability': evaluation['success_probability'],
+                'risk_level': evaluation['risk_level'],
+                'passed_mandatory': evaluation['passed_mandatory'],
+                'mandatory_failures': json.dumps(evaluation['mandatory_failures'], ensure_ascii=False),
+                'recommended_treatment': treatment,
+                'confidence_level': recommendation['confidence_level'],
+                'alternative_treatments': json.dumps(recommendation['alternative_treatments'], ensure_ascii=False),
+                'category_scores': json.dumps(evaluation['category_scores'], ensure_ascii=False),
+                'rule_evaluations': json.dumps(evaluation['rule_evaluations'], ensure_ascii=False),
+                'assessed_by': records[-1]['creator_id']
+            }
+
+            # 约20%的病历有一次较早的历史评估
+            if self.rnd.random() < 0.2:
+                assessment_id += 1
+                assessments.append(dict(
+                    base_assessment,
+                    id=assessment_id,
+                    total_score=base_assessment['total_score'] + self.rnd.randint(-10, 10),
+                    assessed_at=assessed_at - timedelta(days=self.rnd.randint(1, 30)),
+                    is_latest=False
+                ))
+                self.add_details(category_rows, rule_rows, assessment_id, evaluation)
+
+            assessment_id += 1
+            assessments.append(dict(base_assessment, id=assessment_id, assessed_at=assessed_at, is_latest=True))
+            self.add_details(category_rows, rule_rows, assessment_id, evaluation)
+
+            if self.with_plans:
+                for plan in recommendation['treatment_plans']:
+                    plan_id += 1
+                    plans.append(dict(plan, id=plan_id, assessment_id=assessment_id, created_at=assessed_at))
+
+            if len(records) >= self.chunk_size:
+                self.flush(records, assessments, plans, (category_rows, rule_rows),
+                           MedicalRecord, AssessmentResult, TreatmentPlan)
+                records, assessments, plans = [], [], []
+                category_rows, rule_rows = [], []
+                print(f'  ... {record_id}/{self.rows}')
+
+        if records:
+            self.flush(records, assessments, plans, (category_rows, rule_rows),
+                       MedicalRecord, AssessmentResult, TreatmentPlan)
+
+    @staticmethod
+    def add_details(category_rows, rule_rows, assessment_id, evaluation):
+        """累积一条评估的类别得分和规则命中明细"""
+        from app.services.assessment_details import build_detail_rows
+
+        categories, rules = build_detail_rows(assessment_id, evaluation)
+        category_rows.extend(categories)
+        rule_rows.extend(rules)
+
+    @staticmethod
+    def flush(records, assessments, plans, details, record_model, assessment_model, plan_model):
+        """写入一批数据"""
+        from app.services.assessment_details import insert_detail_rows
+
+        db.session.execute(insert(record_model), records)
+        db.session.execute(insert(assessment_model), assessments)
+        insert_detail_rows(*details)
+        if plans:
+            db.session.execute(insert(plan_model), plans)
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成临床病例库')
+    parser.add_argument('--rows', default='10k', help='病历数量：10k / 100k / 1m 或具体数字')
+    parser.add_argument('--db', help='SQLite文件路径（默认 benchmarks/data/corpus_<rows>.db）')
+    parser.add_argument('--seed', type=int, default=20240601, help='随机种子')
+    parser.add_argument('--finalized-ratio', type=float, default=0.8, help='已最终化病历比例')
+    parser.add_argument('--skip-plans', action='store_true', help='不生成治疗方案明细')
+    parser.add_argument('--force', action='store_true', help='覆盖已存在的数据库文件')
+    args = parser.parse_args()
+
+    rows = parse_rows(args.rows)
+    db_path = args.db or default_db_path(rows)
+
+    if os.path.exists(db_path):
+        if not args.force:
+            print(f'❌ {db_path} 已存在，使用 --force 覆盖')
+            return
+        os.remove(db_path)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    print(f'生成 {rows} 条病历 -> {db_path}')
+    app = create_benchmark_app(db_path)
+    with app.app_context():
+        from app.utils.database import init_db
+
+        init_db()
+        CorpusGenerator(
+            rows,
+            seed=args.seed,
+            finalized_ratio=args.finalized_ratio,
+            with_plans=not args.skip_plans
+        ).run()
+
+    print('✅ 生成完成')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
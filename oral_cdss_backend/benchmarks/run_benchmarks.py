@@ -0,0 +1,130 @@
+# benchmarks/run_benchmarks.py
+"""
+相似病例搜索与规则评估基准测试
+
+对合成病例库（见 generate_corpus.py）运行各项操作，报告 p50/p95 延迟和峰值内存。
+延迟和内存分两轮测量，避免 tracemalloc 的开销影响延迟数据。
+
+用法：
+    python -m benchmarks.run_benchmarks --rows 10k
+    python -m benchmarks.run_benchmarks --db /tmp/corpus_1m.db --iterations 20 --scenarios weighted_similar
+"""
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from app import db
+from benchmarks.common import create_benchmark_app, default_db_path, parse_rows, percentile
+
+TREATMENTS = ['full_crown', 'implant', 'bridge', 'filling', 'root_canal', 'extraction', 'observation']
+
+
+def build_scenarios(sample_records):
+    """构建基准场景：名称 -> 接收第i次迭代序号的函数"""
+    from app.services.similarity_search import SimpleSimilaritySearch
+    from app.services.rule_engine import RuleEngine
+    from app.services.decision_algorithm import DecisionAlgorithm
+
+    search = SimpleSimilaritySearch()
+    rule_engine = RuleEngine()
+    algorithm = DecisionAlgorithm()
+
+    def pick(i):
+        return sample_records[i % len(sample_records)]
+
+    return {
+        'find_similar_cases': lambda i: search.find_similar_cases(pick(i), use_cache=False),
+        'weighted_similar': lambda i: search.find_similar_cases(pick(i), use_cache=False, mode='weighted'),
+        'find_cases_by_treatment': lambda i: search.find_cases_by_treatment(TREATMENTS[i % len(TREATMENTS)]),
+        'evaluate_record': lambda i: rule_engine.evaluate_record(pick(i)),
+        'generate_recommendation': lambda i: algorithm.generate_recommendation(pick(i))
+    }
+
+
+def measure(func, iterations, warmup, memory_iterations):
+    """测量单个场景的延迟分布和峰值内存"""
+    for i in range(warmup):
+        func(i)
+        db.session.rollback()
+
+    latencies = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+        # 清空会话，避免身份映射不断增长影响后续迭代
+        db.session.rollback()
+    latencies.sort()
+
+    tracemalloc.start()
+    for i in range(memory_iterations):
+        func(i)
+        db.session.rollback()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运行相似病例搜索与规则评估基准测试')
+    parser.add_argument('--rows', default='10k', help='病历规模，用于定位默认数据库文件')
+    parser.add_argument('--db', help='SQLite文件路径')
+    parser.add_argument('--iterations', type=int, default=50, help='每个场景的计时迭代次数')
+    parser.add_argument('--warmup', type=int, default=3, help='预热次数')
+    parser.add_argument('--memory-iterations', type=int, default=3, help='测量峰值内存的迭代次数')
+    parser.add_argument('--samples', type=int, default=200, help='作为查询输入的病历样本数')
+    parser.add_argument('--scenarios', help='只运行指定场景，逗号分隔')
+    parser.add_argument('--seed', type=int, default=7, help='样本选择随机种子')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    args = parser.parse_args()
+
+    db_path = args.db or default_db_path(parse_rows(args.rows))
+    if not os.path.exists(db_path):
+        print(f'❌ {db_path} 不存在，请先运行 python -m benchmarks.generate_corpus')
+        return
+
+    app = create_benchmark_app(db_path)
+    results = {}
+    with app.app_context():
+        from app.models import MedicalRecord
+
+        max_id = db.session.query(db.func.max(MedicalRecord.id)).scalar() or 0
+        rnd = random.Random(args.seed)
+        sample_ids = [rnd.randint(1, max_id) for _ in range(min(args.samples, max_id))]
+        sample_records = MedicalRecord.query.filter(MedicalRecord.id.in_(sample_ids)).all()
+        # 样本脱离会话，避免每次迭代后的回滚使其过期
+        for record in sample_records:
+            db.session.expunge(record)
+
+        scenarios = build_scenarios(sample_records)
+        selected = args.scenarios.split(',') if args.scenarios else list(scenarios)
+
+        print(f'数据库: {db_path}  病历数: {max_id}')
+        print(f"{'场景':<26}{'p50(ms)':>12}{'p95(ms)':>12}{'max(ms)':>12}{'峰值内存(MB)':>14}")
+        for name in selected:
+            if name not in scenarios:
+                print(f'⚠️ 未知场景: {name}')
+                continue
+            stats = measure(scenarios[name], args.iterations, args.warmup, args.memory_iterations)
+            results[name] = stats
+            print(f"{name:<26}{stats['p50_ms']:>12}{stats['p95_ms']:>12}{stats['max_ms']:>12}"
+                  f"{stats['peak_memory_mb']:>14}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'db': db_path, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f'结果已写入 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,47 @@
+# export_assessments.py
+"""
+导出评估数据为分块列式 .npz 文件
+
+用法：
+    python export_assessments.py --output assessments.npz
+    python export_assessments.py --output latest.npz --latest-only --start-date 2024-01-01 --end-date 2024-06-30
+
+读取（需要 numpy）：
+    data = numpy.load('assessments.npz')
+    chunk = {name.split('/')[1]: data[name] for name in data.files if name.startswith('chunk_00000/')}
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+from app import create_app
+from app.services.assessment_export import DEFAULT_CHUNK_SIZE, write_export
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导出评估数据为分块列式 .npz 文件')
+    parser.add_argument('--output', required=True, help='输出文件路径')
+    parser.add_argument('--start-date', help='开始日期（YYYY-MM-DD，含）')
+    parser.add_argument('--end-date', help='结束日期（YYYY-MM-DD，含）')
+    parser.add_argument('--latest-only', action='store_true', help='只导出每个病历的最新评估')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每块行数')
+    parser.add_argument('--database-uri', help='覆盖 SQLALCHEMY_DATABASE_URI')
+    args = parser.parse_args()
+
+    start = datetime.combine(date.fromisoformat(args.start_date), datetime.min.time()) if args.start_date else None
+    end = datetime.combine(date.fromisoformat(args.end_date) + timedelta(days=1), datetime.min.time()) \
+        if args.end_date else None
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else None
+    app = create_app(overrides)
+
+    started = time.time()
+    with app.app_context():
+        with open(args.output, 'wb') as f:
+            rows = write_export(f, args.chunk_size, start=start, end=end, latest_only=args.latest_only)
+
+    print(f'✅ 已导出 {rows} 行到 {args.output}  ({time.time() - started:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+# import_records.py
+"""
+从 CSV / NDJSON 文件批量导入病历
+
+用法：
+    python import_records.py --input records.csv --creator-id 2
+    python import_records.py --input records.ndjson --creator-id 2 --batch-size 5000
+
+CSV 首行为表头，列名与病历字段一致（chief_complaint、visit_date ...）。患者用 patient_no（病历号）
+或 patient_pk（患者ID）列指定；旧的 patient_id 列两者都可以，同时匹配到不同患者时该行报错。
+clinical_features 列为JSON数组，如
+[{"name": "probing_depth", "value": "5", "type": "numeric"}]。
+"""
+import argparse
+import json
+import time
+
+from app import create_app
+from app.models import User
+from app.services.record_import import DEFAULT_BATCH_SIZE, ROW_READERS, RecordImporter
+
+
+def main():
+    parser = argparse.ArgumentParser(description='从 CSV / NDJSON 文件批量导入病历')
+    parser.add_argument('--input', required=True, help='输入文件路径')
+    parser.add_argument('--format', choices=sorted(ROW_READERS), help='文件格式（默认按扩展名判断）')
+    parser.add_argument('--creator-id', type=int, required=True, help='记为病历创建者的医生用户ID')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每个事务的行数')
+    parser.add_argument('--errors-output', help='把行级错误写入该JSON文件')
+    parser.add_argument('--database-uri', help='覆盖 SQLALCHEMY_DATABASE_URI')
+    args = parser.parse_args()
+
+    file_format = args.format or ('ndjson' if args.input.lower().endswith(('.ndjson', '.jsonl')) else 'csv')
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else None
+    app = create_app(overrides)
+
+    started = time.time()
+    with app.app_context():
+        if User.query.get(args.creator_id) is None:
+            parser.error(f'用户 {args.creator_id} 不存在')
+
+        importer = RecordImporter(args.creator_id, batch_size=args.batch_size)
+        with open(args.input, 'rb') as f:
+            summary = importer.run(ROW_READERS[file_format](f))
+
+    elapsed = time.time() - started
+    rate = summary['total'] / elapsed if elapsed else 0
+    print(f"✅ 共 {summary['total']} 行：成功 {summary['imported']}，失败 {summary['failed']}  "
+          f"({elapsed:.1f}s, {rate:.0f} 行/秒)")
+
+    for error in summary['errors'][:20]:
+        print(f"  第 {error['row']} 行: {'; '.join(error['errors'])}")
+
+    if args.errors_output:
+        with open(args.errors_output, 'w', encoding='utf-8') as f:
+            json.dump(summary['errors'], f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
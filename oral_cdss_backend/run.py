@@ -5,8 +5,22 @@ app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
-        # 创建数据库表
+        # 创建数据库表，并为已有的表补建新增的列和索引
         db.create_all()
+        from app.utils.database import ensure_assessment_details, upgrade_schema
+        from app.services.assessment_rollup import ensure_rollups
+        from app.services.doctor_stats import ensure_doctor_stats
+        upgrade_schema()
+
+        # 已有评估但统计汇总表为空（从旧版本升级）时重建
+        rebuilt = ensure_rollups()
+        if rebuilt:
+            print(f"✅ 重建统计汇总：{', '.join(rebuilt)}")
+        if ensure_doctor_stats():
+            print("✅ 重建医生统计")
+        backfilled = ensure_assessment_details()
+        if backfilled:
+            print(f"✅ 补写评估明细：{backfilled} 条评估")
 
         # 创建默认管理员（如果不存在）
         from app.models.user import User
@@ -0,0 +1,56 @@
+# tests/conftest.py
+import itertools
+
+import pytest
+
+from app import create_app, db
+from app.models import MedicalRecord, Patient, User
+from app.utils.database import init_db
+
+_numbers = itertools.count(1)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """每个测试一个临时SQLite库，已执行 init_db（默认管理员和规则）"""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'TESTING': True
+    })
+    with app.app_context():
+        init_db()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def admin(app):
+    return User.query.filter_by(username='admin').one()
+
+
+@pytest.fixture
+def make_patient(app, admin):
+    """创建并提交一个患者"""
+    def make(**fields):
+        number = next(_numbers)
+        patient = Patient(patient_id=fields.pop('patient_id', f'P{number:05d}'),
+                          full_name=fields.pop('full_name', f'测试患者{number}'),
+                          created_by=admin.id, **fields)
+        db.session.add(patient)
+        db.session.commit()
+        return patient
+    return make
+
+
+@pytest.fixture
+def make_record(app, admin, make_patient):
+    """创建并提交一条病历（未指定患者时新建一个）"""
+    def make(patient=None, **fields):
+        patient = patient or make_patient()
+        record = MedicalRecord(record_id=fields.pop('record_id', f'T{next(_numbers):08d}'),
+                               patient_id=patient.id, creator_id=admin.id, **fields)
+        db.session.add(record)
+        db.session.commit()
+        return record
+    return make
\ No newline at end of file
@@ -0,0 +1,97 @@
+# tests/test_assessment_rollup.py
+from datetime import date, datetime
+
+import pytest
+
+from app import db
+from app.models import AssessmentDailyStat, AssessmentPeriodStat, AssessmentResult
+from app.services.assessment_rollup import period_start, rebuild_daily_stats, replace_latest_assessment
+
+
+def daily_rows():
+    return {
+        (row.stat_date, row.risk_level, row.recommended_treatment):
+            (row.assessment_count, row.score_sum, row.success_sum)
+        for row in AssessmentDailyStat.query.all() if row.assessment_count
+    }
+
+
+def period_rows():
+    return {
+        (row.granularity, row.period_start, row.risk_level, row.recommended_treatment):
+            (row.assessment_count, row.score_sum, row.success_sum)
+        for row in AssessmentPeriodStat.query.all() if row.assessment_count
+    }
+
+
+@pytest.fixture
+def assess(admin):
+    """为病历写入一条最新评估并增量更新汇总（与评估接口相同的调用顺序）"""
+    def assess(record, assessed_at, risk_level, treatment, score, success):
+        assessment = AssessmentResult(medical_record_id=record.id, assessed_by=admin.id, assessed_at=assessed_at,
+                                      risk_level=risk_level, recommended_treatment=treatment,
+                                      total_score=score, success_probability=success, is_latest=True)
+        db.session.add(assessment)
+        db.session.flush()
+        replace_latest_assessment(record.id, assessment)
+        db.session.commit()
+        return assessment
+    return assess
+
+
+def test_new_assessments_increment_daily_rows(make_record, assess):
+    day = datetime(2024, 3, 15, 9)
+    assess(make_record(), day, 'low', 'filling', 80, 0.9)
+    assess(make_record(), day.replace(hour=16), 'low', 'filling', 70, 0.7)
+
+    assert daily_rows() == {(date(2024, 3, 15), 'low', 'filling'): (2, 150, pytest.approx(1.6))}
+
+
+def test_reassessment_moves_record_between_rows(make_record, assess):
+    record = make_record()
+    first = assess(record, datetime(2024, 3, 15, 9), 'high', 'extraction', 30, 0.2)
+    assess(record, datetime(2024, 3, 16, 9), 'low', 'filling', 85, 0.9)
+
+    assert daily_rows() == {(date(2024, 3, 16), 'low', 'filling'): (1, 85, pytest.approx(0.9))}
+    assert db.session.get(AssessmentResult, first.id).is_latest is False
+
+
+def test_increments_match_full_rebuild(make_record, assess):
+    records = [make_record() for _ in range(3)]
+    assess(records[0], datetime(2024, 3, 15, 9), 'low', 'filling', 80, 0.9)
+    assess(records[1], datetime(2024, 3, 15, 10), 'medium', None, 60, 0.6)
+    assess(records[0], datetime(2024, 3, 17, 9), 'medium', None, 55, 0.5)
+    assess(records[2], datetime(2024, 4, 1, 9), 'high', 'implant', 40, 0.3)
+    incremental = daily_rows()
+
+    rebuild_daily_stats()
+    assert daily_rows() == incremental
+
+
+def test_period_start():
+    assert period_start(date(2024, 3, 17), 'week') == date(2024, 3, 11)
+    assert period_start(date(2024, 3, 17), 'month') == date(2024, 3, 1)
+    assert period_start(date(2024, 3, 17), 'day') == date(2024, 3, 17)
+
+
+def test_assessments_increment_week_and_month_rows(make_record, assess):
+    # 3月10日（周日）与3月11日（周一）分属两周、同属一月
+    assess(make_record(), datetime(2024, 3, 10, 9), 'low', 'filling', 80, 0.8)
+    assess(make_record(), datetime(2024, 3, 11, 9), 'low', 'filling', 60, 0.6)
+
+    assert period_rows() == {
+        ('week', date(2024, 3, 4), 'low', 'filling'): (1, 80, pytest.approx(0.8)),
+        ('week', date(2024, 3, 11), 'low', 'filling'): (1, 60, pytest.approx(0.6)),
+        ('month', date(2024, 3, 1), 'low', 'filling'): (2, 140, pytest.approx(1.4)),
+    }
+
+
+def test_period_increments_match_full_rebuild(make_record, assess):
+    record = make_record()
+    assess(record, datetime(2024, 2, 28, 9), 'high', 'extraction', 30, 0.2)
+    assess(make_record(), datetime(2024, 3, 1, 9), 'medium', None, 50, 0.5)
+    assess(record, datetime(2024, 3, 2, 9), 'low', 'filling', 90, 0.95)
+    incremental = period_rows()
+
+    rebuild_daily_stats()
+    assert period_rows() == incremental
\ No newline at end of file
@@ -0,0 +1,91 @@
+# tests/test_clinical_features.py
+import pytest
+
+from app import db
+from app.models import ClinicalFeature
+from app.services.clinical_features import sync_clinical_features
+
+
+def stored(record):
+    return {
+        feature.feature_name: (feature.feature_value, feature.feature_type, feature.numeric_value)
+        for feature in ClinicalFeature.query.filter_by(medical_record_id=record.id)
+    }
+
+
+def sync(record, items):
+    counts = sync_clinical_features(record.id, items)
+    db.session.commit()
+    return counts
+
+
+FEATURES = [
+    {'name': 'probing_depth', 'value': '5', 'type': 'numeric'},
+    {'name': 'bleeding_on_probing', 'value': 'yes', 'type': 'categorical'},
+    {'name': 'note', 'value': '复诊'}
+]
+
+
+def test_first_sync_inserts_everything(make_record):
+    record = make_record()
+    assert sync(record, FEATURES) == {'inserted': 3, 'updated': 0, 'deleted': 0}
+    assert stored(record) == {
+        'probing_depth': ('5', 'numeric', 5.0),
+        'bleeding_on_probing': ('yes', 'categorical', None),
+        'note': ('复诊', 'text', None)
+    }
+
+
+def test_unchanged_sync_writes_nothing(make_record):
+    record = make_record()
+    sync(record, FEATURES)
+    assert sync(record, list(reversed(FEATURES))) == {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+
+def test_sync_applies_only_the_difference(make_record):
+    record = make_record()
+    sync(record, FEATURES)
+    ids = {feature.feature_name: feature.id for feature in ClinicalFeature.query.filter_by(medical_record_id=record.id)}
+
+    counts = sync(record, [
+        {'name': 'probing_depth', 'value': '7.5', 'type': 'numeric'},
+        {'name': 'bleeding_on_probing', 'value': 'yes', 'type': 'categorical'},
+        {'name': 'plaque_index', 'value': '2', 'type': 'numeric'}
+    ])
+
+    assert counts == {'inserted': 1, 'updated': 1, 'deleted': 1}
+    assert stored(record) == {
+        'probing_depth': ('7.5', 'numeric', 7.5),
+        'bleeding_on_probing': ('yes', 'categorical', None),
+        'plaque_index': ('2', 'numeric', 2.0)
+    }
+    # 更新在原行上进行，未变化的行保持不动
+    kept = {feature.feature_name: feature.id for feature in ClinicalFeature.query.filter_by(medical_record_id=record.id)}
+    assert kept['probing_depth'] == ids['probing_depth']
+    assert kept['bleeding_on_probing'] == ids['bleeding_on_probing']
+
+
+def test_duplicate_rows_from_old_data_are_removed(make_record):
+    record = make_record()
+    for value in ('4', '6'):
+        db.session.add(ClinicalFeature(medical_record_id=record.id, feature_name='probing_depth',
+                                       feature_value=value, feature_type='numeric'))
+    db.session.commit()
+
+    counts = sync(record, [{'name': 'probing_depth', 'value': '4', 'type': 'numeric'}])
+
+    assert counts['deleted'] == 1
+    assert stored(record) == {'probing_depth': ('4', 'numeric', 4.0)}
+
+
+def test_invalid_items_are_rejected_before_writing(make_record):
+    record = make_record()
+    sync(record, FEATURES)
+
+    with pytest.raises(ValueError):
+        sync_clinical_features(record.id, [{'name': 'probing_depth', 'value': 'deep', 'type': 'numeric'}])
+    with pytest.raises(ValueError):
+        sync_clinical_features(record.id, [{'value': '1'}])
+    db.session.rollback()
+
+    assert len(stored(record)) == 3
\ No newline at end of file
@@ -0,0 +1,72 @@
+# tests/test_pagination.py
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from app.models import Patient
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_page, parse_limit
+
+
+def raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_cursor_round_trip():
+    values = [datetime(2024, 3, 15, 8, 30, 0, 123456), None, 'abc', 42, 1.5]
+    assert decode_cursor(encode_cursor(values), len(values)) == values
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-base64!',
+    raw_cursor({'a': 1}),
+    raw_cursor([1]),
+    raw_cursor([{'dt': 1}, 5]),
+    raw_cursor([{'dt': 'yesterday'}, 5]),
+    raw_cursor([[1, 2], 5]),
+    raw_cursor([{'x': 1}, 5]),
+])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 2)
+
+
+def test_parse_limit():
+    assert parse_limit(None, 20, 100) == 20
+    assert parse_limit('500', 20, 100) == 100
+    assert parse_limit('0', 20, 100) == 1
+    with pytest.raises(ValueError):
+        parse_limit('abc', 20, 100)
+
+
+def collect_pages(columns, descending, limit=2):
+    ids, cursor = [], None
+    while True:
+        items, cursor = keyset_page(Patient.query, columns, cursor=cursor, limit=limit, descending=descending)
+        ids.extend(patient.id for patient in items)
+        if not cursor:
+            return ids
+
+
+@pytest.fixture
+def patients(make_patient):
+    # 年龄有重复和 NULL，用于检查并列值和 NULL 的翻页
+    return [make_patient(age=age) for age in (30, None, 45, 30, None, 30, 60)]
+
+
+def test_descending_pages_cover_ties_and_nulls(patients):
+    # NULL 按最小值处理：降序时排在最后
+    expected = [p.id for p in sorted(patients, key=lambda p: (p.age is not None, p.age or 0, p.id), reverse=True)]
+    assert collect_pages([Patient.age, Patient.id], descending=True) == expected
+
+
+def test_ascending_pages_put_nulls_first(patients):
+    expected = [p.id for p in sorted(patients, key=lambda p: (p.age is not None, p.age or 0, p.id))]
+    assert collect_pages([Patient.age, Patient.id], descending=False) == expected
+
+
+def test_page_boundary_on_tie(patients):
+    # 每页1条时游标正好落在并列值中间
+    assert collect_pages([Patient.age, Patient.id], descending=True, limit=1) == \
+        collect_pages([Patient.age, Patient.id], descending=True, limit=100)
\ No newline at end of file
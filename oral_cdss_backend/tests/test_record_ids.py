@@ -0,0 +1,83 @@
+# tests/test_record_ids.py
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.models import RecordIdSequence
+from app.services import record_ids
+from app.services.record_ids import RecordIdAllocator, is_generated_record_id, reserve_block
+
+
+def today():
+    return datetime.now().strftime('%Y%m%d')
+
+
+def sequence_value(day):
+    return RecordIdSequence.query.filter_by(day=day).one().next_value
+
+
+def test_ids_are_sequential_within_a_block(app):
+    allocator = RecordIdAllocator(block_size=10)
+    ids = [allocator.allocate()[0] for _ in range(3)]
+
+    assert ids == [f'MR{today()}{n:06d}' for n in (1, 2, 3)]
+    assert all(is_generated_record_id(record_id) for record_id in ids)
+    # 三个病历号只预留了一个块
+    assert sequence_value(today()) == 11
+
+
+def test_workers_get_disjoint_blocks(app):
+    first, second = RecordIdAllocator(block_size=5), RecordIdAllocator(block_size=5)
+    ids = first.allocate(3) + second.allocate(3) + first.allocate(4)
+
+    assert len(set(ids)) == len(ids)
+    assert ids[3:6] == [f'MR{today()}{n:06d}' for n in (6, 7, 8)]
+    # first 先用完自己块中剩余的 4、5，再预留第三块（11-15）
+    assert ids[6:] == [f'MR{today()}{n:06d}' for n in (4, 5, 11, 12)]
+
+
+def test_batch_larger_than_block_reserves_enough(app):
+    allocator = RecordIdAllocator(block_size=10)
+    ids = allocator.allocate(25)
+
+    assert ids == [f'MR{today()}{n:06d}' for n in range(1, 26)]
+    assert sequence_value(today()) == 26
+
+
+def test_reserve_block_retries_deadlock(app, monkeypatch):
+    real_update = record_ids.update
+    calls = []
+
+    def deadlocking_update(table):
+        calls.append(table)
+        if len(calls) == 1:
+            raise OperationalError('UPDATE record_id_sequences', {}, Exception(1213, 'Deadlock found'))
+        return real_update(table)
+
+    monkeypatch.setattr(record_ids, 'update', deadlocking_update)
+    monkeypatch.setattr(record_ids.time, 'sleep', lambda seconds: None)
+
+    assert reserve_block('20240315', 100) == 1
+    assert len(calls) == 2
+    assert sequence_value('20240315') == 101
+
+
+def test_reserve_block_reraises_other_operational_errors(app, monkeypatch):
+    def failing_update(table):
+        raise OperationalError('UPDATE record_id_sequences', {}, Exception(2006, 'MySQL server has gone away'))
+
+    monkeypatch.setattr(record_ids, 'update', failing_update)
+
+    with pytest.raises(OperationalError):
+        reserve_block('20240315', 100)
+
+
+@pytest.mark.parametrize('record_id, generated', [
+    ('MR20240315000042', True),
+    ('MR202403151234567', True),
+    ('MR202403151234', False),
+    ('LEGACY-0001', False),
+])
+def test_is_generated_record_id(record_id, generated):
+    assert is_generated_record_id(record_id) is generated
\ No newline at end of file
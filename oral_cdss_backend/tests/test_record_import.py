@@ -0,0 +1,99 @@
+# tests/test_record_import.py
+import io
+import json
+
+import pytest
+
+from app.models import ClinicalFeature, MedicalRecord
+from app.services.record_import import RecordImporter, iter_csv_rows, iter_ndjson_rows
+
+
+def run_csv(admin, text, batch_size=1000):
+    return RecordImporter(admin.id, batch_size=batch_size).run(iter_csv_rows(io.BytesIO(text.encode('utf-8'))))
+
+
+def run_ndjson(admin, lines):
+    text = '\n'.join(line if isinstance(line, str) else json.dumps(line, ensure_ascii=False) for line in lines)
+    return RecordImporter(admin.id).run(iter_ndjson_rows(io.BytesIO(text.encode('utf-8'))))
+
+
+def errors_by_row(summary):
+    return {error['row']: error['errors'] for error in summary['errors']}
+
+
+@pytest.fixture
+def patient(make_patient):
+    return make_patient(patient_id='P-IMPORT')
+
+
+def test_valid_rows_import_and_invalid_rows_report_reasons(admin, patient, make_record):
+    make_record(record_id='OLD-1')
+    summary = run_csv(admin, '\n'.join([
+        'patient_no,patient_pk,record_id,chief_complaint,diagnosis,caries_degree',
+        'P-IMPORT,,,牙痛,牙周炎,deep',               # 第2行：有效，系统分配病历号
+        f',{patient.id},OLD-2,牙痛,龋齿,none',        # 第3行：有效，按患者ID
+        ',,,牙痛,牙周炎,',                            # 第4行：未指定患者
+        f'P-IMPORT,{patient.id},,牙痛,牙周炎,',       # 第5行：同时指定两种引用
+        'P-MISSING,,,牙痛,牙周炎,',                   # 第6行：患者不存在
+        'P-IMPORT,,,牙痛,牙周炎,very-deep',           # 第7行：枚举值错误
+        'P-IMPORT,,MR20240315000042,牙痛,牙周炎,',    # 第8行：系统生成格式的病历号
+        'P-IMPORT,,OLD-1,牙痛,牙周炎,',               # 第9行：病历号已存在
+    ]))
+
+    assert (summary['total'], summary['imported'], summary['failed']) == (8, 2, 6)
+    errors = errors_by_row(summary)
+    assert sorted(errors) == [4, 5, 6, 7, 8, 9]
+    assert errors[6] == ['患者不存在']
+    assert errors[9] == ['病历号已存在']
+    assert any('caries_degree' in message for message in errors[7])
+    assert any('record_id' in message for message in errors[8])
+
+    imported = MedicalRecord.query.filter_by(patient_id=patient.id).order_by(MedicalRecord.id).all()
+    assert [record.diagnosis for record in imported] == ['牙周炎', '龋齿']
+    assert imported[1].record_id == 'OLD-2'
+
+
+def test_errors_do_not_affect_other_rows_in_the_batch(admin, patient):
+    summary = run_csv(admin, '\n'.join(
+        ['patient_no,chief_complaint,bone_loss_percentage'] +
+        [f'P-IMPORT,牙痛,{value}' for value in ('10', 'abc', '30', '', '50')]
+    ), batch_size=2)
+
+    assert (summary['imported'], summary['failed']) == (4, 1)
+    assert list(errors_by_row(summary)) == [3]
+
+
+def test_ndjson_parse_errors_and_features(admin, patient):
+    summary = run_ndjson(admin, [
+        {'patient_no': 'P-IMPORT', 'record_id': 'ND-1', 'chief_complaint': '牙龈出血',
+         'clinical_features': [{'name': 'probing_depth', 'value': '6', 'type': 'numeric'}]},
+        '{not json',
+        '[1, 2]',
+        {'patient_no': 'P-IMPORT', 'chief_complaint': '牙龈出血', 'clinical_features': [{'name': 'probing_depth', 'value': 'deep',
+                                                          'type': 'numeric'}]},
+    ])
+
+    assert (summary['imported'], summary['failed']) == (1, 3)
+    errors = errors_by_row(summary)
+    assert errors[2][0].startswith('JSON格式错误')
+    assert errors[3] == ['每行必须是一个JSON对象']
+    assert any('probing_depth' in message for message in errors[4])
+
+    record = MedicalRecord.query.filter_by(record_id='ND-1').one()
+    feature = ClinicalFeature.query.filter_by(medical_record_id=record.id).one()
+    assert (feature.feature_name, feature.numeric_value) == ('probing_depth', 6.0)
+
+
+def test_ambiguous_legacy_patient_id_is_rejected(admin, make_patient):
+    first = make_patient(patient_id='P-FIRST')
+    second = make_patient(patient_id=str(first.id))  # 病历号恰好等于另一位患者的ID
+    summary = run_ndjson(admin, [
+        {'patient_id': str(first.id), 'chief_complaint': '牙痛'},
+        {'patient_id': 'P-FIRST', 'chief_complaint': '牙痛'},
+        {'patient_no': str(first.id), 'chief_complaint': '牙痛'},
+    ])
+
+    assert (summary['imported'], summary['failed']) == (2, 1)
+    assert 'patient_no' in errors_by_row(summary)[1][0]
+    assert MedicalRecord.query.filter_by(patient_id=first.id).count() == 1
+    assert MedicalRecord.query.filter_by(patient_id=second.id).count() == 1
\ No newline at end of file
@@ -0,0 +1,46 @@
+# upgrade_db.py
+"""
+升级已有数据库：补建新增的表、列和索引，并回填由已有数据派生的字段
+
+用法：
+    python upgrade_db.py
+    python upgrade_db.py --database-uri sqlite:////path/to/oral_cdss.db
+
+可以重复运行：已存在的列和索引会跳过，回填只处理尚未填写的行。
+"""
+import argparse
+
+from app import create_app, db
+from app.services.assessment_rollup import ensure_rollups
+from app.services.doctor_stats import ensure_doctor_stats
+from app.utils.database import (backfill_feature_numeric_values, backfill_patient_name_keys,
+                                ensure_assessment_details, sync_latest_treatments, upgrade_schema)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='升级已有数据库的表结构并回填派生字段')
+    parser.add_argument('--database-uri', help='覆盖 SQLALCHEMY_DATABASE_URI')
+    args = parser.parse_args()
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else None
+    app = create_app(overrides)
+
+    with app.app_context():
+        db.create_all()
+        statements = upgrade_schema()
+        for statement in statements:
+            print(f'  {statement.strip()}')
+        print(f'✅ 表结构：执行 {len(statements)} 条DDL')
+
+        print(f'✅ 病历最新推荐方案：更新 {sync_latest_treatments()} 条')
+        print(f'✅ 患者姓名拼音：回填 {backfill_patient_name_keys()} 条')
+        print(f'✅ 数值型临床特征：回填 {backfill_feature_numeric_values()} 条')
+
+        rebuilt = ensure_rollups()
+        print(f"✅ 评估统计汇总：{'重建 ' + ', '.join(rebuilt) if rebuilt else '无需重建'}")
+        print(f"✅ 医生统计：{'重建' if ensure_doctor_stats() else '无需重建'}")
+        print(f'✅ 评估明细（类别得分、规则命中）：补写 {ensure_assessment_details()} 条评估')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file